@@ -0,0 +1,27 @@
+import os
+import time
+
+from util.bulkgen import write_passwords
+
+
+def main():
+    count = 2000000
+
+    print("CPUs available: {}".format(os.cpu_count()))
+    print("{:>8} {:>16} {:>10}".format("workers", "passwords/s", "speedup"))
+
+    baseline = None
+    for workers in range(1, (os.cpu_count() or 1) + 1):
+        with open(os.devnull, 'w') as stream:
+            start = time.perf_counter()
+            write_passwords(stream, count, 16, "311", workers)
+            throughput = count / (time.perf_counter() - start)
+
+        if baseline is None:
+            baseline = throughput
+
+        print("{:>8} {:>16.0f} {:>9.2f}x".format(workers, throughput, throughput / baseline))
+
+
+if __name__ == '__main__':
+    main()
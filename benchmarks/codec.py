@@ -0,0 +1,42 @@
+import pickle
+import time
+
+from util.codec import encode_map, decode_map
+
+
+def best_of(function, argument, repeat: int = 3) -> float:
+    """
+    Time a function call and return the best time.
+
+    :param function: The function to time.
+    :param argument: The argument to call the function with.
+    :param repeat: The amount of runs.
+    :return: The best time in seconds.
+    """
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def main():
+    print("{:>10} {:>8} {:>14} {:>14} {:>14}".format("entries", "codec", "encode (ms)", "decode (ms)", "size (bytes)"))
+    for size in (1000, 100000, 1000000):
+        passwords = {"service{}".format(index): "password{}".format(index) for index in range(size)}
+
+        for name, encode, decode in (("pickle", pickle.dumps, pickle.loads), ("vault", encode_map, decode_map)):
+            data = encode(passwords)
+            assert decode(data) == passwords
+
+            print("{:>10} {:>8} {:>14.2f} {:>14.2f} {:>14}".format(size, name, best_of(encode, passwords) * 1000, best_of(decode, data) * 1000, len(data)))
+
+
+if __name__ == '__main__':
+    main()
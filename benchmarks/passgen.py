@@ -0,0 +1,61 @@
+import random
+import string
+import time
+
+from util.passgen import Vault, generate_passwords
+
+
+def old_generate_password(length: int, complexity_info: str) -> str:
+    """
+    The password generator before batching, which rebuilds the dataset and uses random.choice per character.
+
+    :param length: The length of the password.
+    :param complexity_info: The complexity of the password.
+    :return: The password.
+    """
+
+    dataset_options = {
+        "letter": {"0": "", "1": string.ascii_lowercase, "2": string.ascii_uppercase, "3": string.ascii_letters},
+        "digit": {"0": "", "1": string.digits},
+        "symbol": {"0": "", "1": "!@#$%^&*()-_=+[{}];:|,./<>?"}
+    }
+
+    letter_complexity, digit_complexity, symbol_complexity = list(complexity_info)
+    dataset = dataset_options["letter"][letter_complexity] + dataset_options["digit"][digit_complexity] + dataset_options["symbol"][symbol_complexity]
+
+    return "".join([random.choice(dataset) for _ in range(length)])
+
+
+def passwords_per_second(function, count: int) -> float:
+    """
+    Time how many passwords a function generates per second.
+
+    :param function: A function that generates count passwords.
+    :param count: The amount of passwords.
+    :return: The passwords per second.
+    """
+
+    start = time.perf_counter()
+    function(count)
+
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    length = 16
+    complexity = "311"
+
+    methods = (
+        ("old, one by one", lambda count: [old_generate_password(length, complexity) for _ in range(count)]),
+        ("new, one by one", lambda count: [Vault._generate_password(length, complexity) for _ in range(count)]),
+        ("new, batched", lambda count: generate_passwords(count, length, complexity))
+    )
+
+    print("{:>18} {:>10} {:>16}".format("method", "count", "passwords/s"))
+    for name, method in methods:
+        for count in (1, 1000000):
+            print("{:>18} {:>10} {:>16.0f}".format(name, count, passwords_per_second(method, count)))
+
+
+if __name__ == '__main__':
+    main()
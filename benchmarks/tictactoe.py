@@ -0,0 +1,72 @@
+import random
+import time
+
+from games.tictactoe import TicTacToe
+
+
+def full_line_check(board: TicTacToe, row_changed: int, column_changed: int) -> bool:
+    """
+    The old win check, for comparison: it builds the whole row, column and both diagonals on every move,
+    and only finds lines across the whole grid.
+
+    :param board: The board the move was made on.
+    :param row_changed: The row that has changed with the move.
+    :param column_changed: The column that has changed with the move.
+    :return: Whether nobody has won.
+    """
+
+    size = board.grid_size
+    lines = (
+        board.grid[row_changed],
+        [board.grid[row_index][column_changed] for row_index in range(size)],
+        [board.grid[index][index] for index in range(size)],
+        [board.grid[index][size - 1 - index] for index in range(size)]
+    )
+
+    return not any(len(set(line)) == 1 and " " not in line for line in lines)
+
+
+def time_moves(grid_size: int, win_length: int, check, moves: int) -> float:
+    """
+    Time random moves on fresh boards, with a win check after every move.
+
+    :param grid_size: The size of the grid.
+    :param win_length: The amount of symbols in a row to win.
+    :param check: The win check, called as check(board, row, column).
+    :param moves: The amount of moves to time.
+    :return: The average time per move in seconds.
+    """
+
+    elapsed = 0
+    done = 0
+    while done < moves:
+        board = TicTacToe(grid_size, win_length=win_length)
+        cells = random.sample(range(grid_size ** 2), min(grid_size ** 2, moves - done))
+
+        start = time.perf_counter()
+        for cell in cells:
+            row, column = divmod(cell, grid_size)
+            board.grid[row][column] = board.player_icons[board.current_player]
+            check(board, row, column)
+            board.switch_player()
+        elapsed += time.perf_counter() - start
+
+        done += len(cells)
+
+    return elapsed / moves
+
+
+def main():
+    moves = 20000
+
+    print("{:>10} {:>20} {:>20} {:>20}".format("grid", "full lines (µs)", "k = grid (µs)", "k = 5 (µs)"))
+    for grid_size in (3, 10, 100, 1000):
+        full_lines = time_moves(grid_size, grid_size, full_line_check, moves)
+        whole_grid = time_moves(grid_size, grid_size, TicTacToe.check_win, moves)
+        five = time_moves(grid_size, min(5, grid_size), TicTacToe.check_win, moves)
+
+        print("{:>10} {:>20.2f} {:>20.2f} {:>20.2f}".format("{0}x{0}".format(grid_size), full_lines * 1e6, whole_grid * 1e6, five * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+from games.ai import AlphaBetaPlayer, WIN_THRESHOLD
+from games.tictactoe import TicTacToe
+
+
+def main():
+    # (grid size, win length), from the empty board.
+    games = ((3, 3), (4, 3), (4, 4))
+
+    print("{:>10} {:>6} {:>12} {:>12} {:>12} {:>10} {:>8}".format("grid", "k", "nodes", "seconds", "nodes/s", "result", "depth"))
+    for grid_size, win_length in games:
+        player = AlphaBetaPlayer(time_budget=None, seed=0)
+        player.choose_move(TicTacToe(grid_size, win_length=win_length))
+
+        search = player.last_search
+        value = search["value"]
+        result = "win" if value >= WIN_THRESHOLD else "loss" if value <= -WIN_THRESHOLD else "draw"
+
+        print("{:>10} {:>6} {:>12} {:>12.2f} {:>12.0f} {:>10} {:>8}".format(
+            "{0}x{0}".format(grid_size), win_length, search["nodes"], search["seconds"], search["nodes"] / search["seconds"], result, search["depth"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import copy
+import random
+import time
+import tracemalloc
+
+from games.bitboard import BitboardTicTacToe
+from games.tictactoe import TicTacToe
+
+
+def board_memory(board_class, grid_size: int, moves: list) -> int:
+    """
+    Measure the memory a board takes after some moves.
+
+    :param board_class: TicTacToe or BitboardTicTacToe.
+    :param grid_size: The size of the grid.
+    :param moves: The moves to make.
+    :return: The memory in bytes.
+    """
+
+    tracemalloc.start()
+    board = board_class(grid_size, win_length=min(5, grid_size))
+    for move in moves:
+        board.make_move(move)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del board
+
+    return memory
+
+
+def moves_per_second(board_class, grid_size: int, moves: list, track_lines: bool = True) -> float:
+    """
+    Time moves with their win check, on fresh boards.
+
+    :param board_class: TicTacToe or BitboardTicTacToe.
+    :param grid_size: The size of the grid.
+    :param moves: The moves to make, every game stops at the end of the grid.
+    :param track_lines: Whether the boards track the lines that can still be won.
+    :return: The moves per second.
+    """
+
+    elapsed = 0
+    for start in range(0, len(moves), grid_size ** 2):
+        board = board_class(grid_size, win_length=min(5, grid_size), track_lines=track_lines)
+
+        begin = time.perf_counter()
+        for move in moves[start:start + grid_size ** 2]:
+            board.make_move(move)
+        elapsed += time.perf_counter() - begin
+
+    return len(moves) / elapsed
+
+
+def copies_per_second(board, copy_board, copies: int) -> float:
+    """
+    Time copying a board, which a search does for every position it tries.
+
+    :param board: The board to copy.
+    :param copy_board: The function that copies it.
+    :param copies: The amount of copies.
+    :return: The copies per second.
+    """
+
+    start = time.perf_counter()
+    for _ in range(copies):
+        copy_board(board)
+
+    return copies / (time.perf_counter() - start)
+
+
+def main():
+    move_count = 20000
+
+    print("{:>10} {:>10} {:>14} {:>14} {:>20} {:>14}".format("grid", "board", "memory (kB)", "moves/s", "moves/s (no lines)", "copies/s"))
+    for grid_size in (3, 10, 100, 1000):
+        # Random games, filling every grid before starting the next one. Half of a grid for the memory.
+        games = [random.sample(range(1, grid_size ** 2 + 1), grid_size ** 2) for _ in range(-(-move_count // grid_size ** 2))]
+        moves = [move for game in games for move in game][:move_count]
+        half = games[0][:grid_size ** 2 // 2]
+
+        for name, board_class, copy_board in (("lists", TicTacToe, copy.deepcopy), ("bitboard", BitboardTicTacToe, BitboardTicTacToe.copy)):
+            memory = board_memory(board_class, grid_size, half)
+            speed = moves_per_second(board_class, grid_size, moves)
+            untracked_speed = moves_per_second(board_class, grid_size, moves, track_lines=False)
+
+            board = board_class(grid_size, win_length=min(5, grid_size))
+            for move in half:
+                board.make_move(move)
+            copies = copies_per_second(board, copy_board, max(1, 2000 // grid_size))
+
+            print("{:>10} {:>10} {:>14.1f} {:>14.0f} {:>20.0f} {:>14.0f}".format(
+                "{0}x{0}".format(grid_size), name, memory / 1024, speed, untracked_speed, copies))
+
+
+if __name__ == '__main__':
+    main()
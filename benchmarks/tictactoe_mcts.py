@@ -0,0 +1,45 @@
+import os
+import sys
+
+from games.mcts import MonteCarloPlayer
+from games.tictactoe import TicTacToe
+
+
+def main():
+    # (grid size, win length, players), from the empty board.
+    games = ((3, 3, 2), (7, 4, 2), (15, 5, 2), (15, 5, 3), (19, 5, 2))
+    time_budget = 1.0
+
+    print("Rollouts per second with 1 worker, {} s per move.".format(time_budget))
+    print("{:>10} {:>6} {:>8} {:>12} {:>12}".format("grid", "k", "players", "rollouts", "rollouts/s"))
+    for grid_size, win_length, players in games:
+        player = MonteCarloPlayer(time_budget=time_budget, workers=1, seed=0)
+        player.choose_move(TicTacToe(grid_size, players, [str(player_id) for player_id in range(players)], win_length))
+
+        search = player.last_search
+        print("{:>10} {:>6} {:>8} {:>12} {:>12.0f}".format(
+            "{0}x{0}".format(grid_size), win_length, players, search["rollouts"], search["rollouts_per_second"]))
+
+    # Scale the workers up to the amount of cores, or the amount given on the command line.
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+
+    print("\nScaling on 15x15, 5 in a row, {} cores.".format(os.cpu_count()))
+    print("{:>8} {:>12} {:>12} {:>10}".format("workers", "rollouts", "rollouts/s", "speedup"))
+    single = None
+    for workers in range(1, max_workers + 1):
+        player = MonteCarloPlayer(time_budget=time_budget, workers=workers, seed=0)
+
+        # The first move starts the pool, so only the second one is timed.
+        board = TicTacToe(15, win_length=5)
+        board.make_move(player.choose_move(board))
+        player.choose_move(board)
+        player.close()
+
+        search = player.last_search
+        single = single or search["rollouts_per_second"]
+        print("{:>8} {:>12} {:>12.0f} {:>10.2f}".format(
+            workers, search["rollouts"], search["rollouts_per_second"], search["rollouts_per_second"] / single))
+
+
+if __name__ == '__main__':
+    main()
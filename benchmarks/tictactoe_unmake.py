@@ -0,0 +1,96 @@
+import copy
+import sys
+import time
+
+from games.bitboard import BitboardTicTacToe
+from games.tictactoe import TicTacToe
+
+
+def walk_copy(board: TicTacToe, depth: int) -> int:
+    """
+    A function which visits every sequence of depth moves, with a deep copy of the board for every position.
+
+    :param board: The board to start from.
+    :param depth: The amount of moves.
+    :return: The amount of positions visited.
+    """
+
+    if not depth or not board.active:
+        return 1
+
+    nodes = 1
+    for move in range(1, board.grid_size ** 2 + 1):
+        if board.get_symbol_at(move) == " ":
+            child = copy.deepcopy(board)
+            child.make_move(move)
+            nodes += walk_copy(child, depth - 1)
+
+    return nodes
+
+
+def walk_unmake(board: TicTacToe, depth: int) -> int:
+    """
+    A function which visits every sequence of depth moves on one board, unmaking every move after it.
+
+    :param board: The board to start from.
+    :param depth: The amount of moves.
+    :return: The amount of positions visited.
+    """
+
+    if not depth or not board.active:
+        return 1
+
+    nodes = 1
+    for move in range(1, board.grid_size ** 2 + 1):
+        if board.get_symbol_at(move) == " ":
+            board.make_move(move)
+            nodes += walk_unmake(board, depth - 1)
+            board.unmake_move()
+
+    return nodes
+
+
+def grid_size_in_bytes(board: TicTacToe) -> int:
+    """
+    A function which measures the memory of the grid of a TicTacToe, the lists and not the shared symbols.
+
+    :param board: The board.
+    :return: The size in bytes.
+    """
+
+    return sys.getsizeof(board.grid) + sum(sys.getsizeof(row) for row in board.grid)
+
+
+def main():
+    # (grid size, win length, depth), from the empty board.
+    walks = ((4, 4, 4), (15, 5, 2), (30, 5, 1))
+
+    print("{:>10} {:>6} {:>10} {:>10} {:>12} {:>12} {:>10}".format("board", "grid", "depth", "nodes", "copy s", "unmake s", "speedup"))
+    for name, board_class in (("lists", TicTacToe), ("bitboard", BitboardTicTacToe)):
+        for grid_size, win_length, depth in walks:
+            seconds = []
+            for walk in (walk_copy, walk_unmake):
+                board = board_class(grid_size, win_length=win_length)
+                start = time.perf_counter()
+                nodes = walk(board, depth)
+                seconds.append(time.perf_counter() - start)
+
+            print("{:>10} {:>6} {:>10} {:>10} {:>12.3f} {:>12.3f} {:>10.1f}".format(
+                name, "{0}x{0}".format(grid_size), depth, nodes, seconds[0], seconds[1], seconds[0] / seconds[1]))
+
+    # Memory of a half full board, as a grid and as a snapshot.
+    print("\n{:>10} {:>14} {:>16}".format("grid", "grid bytes", "snapshot bytes"))
+    for grid_size in (3, 15, 100):
+        board = TicTacToe(grid_size, win_length=min(grid_size, 5))
+        for move in range(1, grid_size ** 2 // 2 + 1):
+            # Keep playing after a line, to fill the board.
+            board.make_move(move)
+            board.active = True
+
+        snapshot = board.snapshot()
+        snapshot_size = sys.getsizeof(snapshot) + sum(sys.getsizeof(item) for item in snapshot[3:])
+        print("{:>10} {:>14} {:>16}".format("{0}x{0}".format(grid_size), grid_size_in_bytes(board), snapshot_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import threading
+import time
+
+from util.agent import VaultAgent, AgentClient
+from util.passgen import Vault
+
+
+def main():
+    lookups = 200
+
+    print("{:>10} {:>16} {:>16}".format("entries", "direct (ms)", "agent (ms)"))
+    for size in (100, 10000, 100000):
+        with tempfile.TemporaryDirectory() as directory:
+            vault = Vault(b"benchmark-key", os.path.join(directory, "vault.edb"))
+            with vault.session():
+                for index in range(size):
+                    vault.store_password("service{}".format(index), "password{}".format(index))
+
+            # Every lookup decrypts the vault file.
+            start = time.perf_counter()
+            for index in range(lookups // 10):
+                vault.get_password("service{}".format(index % size))
+            direct = (time.perf_counter() - start) / (lookups // 10)
+
+            # Every lookup is a socket round-trip to the agent.
+            socket_path = os.path.join(directory, "agent.sock")
+            agent = VaultAgent(vault, socket_path)
+            thread = threading.Thread(target=agent.run)
+            thread.start()
+            while not os.path.exists(socket_path):
+                time.sleep(0.01)
+
+            client = AgentClient(socket_path)
+            start = time.perf_counter()
+            for index in range(lookups):
+                client.get_password("service{}".format(index % size))
+            via_agent = (time.perf_counter() - start) / lookups
+
+            client.stop()
+            client.close()
+            thread.join()
+
+        print("{:>10} {:>16.4f} {:>16.4f}".format(size, direct * 1000, via_agent * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import time
+
+from util.commands import parse_command, run_batch, run_command
+from util.kdf import KdfParams
+from util.passgen import Vault
+
+
+def main():
+    size = 10000
+
+    print("{:>10} {:>18} {:>14} {:>10}".format("commands", "one by one (ms)", "batch (ms)", "speedup"))
+    for commands in (10, 100, 1000):
+        lines = ["set provisioned{} password{}".format(index, index) for index in range(commands)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            vault = Vault(b"benchmark-key", os.path.join(directory, "vault.edb"), kdf=KdfParams(cost=1 << 14))
+            vault.import_entries(("service{}".format(index), "password{}".format(index)) for index in range(size))
+
+            # Every command unlocks and writes the vault, like a separate process per command would.
+            start = time.perf_counter()
+            for line in lines:
+                arguments = parse_command(line)
+                run_command(vault, arguments[0], arguments[1:])
+            one_by_one = time.perf_counter() - start
+
+            # The batch unlocks and writes the vault once.
+            start = time.perf_counter()
+            run_batch(vault, lines)
+            batch = time.perf_counter() - start
+
+        print("{:>10} {:>18.1f} {:>14.1f} {:>10.1f}".format(commands, one_by_one * 1000, batch * 1000, one_by_one / batch))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import time
+
+from util.kdf import KdfParams
+from util.passgen import Vault, generate_passwords
+
+# The (compression, level) pairs to compare.
+CODECS = (
+    (None, None),
+    ("zlib", 1),
+    ("zlib", 6),
+    ("zlib", 9),
+    ("lzma", 0),
+    ("lzma", 6)
+)
+
+
+def main():
+    # The vault sizes can be given on the command line, i.e. "python -m benchmarks.vault_compression 10000".
+    sizes = [int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000]
+
+    print("{:>10} {:>8} {:>14} {:>10} {:>12} {:>14}".format("entries", "codec", "file size (kB)", "ratio", "lock (ms)", "unlock (ms)"))
+    for size in sizes:
+        # Realistic entries: structured service names and random passwords.
+        entries = dict(zip(("account{}@service{}.com".format(index, index % 1000) for index in range(size)),
+                           generate_passwords(size, 16, "311")))
+
+        plain_size = None
+        for compression, level in CODECS:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "vault.edb")
+                kdf = KdfParams(cost=1 << 10)
+
+                vault = Vault(b"benchmark-key", path, kdf=kdf, compression=compression, compression_level=level)
+                vault.import_entries(entries.items())
+
+                # Locking rewrites the whole vault after a single change.
+                with vault.session():
+                    vault.store_password("changed", "password")
+                    start = time.perf_counter()
+                    vault.flush()
+                    lock = time.perf_counter() - start
+
+                # A cold unlock reads and decrypts the vault from disk.
+                vault = Vault(b"benchmark-key", path)
+                start = time.perf_counter()
+                vault.unlock_vault()
+                unlock = time.perf_counter() - start
+                vault.lock_vault()
+
+                file_size = os.path.getsize(path)
+
+            plain_size = plain_size or file_size
+            codec = "{}-{}".format(compression, level) if compression else "none"
+            print("{:>10} {:>8} {:>14.1f} {:>10.2f} {:>12.1f} {:>14.1f}".format(size, codec, file_size / 1000, plain_size / file_size,
+                                                                            lock * 1000, unlock * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from util.passgen import Vault
+
+VAULT_KEY = b"benchmark-key"
+
+
+def writer(vault_file: str, writer_id: int, operations: int):
+    """
+    Store passwords, every store is a separate read-modify-write of the vault.
+
+    :param vault_file: The path to the vault file.
+    :param writer_id: The number of this writer.
+    :param operations: The amount of stores.
+    :return:
+    """
+
+    vault = Vault(VAULT_KEY, vault_file)
+    for index in range(operations):
+        vault.store_password("writer{}-{}".format(writer_id, index), "password{}".format(index))
+
+
+def reader(vault_file: str, operations: int):
+    """
+    Unlock and lock the vault, using the cached plaintext while nothing changed.
+
+    :param vault_file: The path to the vault file.
+    :param operations: The amount of reads.
+    :return:
+    """
+
+    vault = Vault(VAULT_KEY, vault_file, cache_plaintext=True)
+    for index in range(operations):
+        with vault.session():
+            vault.get_services()
+
+
+def run(vault_file: str, writers: int, readers: int, operations: int) -> float:
+    """
+    Run the writers and readers at the same time.
+
+    :param vault_file: The path to the vault file.
+    :param writers: The amount of writer processes.
+    :param readers: The amount of reader processes.
+    :param operations: The amount of operations per process.
+    :return: The total operations per second.
+    """
+
+    processes = [multiprocessing.Process(target=writer, args=(vault_file, writer_id, operations)) for writer_id in range(writers)]
+    processes += [multiprocessing.Process(target=reader, args=(vault_file, operations)) for _ in range(readers)]
+
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0, "A benchmark process failed."
+
+    return len(processes) * operations / (time.perf_counter() - start)
+
+
+def main():
+    size = 1000
+    operations = 50
+
+    print("{:>8} {:>8} {:>10} {:>14}".format("writers", "readers", "ops/s", "lost updates"))
+    for writers, readers in ((1, 0), (4, 0), (0, 4), (4, 4), (8, 8)):
+        with tempfile.TemporaryDirectory() as directory:
+            vault_file = os.path.join(directory, "vault.edb")
+
+            vault = Vault(VAULT_KEY, vault_file)
+            with vault.session():
+                for index in range(size):
+                    vault.store_password("service{}".format(index), "password{}".format(index))
+
+            throughput = run(vault_file, writers, readers, operations)
+
+            # Every store has to survive the concurrent writers.
+            lost = size + writers * operations - len(vault.get_services())
+
+        print("{:>8} {:>8} {:>10.0f} {:>14}".format(writers, readers, throughput, lost))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import time
+
+from util.passgen import Vault
+from util.storage import STORAGE_FORMATS
+
+
+def main():
+    lookups = 20
+
+    print("{:>10} {:>10} {:>16} {:>16}".format("format", "entries", "lookup (ms)", "write (ms)"))
+    for file_format in STORAGE_FORMATS:
+        for size in (100, 1000, 10000):
+            with tempfile.TemporaryDirectory() as directory:
+                vault = Vault(b"benchmark-key", os.path.join(directory, "vault.edb"), file_format=file_format)
+
+                # Fill the vault with a single write.
+                with vault.session():
+                    for index in range(size):
+                        vault.store_password("service{}".format(index), "password{}".format(index))
+
+                # Every lookup reads the vault from disk.
+                start = time.perf_counter()
+                for index in range(lookups):
+                    vault.get_password("service{}".format(index * size // lookups))
+                lookup = (time.perf_counter() - start) / lookups
+
+                # Every single write is flushed on its own, which is what the lookups are traded against.
+                with vault.session():
+                    start = time.perf_counter()
+                    for index in range(lookups):
+                        vault.store_password("service{}".format(index * size // lookups), "changed")
+                        vault.flush()
+                    write = (time.perf_counter() - start) / lookups
+
+            print("{:>10} {:>10} {:>16.4f} {:>16.4f}".format(file_format, size, lookup * 1000, write * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import time
+
+from util.kdf import KdfParams
+from util.passgen import Vault
+
+
+def timed(function, *arguments) -> float:
+    """
+    A function which measures a single call.
+
+    :param function: The function to call.
+    :param arguments: The arguments of the call.
+    :return: The time it took in ms.
+    """
+
+    start = time.perf_counter()
+    function(*arguments)
+
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    size = 100000
+
+    print("{:>10} {:>16} {:>16} {:>12} {:>12} {:>12}".format("format", "full load (ms)", "list (ms)", "exact (ms)", "prefix (ms)", "fuzzy (ms)"))
+    for file_format in ("blob", "indexed"):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "vault.edb")
+            kdf = KdfParams(cost=1 << 10)
+
+            Vault(b"benchmark-key", path, file_format=file_format, kdf=kdf).import_entries(
+                ("service{}".format(index), "password{}".format(index)) for index in range(size)
+            )
+
+            # What listing cost before the index: decrypting the whole vault.
+            full_load = timed(Vault(b"benchmark-key", path).unlock_vault)
+
+            # Every search uses a new Vault, so the index file is read from disk each time.
+            list_time = timed(Vault(b"benchmark-key", path).get_services)
+            exact = timed(Vault(b"benchmark-key", path).search_services, "SERVICE4242")
+            prefix = timed(Vault(b"benchmark-key", path).search_services, "service999", "prefix")
+            fuzzy = timed(Vault(b"benchmark-key", path).search_services, "servcie4242", "fuzzy")
+
+        print("{:>10} {:>16.1f} {:>16.1f} {:>12.1f} {:>12.1f} {:>12.1f}".format(file_format, full_load, list_time, exact, prefix, fuzzy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import time
+
+from util.passgen import Vault
+
+
+def time_operations(vault: Vault, operations: int, size: int) -> float:
+    """
+    Time a loop of get_password and store_password calls.
+
+    :param vault: The vault to run the operations on.
+    :param operations: The amount of operations to run.
+    :param size: The amount of entries in the vault.
+    :return: The average time per operation in seconds.
+    """
+
+    start = time.perf_counter()
+    for index in range(operations):
+        service = "service{}".format(index % size)
+        vault.get_password(service)
+        vault.store_password(service, "changed{}".format(index))
+
+    return (time.perf_counter() - start) / (operations * 2)
+
+
+def main():
+    operations = 200
+
+    print("{:>10} {:>16} {:>16}".format("entries", "per-op (ms)", "session (ms)"))
+    for size in (100, 1000, 10000, 50000):
+        with tempfile.TemporaryDirectory() as directory:
+            vault = Vault(b"benchmark-key", os.path.join(directory, "vault.edb"))
+
+            # Fill the vault with a single write.
+            with vault.session():
+                for index in range(size):
+                    vault.store_password("service{}".format(index), "password{}".format(index))
+
+            # Every call unlocks and locks the vault.
+            per_op = time_operations(vault, operations, size)
+
+            # All calls share one unlock and one write.
+            start = time.perf_counter()
+            with vault.session():
+                time_operations(vault, operations, size)
+            session = (time.perf_counter() - start) / (operations * 2)
+
+        print("{:>10} {:>16.4f} {:>16.4f}".format(size, per_op * 1000, session * 1000))
+
+
+if __name__ == '__main__':
+    main()
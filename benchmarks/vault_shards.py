@@ -0,0 +1,38 @@
+import os
+import tempfile
+import time
+
+from util.passgen import Vault
+
+
+def main():
+    size = 100000
+    writes = 20
+
+    print("{:>8} {:>16} {:>10}".format("shards", "write (ms)", "speedup"))
+    baseline = None
+    for shard_count in (1, 2, 4, 8, 16, 32):
+        with tempfile.TemporaryDirectory() as directory:
+            vault = Vault(b"benchmark-key", os.path.join(directory, "vault.edb"), file_format="sharded",
+                          storage_options={"shard_count": shard_count})
+
+            with vault.session():
+                for index in range(size):
+                    vault.store_password("service{}".format(index), "password{}".format(index))
+
+                # Time only the writes, the vault stays decrypted in memory.
+                vault.flush()
+                start = time.perf_counter()
+                for index in range(writes):
+                    vault.store_password("service{}".format(index), "changed{}".format(index))
+                    vault.flush()
+                write = (time.perf_counter() - start) / writes
+
+        if baseline is None:
+            baseline = write
+
+        print("{:>8} {:>16.3f} {:>9.1f}x".format(shard_count, write * 1000, baseline / write))
+
+
+if __name__ == '__main__':
+    main()
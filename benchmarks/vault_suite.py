@@ -0,0 +1,277 @@
+import argparse
+import datetime
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Peak memory is only measured on POSIX systems.
+    resource = None
+
+from util.kdf import KdfParams
+from util.passgen import Vault, generate_passwords
+from util.storage import STORAGE_FORMATS
+
+# A cheap key derivation, so the suite measures the vault and not scrypt.
+KDF_COST = 1 << 10
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000, 1000000)
+
+
+def service_name(index: int) -> str:
+    """
+    A function which returns the name of a synthetic service.
+
+    :param index: The number of the service.
+    :return: The service name.
+    """
+
+    return "account{}@service{}.example".format(index, index % 997)
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """
+    A function which picks a percentile with the nearest rank method.
+
+    :param samples: The sorted samples.
+    :param fraction: The percentile as a fraction, i.e. 0.99.
+    :return: The sample at that rank.
+    """
+
+    return samples[min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))]
+
+
+def measure(function, budget: float, min_samples: int, max_samples: int) -> list:
+    """
+    A function which calls function(index) until the time budget is used, and times every call.
+
+    :param function: The operation to time.
+    :param budget: The time budget in seconds.
+    :param min_samples: The least amount of calls, even if the budget runs out.
+    :param max_samples: The most amount of calls.
+    :return: The durations in seconds.
+    """
+
+    samples = []
+    deadline = time.perf_counter() + budget
+    for index in range(max_samples):
+        if len(samples) >= min_samples and time.perf_counter() > deadline:
+            break
+
+        start = time.perf_counter()
+        function(index)
+        samples.append(time.perf_counter() - start)
+
+    return samples
+
+
+def summarize(operation: str, samples: list) -> dict:
+    """
+    A function which summarises the durations of an operation.
+
+    :param operation: The name of the operation.
+    :param samples: The durations in seconds.
+    :return: The result record.
+    """
+
+    samples = sorted(samples)
+    total = sum(samples)
+
+    return {
+        "operation": operation,
+        "samples": len(samples),
+        "throughput": len(samples) / total if total else None,
+        "mean_ms": total / len(samples) * 1000,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000
+    }
+
+
+def peak_rss_mb():
+    """
+    A function which returns the peak memory use of this process.
+
+    :return: The peak resident set size in MB, or None if it can't be measured.
+    """
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kB, macOS reports bytes.
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(file_format: str, size: int, budget: float, min_samples: int) -> dict:
+    """
+    A function which benchmarks every operation on a synthetic vault of one size.
+    It runs in a fresh process, so the peak memory belongs to this vault size alone.
+
+    :param file_format: The vault file format.
+    :param size: The amount of entries.
+    :param budget: The time budget per operation in seconds.
+    :param min_samples: The least amount of samples per operation.
+    :return: The results of the case.
+    """
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "vault.edb")
+        kdf = KdfParams(cost=KDF_COST, salt=b"vault-benchmarks")
+
+        def open_vault() -> Vault:
+            return Vault(b"benchmark-key", path, file_format=file_format, kdf=kdf)
+
+        start = time.perf_counter()
+        open_vault().import_entries(zip(map(service_name, range(size)), generate_passwords(size, 16, "311")))
+        build = time.perf_counter() - start
+
+        vault = open_vault()
+
+        # A cold unlock reads and decrypts the vault with a new Vault, like a new process would.
+        def cold_unlock(index: int):
+            cold = open_vault()
+            cold.unlock_vault()
+            cold.passwords = None
+
+        results.append(summarize("unlock_vault", measure(cold_unlock, budget, min_samples, 1000)))
+
+        # Locking writes a single change.
+        lock_samples = []
+
+        def lock(index: int):
+            vault.unlock_vault()
+            vault.passwords[service_name(index % size)] = "changed"
+            vault.changes[service_name(index % size)] = "changed"
+
+            start = time.perf_counter()
+            vault.lock_vault()
+            lock_samples.append(time.perf_counter() - start)
+
+        measure(lock, budget, min_samples, 1000)
+        results.append(summarize("lock_vault", lock_samples))
+
+        # Gets read the lower half of the services, deletes remove the upper half from the top.
+        deleted = itertools.count()
+        operations = (
+            ("get_password", lambda index: vault.get_password(service_name(index * 7919 % max(1, size // 2))), 1 << 20),
+            ("get_services", lambda index: vault.get_services(), 1 << 20),
+            ("store_password", lambda index: vault.store_password(service_name(index * 7919 % size), "changed"), 1 << 20),
+            ("generate_password", lambda index: vault.generate_password("generated{}".format(index), 16, "311"), 1 << 20),
+            ("delete_service", lambda index: vault.delete_service(service_name(size - 1 - next(deleted))), max(1, size // 4))
+        )
+
+        # Every call on its own unlocks and locks the vault, in a session they share one unlock and one write.
+        for operation, function, max_samples in operations:
+            results.append(summarize(operation, measure(function, budget, min_samples, max_samples)))
+
+        with vault.session():
+            for operation, function, max_samples in operations:
+                results.append(summarize(operation + "[session]", measure(function, budget, min_samples, max_samples)))
+
+    for result in results:
+        result.update({"format": file_format, "entries": size})
+
+    return {"format": file_format, "entries": size, "build_s": build, "peak_rss_mb": peak_rss_mb(), "results": results}
+
+
+def git_revision():
+    """
+    A function which returns the checked out revision of the repo.
+
+    :return: The commit hash, or None outside a git checkout.
+    """
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list, baseline_path: str):
+    """
+    A function which prints the change in p50 latency against an earlier run.
+
+    :param results: The result records of this run.
+    :param baseline_path: The path to the JSON file of the earlier run.
+    :return:
+    """
+
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    old = {(result["format"], result["entries"], result["operation"]): result for result in baseline["results"]}
+
+    print("\nCompared to {} ({}):".format(baseline_path, baseline["meta"].get("revision")))
+    print("{:>8} {:>8} {:>26} {:>12} {:>12} {:>8}".format("format", "entries", "operation", "old p50", "new p50", "ratio"))
+    for result in results:
+        previous = old.get((result["format"], result["entries"], result["operation"]))
+        if previous is None:
+            continue
+
+        print("{:>8} {:>8} {:>26} {:>12.4f} {:>12.4f} {:>8.2f}".format(result["format"], result["entries"], result["operation"],
+                                                                      previous["p50_ms"], result["p50_ms"],
+                                                                      result["p50_ms"] / previous["p50_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vault operations across vault sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="The amounts of entries.")
+    parser.add_argument("--formats", nargs="+", default=["blob"], choices=list(STORAGE_FORMATS), help="The vault file formats.")
+    parser.add_argument("--budget", type=float, default=1.0, help="The time budget per operation in seconds. Default: 1.")
+    parser.add_argument("--min-samples", type=int, default=3, help="The least amount of samples per operation. Default: 3.")
+    parser.add_argument("--output", default="vault_benchmarks.json", help="The JSON file to write the results to.")
+    parser.add_argument("--compare", metavar="JSON", help="An earlier results file to compare against.")
+    args = parser.parse_args()
+
+    cases = []
+    results = []
+
+    print("{:>8} {:>8} {:>26} {:>8} {:>12} {:>12} {:>12}".format("format", "entries", "operation", "samples", "ops/s", "p50 (ms)", "p99 (ms)"))
+    for file_format, size in itertools.product(args.formats, args.sizes):
+        # A new process per case, so the peak memory of a large vault doesn't carry over to the next one.
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            case = executor.submit(run_case, file_format, size, args.budget, args.min_samples).result()
+
+        for result in case["results"]:
+            print("{:>8} {:>8} {:>26} {:>8} {:>12.1f} {:>12.4f} {:>12.4f}".format(file_format, size, result["operation"], result["samples"],
+                                                                               result["throughput"] or 0, result["p50_ms"], result["p99_ms"]))
+
+        print("{:>8} {:>8} {:>26} {:>.1f} MB peak RSS, built in {:.1f} s".format(file_format, size, "", case["peak_rss_mb"] or 0, case["build_s"]))
+
+        results.extend(case.pop("results"))
+        cases.append(case)
+
+    meta = {
+        "revision": git_revision(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "kdf_cost": KDF_COST,
+        "budget_s": args.budget,
+        "min_samples": args.min_samples
+    }
+
+    with open(args.output, 'w') as output_file:
+        json.dump({"meta": meta, "cases": cases, "results": results}, output_file, indent=2)
+
+    print("\nWrote the results to {}.".format(args.output))
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
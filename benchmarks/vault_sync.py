@@ -0,0 +1,43 @@
+import os
+import tempfile
+import time
+
+from util.kdf import KdfParams
+from util.passgen import Vault
+
+
+def main():
+    changes = 10
+
+    print("{:>10} {:>10} {:>8} {:>10} {:>14} {:>12}".format("entries", "changes", "depth", "hashes", "sync (ms)", "copy (ms)"))
+    for size in (1000, 10000, 100000):
+        with tempfile.TemporaryDirectory() as directory:
+            local_path = os.path.join(directory, "local", "vault.edb")
+            remote_directory = os.path.join(directory, "remote")
+            os.makedirs(os.path.dirname(local_path))
+            os.makedirs(remote_directory)
+
+            local = Vault(b"benchmark-key", local_path, file_format="indexed", kdf=KdfParams(cost=1 << 10))
+            local.import_entries(("service{}".format(index), "password{}".format(index)) for index in range(size))
+
+            # The first sync copies every entry.
+            start = time.perf_counter()
+            local.merge(remote_directory)
+            copy = time.perf_counter() - start
+
+            # Change a few entries on both sides.
+            remote = Vault(b"benchmark-key", os.path.join(remote_directory, "vault.edb"))
+            with local.session(), remote.session():
+                for index in range(changes // 2):
+                    local.store_password("service{}".format(index * 97), "local")
+                    remote.store_password("service{}".format(index * 89 + 1), "remote")
+
+            start = time.perf_counter()
+            result = local.merge(remote_directory)
+            sync = time.perf_counter() - start
+
+        print("{:>10} {:>10} {:>8} {:>10} {:>14.1f} {:>12.1f}".format(size, changes, result["depth"], result["hashes"], sync * 1000, copy * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import time
+
+from util.kdf import KdfParams
+from util.passgen import Vault
+
+
+def store_latencies(vault: Vault, operations: int, size: int, pause: float) -> list:
+    """
+    Time store_password calls on a vault, with a pause in between like a user or a script would have.
+    The pauses let the background writes of write-behind mode run while the stores are timed.
+
+    :param vault: The vault to store in.
+    :param operations: The amount of stores.
+    :param size: The amount of entries in the vault.
+    :param pause: The time between two stores in seconds.
+    :return: The sorted durations in seconds.
+    """
+
+    samples = []
+    for index in range(operations):
+        start = time.perf_counter()
+        vault.store_password("service{}".format(index * 7919 % size), "changed{}".format(index))
+        samples.append(time.perf_counter() - start)
+
+        time.sleep(pause)
+
+    return sorted(samples)
+
+
+def main():
+    operations = 200
+    pause = 0.005
+    kdf = KdfParams(cost=1 << 10)
+
+    print("{:>10} {:>14} {:>12} {:>12} {:>12} {:>14}".format("entries", "mode", "p50 (ms)", "p99 (ms)", "max (ms)", "close (ms)"))
+    for size in (1000, 10000, 100000):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "vault.edb")
+            Vault(b"benchmark-key", path, kdf=kdf).import_entries(("service{}".format(index), "password{}".format(index)) for index in range(size))
+
+            for mode, write_behind in (("synchronous", False), ("write-behind", True)):
+                vault = Vault(b"benchmark-key", path, kdf=kdf, write_behind=write_behind, flush_interval=0.1)
+
+                # Unlock first, so the first store doesn't include decrypting the vault.
+                vault.unlock_vault()
+                samples = store_latencies(vault, operations, size, pause)
+
+                # Closing writes what is still pending.
+                start = time.perf_counter()
+                vault.close()
+                close = time.perf_counter() - start
+
+                print("{:>10} {:>14} {:>12.4f} {:>12.4f} {:>12.4f} {:>14.1f}".format(
+                    size, mode, samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99)] * 1000, samples[-1] * 1000, close * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,501 @@
+import random
+import time
+
+from .bitboard import BitboardTicTacToe
+from .tictactoe import TicTacToe
+
+# Scores of won and lost games. A win after more moves scores a little lower, so the fastest win is played.
+WIN_SCORE = 1000000
+WIN_THRESHOLD = WIN_SCORE - 10000
+
+# The bounds of a transposition table value.
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+# Boards larger than this only consider moves next to the symbols that are already on the board.
+FULL_WIDTH_SIZE = 5
+
+
+def line_masks(board: BitboardTicTacToe) -> tuple:
+    """
+    A function which finds where the lines of win_length on a board are.
+
+    :param board: The board.
+    :return: Per direction, the cells where a line fits on the board. And per cell, the starts of the lines through it
+             per direction.
+    """
+
+    line_fits = []
+    for step in board.line_steps:
+        fits = board.valid
+        for distance in range(1, board.win_length):
+            fits &= board.valid >> (distance * step)
+        line_fits.append(fits)
+
+    cell_lines = {}
+    for row in range(board.grid_size):
+        for column in range(board.grid_size):
+            cell = row * board.stride + column
+            cell_lines[cell] = tuple(sum(1 << (cell - distance * step) for distance in range(board.win_length)
+                                         if cell >= distance * step) & fits
+                                     for step, fits in zip(board.line_steps, line_fits))
+
+    return tuple(line_fits), cell_lines
+
+
+def find_lines(board: BitboardTicTacToe, line_fits: tuple) -> tuple:
+    """
+    A function which finds the lines that hold a symbol on a board, to update with claim_lines() during a search.
+    Once the dead lines are all the lines that fit, nobody can win anymore.
+
+    :param board: The board.
+    :param line_fits: The cells where a line fits per direction, see line_masks().
+    :return: (lines per player, lines of any player, dead lines), each a tuple of line starts per direction.
+    """
+
+    owned = []
+    union = [0] * len(line_fits)
+    dead = [0] * len(line_fits)
+    for bitboard in board.bitboards:
+        mine = []
+        for index, (step, fits) in enumerate(zip(board.line_steps, line_fits)):
+            lines = bitboard
+            for distance in range(1, board.win_length):
+                lines |= bitboard >> (distance * step)
+            lines &= fits
+
+            dead[index] |= union[index] & lines
+            union[index] |= lines
+            mine.append(lines)
+
+        owned.append(tuple(mine))
+
+    return tuple(owned), tuple(union), tuple(dead)
+
+
+def claim_lines(lines: tuple, player: int, through: tuple) -> tuple:
+    """
+    A function which updates the lines for a symbol of a player on a cell. The lines through the cell that already
+    hold a symbol of another player die. The lines are tuples of ints, so a search takes a move back by keeping the
+    old ones, instead of undoing it.
+
+    :param lines: The lines before the move, see find_lines().
+    :param player: The player.
+    :param through: The lines through the cell, see line_masks().
+    :return: The lines after the move.
+    """
+
+    owned, union, dead = lines
+    mine = owned[player]
+
+    dead = tuple(starts | new & ~held & others for starts, new, held, others in zip(dead, through, mine, union))
+    union = tuple(starts | new for starts, new in zip(union, through))
+    owned = owned[:player] + (tuple(starts | new for starts, new in zip(mine, through)),) + owned[player + 1:]
+
+    return owned, union, dead
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time budget of a move is used up.
+    """
+
+
+class TranspositionTable:
+    def __init__(self, size: int = 1 << 18):
+        """
+        A hash table of searched positions with a fixed amount of slots, so its memory is bounded.
+
+        A position goes in the slot of its hash. When the slot is taken, the deeper search is kept, and entries from
+        earlier moves are always replaced, as they are less likely to be seen again.
+        """
+
+        # The size is rounded up to a power of 2, so the slot is the low bits of the hash.
+        self.size = 1 << max(0, size - 1).bit_length()
+        self.entries = [None] * self.size
+        self.age = 0
+
+    def new_search(self):
+        """
+        A function which marks the entries so far as old, at the start of the search for a move.
+
+        :return:
+        """
+
+        self.age += 1
+
+    def get(self, key: int):
+        """
+        A function which looks up a position.
+
+        :param key: The hash of the position.
+        :return: (key, depth, value, bound, move, age), or None if the position isn't stored.
+        """
+
+        entry = self.entries[key & (self.size - 1)]
+        if entry is not None and entry[0] == key:
+            return entry
+
+        return None
+
+    def put(self, key: int, depth: int, value: int, bound: int, move):
+        """
+        A function which stores the result of searching a position, unless its slot holds a deeper search.
+
+        :param key: The hash of the position.
+        :param depth: The depth the position was searched to.
+        :param value: The value of the position.
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND.
+        :param move: The best move found, as a canonical cell, or None.
+        :return:
+        """
+
+        slot = key & (self.size - 1)
+        entry = self.entries[slot]
+        if entry is None or entry[5] != self.age or depth >= entry[1]:
+            self.entries[slot] = (key, depth, value, bound, move, self.age)
+
+
+class AlphaBetaPlayer:
+    def __init__(self, time_budget: float = 1.0, max_depth: int = None, table_size: int = 1 << 18, seed: int = None):
+        """
+        A computer player for Tic Tac Toe with any grid size, win length and amount of players.
+
+        Moves are searched with iterative deepening alpha-beta until the time budget runs out, or the game is solved.
+        Boards larger than FULL_WIDTH_SIZE only search moves next to a symbol, so they are never reported as solved.
+        With more than 2 players the search is paranoid: the other players are assumed to all play against this one.
+        Positions are stored in a TranspositionTable under a Zobrist hash that is the same for all 8 rotations and
+        reflections of the board, so symmetric positions are only searched once.
+
+        Positions at the search horizon are scored by the lines that are still open to each player.
+        """
+
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.table = TranspositionTable(table_size)
+        self.random = random.Random(seed)
+
+        # The board the search runs on, and the tables for its shape. See _setup().
+        self.board = None
+        self.shape = None
+
+        # The lines of win_length that hold a symbol, per player and in total, and the dead lines. See find_lines().
+        self.lines = None
+
+        # The player this search plays for, and the statistics of the last search.
+        self.me = 0
+        self.nodes = 0
+        self.deadline = None
+        self.root_move = None
+        self.last_search = {}
+
+    def _setup(self, board: TicTacToe):
+        """
+        A function which copies a board to search on, and builds the tables for its shape once.
+
+        :param board: The board of the game.
+        :return:
+        """
+
+        self.board = BitboardTicTacToe.from_board(board)
+        self.me = board.current_player
+
+        shape = (board.grid_size, board.win_length, board.players)
+        if shape == self.shape:
+            return
+
+        self.shape = shape
+        self.table = TranspositionTable(self.table.size)
+
+        size = board.grid_size
+        stride = self.board.stride
+        cells = [row * stride + column for row in range(size) for column in range(size)]
+        self.valid = sum(1 << cell for cell in cells)
+
+        # The cell every cell moves to under the 8 rotations and reflections of the board.
+        last = size - 1
+        transforms = (
+            lambda row, column: (row, column),
+            lambda row, column: (column, last - row),
+            lambda row, column: (last - row, last - column),
+            lambda row, column: (last - column, row),
+            lambda row, column: (row, last - column),
+            lambda row, column: (last - row, column),
+            lambda row, column: (column, row),
+            lambda row, column: (last - column, last - row)
+        )
+
+        self.symmetries = []
+        self.inverses = []
+        for transform in transforms:
+            mapping = {}
+            for cell in cells:
+                row, column = transform(*divmod(cell, stride))
+                mapping[cell] = row * stride + column
+
+            self.symmetries.append(mapping)
+            self.inverses.append({target: cell for cell, target in mapping.items()})
+
+        # Zobrist keys per player and cell, one for every symmetry, so the 8 hashes are updated together.
+        zobrist = [{cell: self.random.getrandbits(64) for cell in cells} for _ in range(board.players)]
+        self.keys = [{cell: tuple(zobrist[player][mapping[cell]] for mapping in self.symmetries) for cell in cells}
+                     for player in range(board.players)]
+        self.turn_keys = [self.random.getrandbits(64) for _ in range(board.players)]
+
+        # Scores depend on the player that searches, so its positions get their own keys.
+        self.player_keys = [self.random.getrandbits(64) for _ in range(board.players)]
+
+        # Moves are tried from the centre out.
+        centre = last / 2
+        self.order = sorted(cells, key=lambda cell: abs(cell // stride - centre) + abs(cell % stride - centre))
+
+        # The lines of win_length on the board, to score positions and to find draws with.
+        self.line_fits, self.cell_lines = line_masks(self.board)
+
+    def choose_move(self, board: TicTacToe) -> int:
+        """
+        A function which picks a move for the player whose turn it is.
+
+        :param board: The board of the game. It is not changed.
+        :return: The move, numbered like the moves of the board, from 1.
+        """
+
+        start = time.perf_counter()
+        self._setup(board)
+        self.table.new_search()
+        self.nodes = 0
+        self.deadline = start + self.time_budget if self.time_budget is not None else None
+
+        empty_cells = bin(self.valid & ~self.board.occupied).count("1")
+        self.lines = find_lines(self.board, self.line_fits)
+        max_depth = min(empty_cells, self.max_depth or empty_cells)
+        hashes = self._hashes()
+
+        if not empty_cells:
+            raise ValueError("There are no moves left on the board.")
+
+        # Fall back to the first move in order if not even the first depth finishes in time.
+        best_move = next(cell for cell in self.order if not self.board.occupied >> cell & 1)
+        self.last_search = {"depth": 0, "value": 0, "solved": False}
+
+        for depth in range(1, max_depth + 1):
+            try:
+                value = self._search(depth, 0, -WIN_SCORE - 1, WIN_SCORE + 1, self.me, hashes)
+            except SearchTimeout:
+                break
+
+            best_move = self.root_move
+            decided = depth == empty_cells or abs(value) >= WIN_THRESHOLD
+
+            # Moves away from the symbols are left out on large boards, so the value only holds for the moves searched.
+            solved = decided and self.board.grid_size <= FULL_WIDTH_SIZE
+            self.last_search = {"depth": depth, "value": value, "solved": solved}
+
+            # The result can't change anymore once the game is decided or the whole game is searched.
+            if decided:
+                break
+
+        self.last_search.update({"nodes": self.nodes, "seconds": time.perf_counter() - start})
+
+        row, column = divmod(best_move, self.board.stride)
+
+        return row * board.grid_size + column + 1
+
+    def close(self):
+        """
+        A function which frees the resources of the player. The search runs in this process, so there are none.
+
+        :return:
+        """
+
+    def _hashes(self) -> list:
+        """
+        A function which computes the Zobrist hash of the board under every symmetry.
+
+        :return: The 8 hashes.
+        """
+
+        hashes = [0] * 8
+        for player, bitboard in enumerate(self.board.bitboards):
+            for cell in self.order:
+                if bitboard >> cell & 1:
+                    hashes = [current ^ key for current, key in zip(hashes, self.keys[player][cell])]
+
+        return hashes
+
+    def _moves(self, empty: int, first) -> list:
+        """
+        A function which lists the moves to search, best first.
+
+        :param empty: The bits of the empty cells.
+        :param first: A move to try first, i.e. the best move of an earlier search, or None.
+        :return: The cells.
+        """
+
+        # On large boards, only cells next to a symbol are worth a move.
+        if self.board.grid_size > FULL_WIDTH_SIZE and self.board.occupied:
+            near = self.board.occupied
+            for step in self.board.line_steps:
+                near |= self.board.occupied << step | self.board.occupied >> step
+
+            # Unless every cell next to a symbol is taken.
+            empty = empty & near or empty
+
+        moves = [cell for cell in self.order if empty >> cell & 1]
+        if first is not None and empty >> first & 1:
+            moves.remove(first)
+            moves.insert(0, first)
+
+        return moves
+
+    def _evaluate(self) -> int:
+        """
+        A function which scores a position at the search horizon for this player.
+        Every player scores the lines of win_length that the others have not blocked and that hold their symbol.
+
+        :return: The score of this player minus the scores of the others.
+        """
+
+        board = self.board
+        score = 0
+        for player, bitboard in enumerate(board.bitboards):
+            free = self.valid & ~(board.occupied ^ bitboard)
+
+            lines = 0
+            for step, fits in zip(board.line_steps, self.line_fits):
+                open_lines = fits
+                owned = bitboard
+                for distance in range(1, board.win_length):
+                    open_lines &= free >> (distance * step)
+                    owned |= bitboard >> (distance * step)
+
+                lines += bin(open_lines & owned).count("1")
+
+            score += lines if player == self.me else -lines
+
+        return score
+
+    def _search(self, depth: int, ply: int, alpha: int, beta: int, player: int, hashes: list) -> int:
+        """
+        A function which searches a position with alpha-beta, this player maximises and the others minimise.
+
+        :param depth: The amount of moves left to search.
+        :param ply: The amount of moves made since the root.
+        :param alpha: The score this player is already sure of.
+        :param beta: The score the other players are already sure of.
+        :param player: The player whose turn it is.
+        :param hashes: The Zobrist hashes of the position under every symmetry.
+        :return: The score of the position.
+        """
+
+        self.nodes += 1
+        if not self.nodes & 1023 and self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        # The smallest of the 8 hashes is the same for every symmetric position.
+        canonical = min(hashes)
+        symmetry = hashes.index(canonical)
+        key = canonical ^ self.turn_keys[player] ^ self.player_keys[self.me]
+
+        # Use an earlier search of this position.
+        table_move = None
+        entry = self.table.get(key)
+        if entry is not None:
+            _, entry_depth, value, bound, move, _ = entry
+            if move is not None:
+                table_move = self.inverses[symmetry][move]
+
+            if entry_depth >= depth and ply:
+                # Wins are stored relative to the position, not the root.
+                if value >= WIN_THRESHOLD:
+                    value -= ply
+                elif value <= -WIN_THRESHOLD:
+                    value += ply
+
+                if bound == EXACT:
+                    return value
+                elif bound == LOWER_BOUND:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+
+                if alpha >= beta:
+                    return value
+
+        board = self.board
+        empty = self.valid & ~board.occupied
+
+        # A full board is a draw, and so is a board where every line is dead. Only tracked above the search horizon.
+        if not empty or depth and self.lines[2] == self.line_fits:
+            return 0
+
+        if not depth:
+            return self._evaluate()
+
+        maximising = player == self.me
+        best_value = -WIN_SCORE - 1 if maximising else WIN_SCORE + 1
+        best_move = None
+        original_alpha, original_beta = alpha, beta
+        next_player = (player + 1) % board.players
+
+        # In a symmetric position, moves that are mirror images of each other lead to the same positions.
+        seen = set() if hashes.count(hashes[0]) > 1 else None
+
+        for cell in self._moves(empty, table_move):
+            child_hashes = [current ^ key for current, key in zip(hashes, self.keys[player][cell])]
+            if seen is not None:
+                if min(child_hashes) in seen:
+                    continue
+                seen.add(min(child_hashes))
+
+            bit = 1 << cell
+            board.bitboards[player] |= bit
+            board.occupied |= bit
+
+            # Positions at the horizon don't look for draws, so the moves into them skip the line tracking.
+            # Those are most of the moves, which keeps it cheap.
+            lines = self.lines
+            if depth > 1:
+                self.lines = claim_lines(self.lines, player, self.cell_lines[cell])
+
+            try:
+                if board.has_line(player, cell):
+                    value = WIN_SCORE - ply - 1 if maximising else -(WIN_SCORE - ply - 1)
+                else:
+                    value = self._search(depth - 1, ply + 1, alpha, beta, next_player, child_hashes)
+            finally:
+                board.bitboards[player] ^= bit
+                board.occupied ^= bit
+                self.lines = lines
+
+            if maximising:
+                if value > best_value:
+                    best_value, best_move = value, cell
+                alpha = max(alpha, value)
+            else:
+                if value < best_value:
+                    best_value, best_move = value, cell
+                beta = min(beta, value)
+
+            if alpha >= beta:
+                break
+
+        if not ply:
+            self.root_move = best_move
+
+        # Store the result, with wins relative to this position.
+        if best_value <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_value >= original_beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+
+        stored = best_value
+        if stored >= WIN_THRESHOLD:
+            stored += ply
+        elif stored <= -WIN_THRESHOLD:
+            stored -= ply
+
+        self.table.put(key, depth, stored, bound, self.symmetries[symmetry][best_move])
+
+        return best_value
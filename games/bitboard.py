@@ -0,0 +1,465 @@
+import copy
+
+from .tictactoe import LINE_DIRECTIONS, TicTacToe
+
+
+class BitboardTicTacToe(TicTacToe):
+    def __init__(self, *args, **kwargs):
+        """
+        A Tic Tac Toe board that stores the cells of every player as the bits of one int, instead of a list of lists.
+        It takes the same arguments and plays the same as TicTacToe, but uses a fraction of the memory, copies in
+        constant time and can be hashed, which makes it the board for searching moves.
+
+        Cell (row, column) is bit row * stride + column. The stride is one more than the grid size, so every row ends
+        in an empty padding bit, and a line that runs off the side of the grid always hits it.
+        """
+
+        self.bitboards = None
+        self.occupied = 0
+
+        super().__init__(*args, **kwargs)
+
+    def generate_grid(self):
+        """
+        Makes an empty board, and the masks to find lines with.
+
+        :return:
+        """
+
+        self.stride = self.grid_size + 1
+        self.bitboards = [0] * self.players
+        self.occupied = 0
+
+        # The bits of the cells of the grid, without the padding bits.
+        row_mask = (1 << self.grid_size) - 1
+        self.valid = 0
+        for row in range(self.grid_size):
+            self.valid |= row_mask << (row * self.stride)
+
+        # The bit steps of the line directions.
+        self.line_steps = [row_step * self.stride + column_step for row_step, column_step in LINE_DIRECTIONS]
+
+        # Lines are looked for in a window of the board around the changed cell, which is at bit window_radius in it.
+        self.window_radius = (self.win_length - 1) * (self.stride + 1)
+        self.window_mask = (1 << (2 * self.window_radius + 1)) - 1
+
+        # Per direction, the bits in the window where a line through the changed cell can start.
+        self.line_starts = [sum(1 << (self.window_radius - offset * step) for offset in range(self.win_length))
+                            for step in self.line_steps]
+
+        # Per direction, the bits of the line starts up to 0, 1, ... win_length - 1 steps back from the changed cell.
+        self.nearest_starts = []
+        for step in self.line_steps:
+            starts = 0
+            nearest = []
+            for offset in range(self.win_length):
+                starts |= 1 << (self.window_radius - offset * step)
+                nearest.append(starts)
+            self.nearest_starts.append(nearest)
+
+    @property
+    def grid(self) -> list:
+        """
+        A copy of the board as a list of rows of symbols, like the grid of TicTacToe.
+        Changing it does not change the board.
+
+        :return:
+        """
+
+        return [[self.get_cell(row, column) for column in range(self.grid_size)] for row in range(self.grid_size)]
+
+    def get_cell(self, row: int, column: int) -> str:
+        """
+        Get the symbol in a cell.
+
+        :param row: The row of the cell.
+        :param column: The column of the cell.
+        :return: The symbol, a space if the cell is empty.
+        """
+
+        bit = 1 << (row * self.stride + column)
+        if self.occupied & bit:
+            for player_id, bitboard in enumerate(self.bitboards):
+                if bitboard & bit:
+                    return self.player_icons[player_id]
+
+        return " "
+
+    def get_symbol_at(self, move):
+        """
+        Get the symbol at place move.
+
+        :param move: The move index.
+        :return: The symbol.
+        """
+
+        row, column = divmod(move - 1, self.grid_size)
+
+        return self.get_cell(row, column)
+
+    def print_grid(self):
+        """
+        A function that prints the current state of the grid.
+
+        :return:
+        """
+
+        for row in self.grid:
+            print(" | ".join(row))
+
+    def make_move(self, move: int):
+        """
+        Updates the board with the move made.
+
+        :param move: The index of what has changed.
+
+        :return:
+        """
+
+        row_changed, column_changed = divmod(move - 1, self.grid_size)
+
+        # Remember the state before the move.
+        self.history.append((move, self.active, self.winner, self.current_player))
+
+        # Put the symbol on the cell, and check if someone has won, or if nobody can win anymore.
+        if self.place(self.current_player, row_changed * self.stride + column_changed):
+            self.winner = self.current_player
+            self.active = False
+        else:
+            self.active = not self.track_lines or self.live_lines > 0
+
+        # Switch the players.
+        self.switch_player()
+
+    def unmake_move(self) -> int:
+        """
+        Takes back the last move, and restores the winner, active flag and current player from before it.
+
+        :return: The move that was taken back.
+        """
+
+        if not self.history:
+            raise ValueError("There are no moves to unmake.")
+
+        move, self.active, self.winner, self.current_player = self.history.pop()
+
+        row, column = divmod(move - 1, self.grid_size)
+        self.remove(self.current_player, row * self.stride + column)
+
+        return move
+
+    def place(self, player_id: int, cell: int) -> bool:
+        """
+        Puts a symbol of a player on an empty cell, and updates dead_lines. Unlike make_move(), the turn, winner and
+        history are left alone, so searches can use it to try moves.
+
+        :param player_id: The PlayerID of the player.
+        :param cell: The bit of the cell, row * stride + column.
+        :return: Whether the symbol made a line of win_length.
+        """
+
+        if self.track_lines:
+            # The windows of the bitboards around the cell are shared by the line tracking and the win check.
+            windows = self._windows(cell)
+            self.dead_lines += self._line_change(*divmod(cell, self.stride), player_id, windows)
+            window = windows[player_id]
+        else:
+            offset = cell - self.window_radius
+            bitboard = self.bitboards[player_id]
+            window = (bitboard >> offset if offset >= 0 else bitboard << -offset) & self.window_mask
+
+        # Set the bit of the cell for the player.
+        bit = 1 << cell
+        self.bitboards[player_id] |= bit
+        self.occupied |= bit
+
+        return self._window_has_line(window | 1 << self.window_radius)
+
+    def remove(self, player_id: int, cell: int):
+        """
+        Takes a symbol of a player off a cell again, see place().
+
+        :param player_id: The PlayerID of the player.
+        :param cell: The bit of the cell, row * stride + column.
+        :return:
+        """
+
+        # Clear the bit of the cell.
+        bit = 1 << cell
+        self.bitboards[player_id] &= ~bit
+        self.occupied &= ~bit
+
+        if self.track_lines:
+            self.dead_lines -= self._line_change(*divmod(cell, self.stride), player_id, self._windows(cell))
+
+    def snapshot(self) -> tuple:
+        """
+        An immutable, hashable copy of the position, see TicTacToe.snapshot().
+        The padding bits are left out row by row, so it matches the snapshot of a TicTacToe.
+
+        :return: The snapshot.
+        """
+
+        row_mask = (1 << self.grid_size) - 1
+        cells = []
+        for bitboard in self.bitboards:
+            packed = 0
+            for row in range(self.grid_size):
+                packed |= (bitboard >> (row * self.stride) & row_mask) << (row * self.grid_size)
+            cells.append(packed)
+
+        return (self.current_player, self.active, self.winner) + tuple(cells)
+
+    def restore(self, snapshot: tuple):
+        """
+        Sets the board to the position of a snapshot of a board with the same size and players.
+        The moves that led to it are not known, so the history is cleared.
+
+        :param snapshot: The snapshot, see snapshot().
+        :return:
+        """
+
+        self.current_player, self.active, self.winner = snapshot[:3]
+        self.history = []
+
+        row_mask = (1 << self.grid_size) - 1
+        self.bitboards = []
+        for packed in snapshot[3:]:
+            bitboard = 0
+            for row in range(self.grid_size):
+                bitboard |= (packed >> (row * self.grid_size) & row_mask) << (row * self.stride)
+            self.bitboards.append(bitboard)
+
+        self.occupied = 0
+        for bitboard in self.bitboards:
+            self.occupied |= bitboard
+
+        # Count the dead lines again.
+        if self.track_lines:
+            self.dead_lines = self.count_dead_lines()
+
+    def check_win(self, row_changed: int, column_changed: int) -> bool:
+        """
+        Checks if the move made a line of win_length symbols in any direction.
+
+        :param row_changed: The row that has changed with the move.
+        :param column_changed: The column that has changed with the move.
+
+        :return:
+        """
+
+        if self.has_line(self.current_player, row_changed * self.stride + column_changed):
+            # Set the winner.
+            self.winner = self.current_player
+
+            # Game is not active anymore.
+            return False
+
+        # Nobody has won.
+        return True
+
+    def has_line(self, player_id: int, cell: int) -> bool:
+        """
+        Checks if a cell is part of a line of win_length symbols of a player, with bit masks.
+
+        The bits around the cell are shifted out of the board into a small window. Per direction, ANDing the
+        window with itself shifted by 1 to win_length - 1 steps leaves the bits where a full line starts.
+        Only lines through the cell count.
+
+        :param player_id: The PlayerID of the player.
+        :param cell: The bit of the cell, row * stride + column.
+        :return:
+        """
+
+        bitboard = self.bitboards[player_id]
+
+        # Move the cell to bit window_radius of the window.
+        offset = cell - self.window_radius
+
+        return self._window_has_line((bitboard >> offset if offset >= 0 else bitboard << -offset) & self.window_mask)
+
+    def _windows(self, cell: int) -> list:
+        """
+        Moves the bits around a cell out of the bitboards of the players, with the cell at bit window_radius.
+        On a large board this shifts the whole bitboard, so it is the expensive part of a move.
+
+        :param cell: The bit of the cell, row * stride + column.
+        :return: The window of every player.
+        """
+
+        offset = cell - self.window_radius
+        if offset >= 0:
+            return [bitboard >> offset & self.window_mask for bitboard in self.bitboards]
+
+        return [bitboard << -offset & self.window_mask for bitboard in self.bitboards]
+
+    def _window_has_line(self, window: int) -> bool:
+        """
+        Checks if the cell in the middle of a window is part of a line of win_length, see has_line().
+
+        :param window: The window of a bitboard around the cell.
+        :return:
+        """
+
+        for step, line_starts in zip(self.line_steps, self.line_starts):
+            lines = window
+            for distance in range(1, self.win_length):
+                lines &= window >> (distance * step)
+
+            if lines & line_starts:
+                return True
+
+        return False
+
+    def _lines_owned(self, bitboard: int, step: int) -> int:
+        """
+        Marks the lines in a direction that hold a symbol of a bitboard.
+
+        :param bitboard: The bitboard, or a window of it.
+        :param step: The bit step of the direction.
+        :return: The bits where those lines start.
+        """
+
+        owned = bitboard
+        for distance in range(1, self.win_length):
+            owned |= bitboard >> (distance * step)
+
+        return owned
+
+    def line_change(self, row: int, column: int, player_id: int) -> int:
+        """
+        Counts the lines through an empty cell that a symbol of a player on it would kill, see TicTacToe.line_change().
+        Like has_line(), this works on a small window of the bitboards around the cell.
+
+        :param row: The row of the cell.
+        :param column: The column of the cell.
+        :param player_id: The PlayerID of the player.
+        :return: The amount of lines.
+        """
+
+        return self._line_change(row, column, player_id, self._windows(row * self.stride + column))
+
+    def _line_change(self, row: int, column: int, player_id: int, windows: list) -> int:
+        """
+        Counts the lines that line_change() counts, in windows of the bitboards that were already made.
+
+        :param row: The row of the cell.
+        :param column: The column of the cell.
+        :param player_id: The PlayerID of the player.
+        :param windows: The windows of the bitboards around the cell, see _windows().
+        :return: The amount of lines.
+        """
+
+        # How far lines through the cell can reach back and ahead of it on the grid, in the order of LINE_DIRECTIONS.
+        last = self.win_length - 1
+        up, down = min(row, last), min(self.grid_size - 1 - row, last)
+        left, right = min(column, last), min(self.grid_size - 1 - column, last)
+        reaches = ((left, right), (up, down), (min(up, left), min(down, right)), (min(up, right), min(down, left)))
+
+        # Leave the cell itself empty.
+        empty_cell = ~(1 << self.window_radius)
+        windows = [window & empty_cell for window in windows]
+
+        change = 0
+        for step, nearest, (back, ahead) in zip(self.line_steps, self.nearest_starts, reaches):
+            # The lines that start at most back steps back, and end at most ahead steps ahead, fit on the grid.
+            starts = nearest[back]
+            if ahead < last:
+                starts &= ~nearest[last - ahead - 1]
+
+            # The lines that hold the symbols of one other player, and the ones that hold more.
+            others = more = mine = 0
+            for other_id, window in enumerate(windows):
+                owned = self._lines_owned(window, step) & starts
+                if other_id == player_id:
+                    mine = owned
+                else:
+                    more |= others & owned
+                    others |= owned
+
+            change += bin(others & ~more & ~mine).count("1")
+
+        return change
+
+    def count_dead_lines(self) -> int:
+        """
+        Counts the lines that hold the symbols of more than one player, on the whole board at once.
+
+        :return: The amount of lines.
+        """
+
+        dead = 0
+        for step in self.line_steps:
+            # The lines that fit on the grid.
+            starts = self.valid
+            for distance in range(1, self.win_length):
+                starts &= self.valid >> (distance * step)
+
+            others = more = 0
+            for bitboard in self.bitboards:
+                owned = self._lines_owned(bitboard, step) & starts
+                more |= others & owned
+                others |= owned
+
+            dead += bin(more).count("1")
+
+        return dead
+
+    @classmethod
+    def from_board(cls, board: TicTacToe):
+        """
+        Makes a bitboard with the same position as another board, i.e. a TicTacToe with lists.
+        The bitboard tracks lines, also if the board doesn't, so searches can use dead_lines.
+
+        :param board: The board to copy.
+        :return: The bitboard.
+        """
+
+        bitboard = cls(board.grid_size, board.players, board.player_icons, board.win_length)
+        bitboard.current_player = board.current_player
+        bitboard.active = board.active
+        bitboard.winner = board.winner
+        bitboard.history = list(board.history)
+
+        players = {icon: player_id for player_id, icon in enumerate(board.player_icons)}
+        for move in range(1, board.grid_size ** 2 + 1):
+            symbol = board.get_symbol_at(move)
+            if symbol != " ":
+                row, column = divmod(move - 1, board.grid_size)
+                bit = 1 << (row * bitboard.stride + column)
+                bitboard.bitboards[players[symbol]] |= bit
+                bitboard.occupied |= bit
+
+        bitboard.dead_lines = board.dead_lines if board.track_lines else bitboard.count_dead_lines()
+
+        return bitboard
+
+    def copy(self):
+        """
+        Copies the board, i.e. to try a move on.
+        The bitboards are ints and the history holds tuples, so only the lists that hold them are copied.
+
+        :return: The copy.
+        """
+
+        board = copy.copy(self)
+        board.bitboards = list(self.bitboards)
+        board.history = list(self.history)
+
+        return board
+
+    def key(self) -> tuple:
+        """
+        A hashable key of the position, the same for boards with the same cells and player to move.
+
+        :return:
+        """
+
+        return tuple(self.bitboards) + (self.current_player,)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, BitboardTicTacToe) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        # Boards that are used as dict keys or in sets should not be changed anymore.
+        return hash(self.key())
@@ -0,0 +1,282 @@
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .ai import FULL_WIDTH_SIZE, claim_lines, find_lines, line_masks
+from .bitboard import BitboardTicTacToe
+from .tictactoe import DRAW, TicTacToe
+
+
+class Node:
+    def __init__(self, parent, move, player: int):
+        """
+        A position in the search tree of MonteCarloPlayer.
+
+        The move is the cell that player played to get here from the parent. The reward is counted for that player:
+        1 for every playout they won, 1 / players for every draw.
+        """
+
+        self.parent = parent
+        self.move = move
+        self.player = player
+
+        self.children = []
+        self.untried = []
+        self.visits = 0
+        self.reward = 0.0
+
+        # The winner if the game ended here, DRAW when nobody can win anymore, None if the game goes on.
+        self.result = None
+
+        # The lines of the position, see games.ai.find_lines(). Only kept while there are untried moves.
+        self.lines = None
+
+    def select_child(self, exploration: float):
+        """
+        A function which picks the child to search next with UCB1: the best average reward, plus a bonus for
+        children that have been visited less.
+
+        :param exploration: The weight of the bonus.
+        :return: The child.
+        """
+
+        log_visits = math.log(self.visits)
+
+        return max(self.children, key=lambda child: child.reward / child.visits + exploration * math.sqrt(log_visits / child.visits))
+
+
+def _candidate_moves(board: BitboardTicTacToe, cells: list) -> list:
+    """
+    A function which lists the moves to try in a position.
+    Like AlphaBetaPlayer, boards larger than FULL_WIDTH_SIZE only get moves next to the symbols already on the board.
+
+    :param board: The position.
+    :param cells: The cells of the board.
+    :return: The empty cells to try.
+    """
+
+    empty = [cell for cell in cells if not board.occupied >> cell & 1]
+    if board.grid_size <= FULL_WIDTH_SIZE or not board.occupied:
+        return empty
+
+    near = board.occupied
+    for step in board.line_steps:
+        near |= board.occupied << step | board.occupied >> step
+
+    return [cell for cell in empty if near >> cell & 1] or empty
+
+
+def _playout(board: BitboardTicTacToe, player: int, empty: list, rng: random.Random):
+    """
+    A function which plays random moves until someone wins or the board is full.
+
+    Playouts don't track the dead lines like the tree does. Random games almost always end with a line, and the few
+    that end in a draw only have every line dead in the last move or so, which doesn't pay for tracking every move.
+
+    :param board: The position, which is changed.
+    :param player: The player whose turn it is.
+    :param empty: The empty cells.
+    :param rng: The random generator.
+    :return: The winner, or None for a draw.
+    """
+
+    rng.shuffle(empty)
+    for cell in empty:
+        board.bitboards[player] |= 1 << cell
+        if board.has_line(player, cell):
+            return player
+
+        player = (player + 1) % board.players
+
+    return None
+
+
+def search_tree(position: tuple, time_budget: float = None, rollouts: int = None, exploration: float = 1.4, seed: int = None) -> tuple:
+    """
+    A function which runs UCT from a position, in this process or in a worker of MonteCarloPlayer.
+
+    :param position: (grid_size, win_length, players, bitboards, current_player), see MonteCarloPlayer.
+    :param time_budget: The time to search in seconds, None for no limit.
+    :param rollouts: The amount of playouts, None for no limit. One of the limits has to be given.
+    :param exploration: The UCB1 exploration weight.
+    :param seed: The seed of the random generator.
+    :return: The amount of playouts, and (visits, reward) of every move at the root by cell.
+    """
+
+    if time_budget is None and rollouts is None:
+        raise ValueError("A search needs a time budget or an amount of rollouts.")
+
+    grid_size, win_length, players, bitboards, current_player = position
+    rng = random.Random(seed)
+
+    board = BitboardTicTacToe(grid_size, players, [str(player) for player in range(players)], win_length)
+    board.bitboards = list(bitboards)
+    for bitboard in bitboards:
+        board.occupied |= bitboard
+
+    cells = [row * board.stride + column for row in range(grid_size) for column in range(grid_size)]
+    line_fits, cell_lines = line_masks(board)
+
+    # The root is the move of the player before the one to move.
+    root = Node(None, None, (current_player - 1) % players)
+    root.untried = _candidate_moves(board, cells)
+    root.lines = find_lines(board, line_fits)
+
+    deadline = time.perf_counter() + time_budget if time_budget is not None else None
+    done = 0
+    while rollouts is None or done < rollouts:
+        # Check the clock every few playouts.
+        if deadline is not None and done and not done % 16 and time.perf_counter() > deadline:
+            break
+
+        node = root
+        state = board.copy()
+
+        # Select: walk down the fully expanded nodes.
+        while node.result is None and not node.untried and node.children:
+            node = node.select_child(exploration)
+            state.bitboards[node.player] |= 1 << node.move
+            state.occupied |= 1 << node.move
+
+        # Expand: add one untried move.
+        if node.result is None and node.untried:
+            index = rng.randrange(len(node.untried))
+            node.untried[index], node.untried[-1] = node.untried[-1], node.untried[index]
+            cell = node.untried.pop()
+
+            player = (node.player + 1) % players
+            state.bitboards[player] |= 1 << cell
+            state.occupied |= 1 << cell
+
+            child = Node(node, cell, player)
+            lines = claim_lines(node.lines, player, cell_lines[cell])
+            if state.has_line(player, cell):
+                child.result = player
+            elif lines[2] == line_fits:
+                # Every line is dead, so this is a draw without playing on to a full board.
+                child.result = DRAW
+            else:
+                child.untried = _candidate_moves(state, cells)
+                child.lines = lines
+
+            if not node.untried:
+                node.lines = None
+
+            node.children.append(child)
+            node = child
+
+        # Simulate: play the game out at random.
+        if node.result is not None:
+            winner = None if node.result == DRAW else node.result
+        else:
+            empty = [cell for cell in cells if not state.occupied >> cell & 1]
+            winner = _playout(state, (node.player + 1) % players, empty, rng)
+
+        # Backpropagate: every node counts the result for the player that moved into it.
+        while node is not None:
+            node.visits += 1
+            if winner is None:
+                node.reward += 1 / players
+            elif winner == node.player:
+                node.reward += 1
+
+            node = node.parent
+
+        done += 1
+
+    return done, {child.move: (child.visits, child.reward) for child in root.children}
+
+
+class MonteCarloPlayer:
+    def __init__(self, time_budget: float = 1.0, rollouts: int = None, workers: int = None, exploration: float = 1.4, seed: int = None):
+        """
+        A computer player for Tic Tac Toe that scales to large boards and many players, with Monte Carlo tree search.
+
+        Every worker process grows its own UCT tree from the current position with random playouts, until the
+        time budget or its share of the rollouts is used. The visits of the moves at the roots are added up, and
+        the most visited move is played.
+        """
+
+        if time_budget is None and rollouts is None:
+            raise ValueError("A search needs a time budget or an amount of rollouts.")
+
+        self.time_budget = time_budget
+        self.rollouts = rollouts
+        self.workers = workers or os.cpu_count() or 1
+        self.exploration = exploration
+        self.random = random.Random(seed)
+
+        # The pool is started on the first move, and kept for the next ones.
+        self.executor = None
+        self.last_search = {}
+
+    def choose_move(self, board: TicTacToe) -> int:
+        """
+        A function which picks a move for the player whose turn it is.
+
+        :param board: The board of the game. It is not changed.
+        :return: The move, numbered like the moves of the board, from 1.
+        """
+
+        start = time.perf_counter()
+        bitboard = BitboardTicTacToe.from_board(board)
+        position = (board.grid_size, board.win_length, board.players, tuple(bitboard.bitboards), board.current_player)
+
+        if bitboard.occupied == sum(1 << (row * bitboard.stride + column) for row in range(board.grid_size) for column in range(board.grid_size)):
+            raise ValueError("There are no moves left on the board.")
+
+        # Split the rollouts over the workers.
+        shares = [None] * self.workers
+        if self.rollouts is not None:
+            shares = [max(1, self.rollouts // self.workers + (worker < self.rollouts % self.workers)) for worker in range(self.workers)]
+
+        seeds = [self.random.getrandbits(64) for _ in range(self.workers)]
+
+        # A single worker doesn't need the pool.
+        if self.workers == 1:
+            results = [search_tree(position, self.time_budget, shares[0], self.exploration, seeds[0])]
+        else:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+            futures = [self.executor.submit(search_tree, position, self.time_budget, share, self.exploration, worker_seed)
+                       for share, worker_seed in zip(shares, seeds)]
+            results = [future.result() for future in futures]
+
+        # Add up the statistics of the roots.
+        rollouts = 0
+        visits = {}
+        rewards = {}
+        for done, moves in results:
+            rollouts += done
+            for cell, (move_visits, move_reward) in moves.items():
+                visits[cell] = visits.get(cell, 0) + move_visits
+                rewards[cell] = rewards.get(cell, 0) + move_reward
+
+        best_move = max(visits, key=visits.get)
+        seconds = time.perf_counter() - start
+        self.last_search = {
+            "rollouts": rollouts,
+            "seconds": seconds,
+            "rollouts_per_second": rollouts / seconds,
+            "workers": self.workers,
+            "visits": visits[best_move],
+            "win_rate": rewards[best_move] / visits[best_move]
+        }
+
+        row, column = divmod(best_move, bitboard.stride)
+
+        return row * board.grid_size + column + 1
+
+    def close(self):
+        """
+        A function which stops the worker processes.
+
+        :return:
+        """
+
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
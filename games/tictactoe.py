@@ -1,10 +1,21 @@
 import typing
 
+# The directions a line can run in as (row step, column step): horizontal, vertical and both diagonals.
+LINE_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+# The result of a game that ended without a winner, see TicTacToe.result.
+DRAW = -1
+
 
 class TicTacToe:
-    def __init__(self, grid_size: int = 3, players: int = 2, player_symbols: typing.Union[list, tuple] = ('X', 'O')):
+    def __init__(self, grid_size: int = 3, players: int = 2, player_symbols: typing.Union[list, tuple] = ('X', 'O'), win_length: int = None,
+                 track_lines: bool = True):
         """
         Initialises a Board object for playing the game Tic Tac Toe.
+        A player wins with win_length symbols in a row, the whole width of the grid by default.
+
+        With track_lines, the board counts the lines that can still be won, and the game ends in a draw when there are
+        none left. That makes every move a few times slower, so boards that only need to find wins can turn it off.
         """
 
         # Store some basic information.
@@ -12,6 +23,11 @@ class TicTacToe:
         self.current_player = 0
         self.grid_size = grid_size
 
+        # Check if the win length fits on the grid.
+        self.win_length = win_length or grid_size
+        if not 1 <= self.win_length <= grid_size:
+            raise ValueError("Invalid win_length for this grid_size")
+
         # Check if the player symbols is valid.
         if len(player_symbols) >= players:
             player_symbols = player_symbols[:players]
@@ -22,9 +38,119 @@ class TicTacToe:
         self.active = True
         self.winner = None
 
+        # The moves made, with the state before each one, so they can be unmade.
+        self.history = []
+        self.track_lines = track_lines
+
         # Generate a grid.
-        self.grid = None
         self.generate_grid()
+        self.reset_lines()
+
+    @property
+    def result(self):
+        """
+        The state of the game: None while it is going on, the PlayerID of the winner, or DRAW when nobody can win anymore.
+
+        :return:
+        """
+
+        if self.active:
+            return None
+
+        return DRAW if self.winner is None else self.winner
+
+    @property
+    def live_lines(self) -> int:
+        """
+        The amount of lines of win_length cells that a player can still complete, because they hold the symbols of
+        at most one player. Once there are none, the game is a draw. None if the board doesn't track lines.
+
+        :return:
+        """
+
+        if not self.track_lines:
+            return None
+
+        return self.line_total - self.dead_lines
+
+    def reset_lines(self):
+        """
+        Starts the line tracking of an empty grid, where every line is live.
+
+        :return:
+        """
+
+        # The amount of places a line fits per row or column, and per diagonal direction per row.
+        span = self.grid_size - self.win_length + 1
+        self.line_total = 2 * self.grid_size * span + 2 * span * span
+        self.dead_lines = 0
+
+    def line_change(self, row: int, column: int, player_id: int) -> int:
+        """
+        Counts the lines through an empty cell that a symbol of a player on it would kill, because they already hold
+        the symbols of exactly one other player. Moves change dead_lines by this, and unmade moves change it back.
+
+        Per direction, the cells on both sides of the cell are walked until win_length - 1 cells away, the edge of
+        the grid, a symbol of the player or the symbol of a second other player. The lines through the cell are the
+        windows of win_length that fit in between, so they are counted with the distances of the first other symbols
+        on both sides, without looking at every line. This takes O(win_length) per direction.
+
+        :param row: The row of the cell.
+        :param column: The column of the cell.
+        :param player_id: The PlayerID of the player.
+        :return: The amount of lines.
+        """
+
+        symbol = self.player_icons[player_id]
+        last = self.win_length - 1
+        change = 0
+        for row_step, column_step in LINE_DIRECTIONS:
+            # Per side: how far lines can reach, and the distance and symbol of the first other symbol.
+            sides = []
+            for direction in (1, -1):
+                reach = 0
+                first = self.win_length
+                first_symbol = None
+                row_index = row
+                column_index = column
+                for distance in range(1, self.win_length):
+                    row_index += row_step * direction
+                    column_index += column_step * direction
+                    if not (0 <= row_index < self.grid_size and 0 <= column_index < self.grid_size):
+                        break
+
+                    other = self.grid[row_index][column_index]
+                    if other == symbol:
+                        break
+
+                    if other != " ":
+                        if first_symbol is None:
+                            first, first_symbol = distance, other
+                        elif other != first_symbol:
+                            # A line up to here holds two other players and is dead already.
+                            break
+
+                    reach = distance
+
+                sides.append((reach, first, first_symbol))
+
+            (reach, first, first_symbol), (back_reach, back_first, back_symbol) = sides
+
+            # A line starting start cells back from the cell covers start cells back and last - start cells ahead.
+            lowest = last - reach
+            highest = back_reach
+            if lowest > highest:
+                continue
+
+            # Minus the lines without another symbol, which stay live.
+            change += highest - lowest + 1
+            change -= max(0, min(highest, back_first - 1) - max(lowest, last - first + 1) + 1)
+
+            # Minus the lines that hold two different other symbols, one on each side.
+            if first_symbol is not None and back_symbol is not None and first_symbol != back_symbol:
+                change -= max(0, min(highest, last - first) - max(lowest, back_first) + 1)
+
+        return change
 
     def generate_grid(self):
         """
@@ -33,16 +159,8 @@ class TicTacToe:
         :return:
         """
 
-        # Clear the grid.
-        self.grid = []
-
         # Fill the grid with spaces.
-        for row_index in range(self.grid_size):
-            row = []
-            for column_index in range(self.grid_size):
-                row.append(" ")
-
-            self.grid.append(row)
+        self.grid = [[" "] * self.grid_size for _ in range(self.grid_size)]
 
     def get_player_icon(self, player_id: int):
         """
@@ -136,75 +254,142 @@ class TicTacToe:
         # The column changed is the remainder.
         column_changed = (move - 1) % self.grid_size
 
+        # Remember the state before the move.
+        self.history.append((move, self.active, self.winner, self.current_player))
+
         # Update the grid.
+        if self.track_lines:
+            self.dead_lines += self.line_change(row_changed, column_changed, self.current_player)
         self.grid[row_changed][column_changed] = self.player_icons[self.current_player]
 
-        # Check if someone has won.
-        self.active = self.check_win(row_changed, column_changed)
+        # Check if someone has won, or if nobody can win anymore.
+        self.active = self.check_win(row_changed, column_changed) and (not self.track_lines or self.live_lines > 0)
 
         # Switch the players.
         self.switch_player()
 
-    def check_win(self, row_changed: int, column_changed: int) -> bool:
+    def unmake_move(self) -> int:
         """
-        Checks if a player has won in all directions.
+        Takes back the last move, and restores the winner, active flag and current player from before it.
+        A search can try a move and unmake it, instead of copying the board for every position.
 
-        :param row_changed: The row that has changed with the move.
-        :param column_changed: The column that has changed with the move.
+        :return: The move that was taken back.
+        """
+
+        if not self.history:
+            raise ValueError("There are no moves to unmake.")
+
+        move, self.active, self.winner, self.current_player = self.history.pop()
+
+        # Empty the cell again.
+        row, column = divmod(move - 1, self.grid_size)
+        self.grid[row][column] = " "
+        if self.track_lines:
+            self.dead_lines -= self.line_change(row, column, self.current_player)
+
+        return move
+
+    @property
+    def moves(self) -> list:
+        """
+        The moves made so far, in order, see replay().
 
         :return:
         """
 
-        # First check horizontally.
-        row = "".join(self.grid[row_changed])
+        return [entry[0] for entry in self.history]
+
+    @classmethod
+    def replay(cls, moves: typing.Iterable, *args, **kwargs):
+        """
+        Makes a board and plays a list of moves on it, i.e. to analyse a position of a finished game.
+
+        :param moves: The moves, numbered from 1.
+        :param args: The arguments of the board, see __init__().
+        :param kwargs: The keyword arguments of the board.
+        :return: The board after the moves.
+        """
+
+        board = cls(*args, **kwargs)
+        for turn, move in enumerate(moves, 1):
+            if not board.active or not board.check_move_validity(str(move)):
+                raise ValueError("Invalid move {} at turn {}.".format(move, turn))
 
-        # If the amount of unique characters of the row is 1, a player has won.
-        row_set = set(row)
-        if len(row_set) == 1 and " " not in row_set:
-            # Set the winner.
-            self.winner = self.current_player
+            board.make_move(int(move))
 
-            # Game is not active anymore.
-            return False
+        return board
 
-        # Check vertically.
-        row = ""
-        for row_index in range(len(self.grid)):
-            row += self.grid[row_index][column_changed]
+    def snapshot(self) -> tuple:
+        """
+        An immutable, hashable copy of the position: (current_player, active, winner, cells of player 0, ...).
+        The cells of a player are the bits of an int, cell (row, column) is bit row * grid_size + column.
+        Snapshots of TicTacToe and BitboardTicTacToe with the same position are equal.
+
+        :return: The snapshot.
+        """
 
-        # If the amount of unique characters of the row is 1, a player has won.
-        row_set = set(row)
-        if len(row_set) == 1 and " " not in row_set:
-            # Set the winner.
-            self.winner = self.current_player
+        players = {icon: player_id for player_id, icon in enumerate(self.player_icons)}
+        cells = [0] * self.players
+        for row in range(self.grid_size):
+            for column in range(self.grid_size):
+                symbol = self.grid[row][column]
+                if symbol != " ":
+                    cells[players[symbol]] |= 1 << (row * self.grid_size + column)
 
-            # Game is not active anymore.
-            return False
+        return (self.current_player, self.active, self.winner) + tuple(cells)
+
+    def restore(self, snapshot: tuple):
+        """
+        Sets the board to the position of a snapshot of a board with the same size and players.
+        The moves that led to it are not known, so the history is cleared.
 
-        # Check diagonally.
-        for direction_index in [0, 1]:
-            # Set a starting position and a step size.
-            starting_pos = [(0, 0), (0, self.grid_size - 1)][direction_index]
-            step_size = [1, -1][direction_index]
+        :param snapshot: The snapshot, see snapshot().
+        :return:
+        """
+
+        self.current_player, self.active, self.winner = snapshot[:3]
+        self.history = []
+        self.generate_grid()
+        self.reset_lines()
+
+        for player_id, cells in enumerate(snapshot[3:]):
+            # Walk over the set bits, lowest first.
+            while cells:
+                lowest = cells & -cells
+                row, column = divmod(lowest.bit_length() - 1, self.grid_size)
+                if self.track_lines:
+                    self.dead_lines += self.line_change(row, column, player_id)
+                self.grid[row][column] = self.player_icons[player_id]
+                cells ^= lowest
 
-            # Set up the loop parameters.
-            row = []
-            index_offset = 0
-            row_index, column_index = starting_pos
+    def check_win(self, row_changed: int, column_changed: int) -> bool:
+        """
+        Checks if the move made a line of win_length symbols in any direction.
+        Only the cells within win_length - 1 of the changed cell can be part of such a line, so only those are looked at.
+        The time this takes depends on win_length, not on the size of the grid.
+
+        :param row_changed: The row that has changed with the move.
+        :param column_changed: The column that has changed with the move.
+
+        :return:
+        """
 
-            # Loop until end of grid.
-            while abs(index_offset) < self.grid_size:
-                # Add the item to the row.
-                row.append(self.grid[row_index + abs(index_offset)][column_index + index_offset])
+        symbol = self.grid[row_changed][column_changed]
 
-                # Increment the index_offset with step_size.
-                index_offset += step_size
+        for row_step, column_step in LINE_DIRECTIONS:
+            # Count the changed cell, then walk away from it both ways until the line is broken.
+            line_length = 1
+            for direction in (1, -1):
+                row_index = row_changed + row_step * direction
+                column_index = column_changed + column_step * direction
 
-            # Check the length.
-            row = "".join(row)
+                while line_length < self.win_length and 0 <= row_index < self.grid_size and 0 <= column_index < self.grid_size \
+                        and self.grid[row_index][column_index] == symbol:
+                    line_length += 1
+                    row_index += row_step * direction
+                    column_index += column_step * direction
 
-            row_set = set(row)
-            if len(row_set) == 1 and " " not in row_set:
+            if line_length >= self.win_length:
                 # Set the winner.
                 self.winner = self.current_player
 
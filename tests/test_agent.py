@@ -0,0 +1,118 @@
+import os
+import stat
+import tempfile
+import threading
+import time
+import unittest
+
+from util.agent import AgentClient, VaultAgent, connect_agent
+from util.kdf import KdfParams
+from util.passgen import Vault
+
+
+class AgentTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+        self.socket_path = self.path + ".sock"
+        self.thread = None
+
+    def tearDown(self):
+        # Stop an agent that a failed test left running.
+        if self.thread is not None and self.thread.is_alive():
+            client = connect_agent(self.socket_path)
+            if client is not None:
+                self.stop_agent(client)
+
+        self.directory.cleanup()
+
+    def open_vault(self) -> Vault:
+        # A cheap kdf, the key derivation is not what is tested here.
+        return Vault(b"hunter22", self.path, kdf=KdfParams("pbkdf2", 1000))
+
+    def start_agent(self, **options) -> AgentClient:
+        agent = VaultAgent(self.open_vault(), self.socket_path, **options)
+        self.thread = threading.Thread(target=agent.run, daemon=True)
+        self.thread.start()
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            client = connect_agent(self.socket_path)
+            if client is not None:
+                return client
+            time.sleep(0.01)
+
+        self.fail("The agent did not start.")
+
+    def stop_agent(self, client: AgentClient):
+        client.stop()
+        client.close()
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+
+    def test_round_trip(self):
+        self.open_vault().store_password("existing", "password")
+        client = self.start_agent()
+
+        client.store_password("GitHub", "hunter22")
+        password = client.generate_password("mail", 20, "311")
+        self.assertEqual(client.get_password("github"), "hunter22")
+        self.assertEqual(client.get_password("existing"), "password")
+        self.assertEqual(sorted(client.get_services()), ["existing", "github", "mail"])
+        self.assertEqual(client.search_services("git", "prefix"), ["github"])
+
+        client.delete_service("existing")
+        with self.assertRaises(AssertionError):
+            client.get_password("existing")
+
+        # The agent stops and writes the vault.
+        self.stop_agent(client)
+        self.assertFalse(os.path.exists(self.socket_path))
+
+        vault = self.open_vault()
+        self.assertEqual(sorted(vault.get_services()), ["github", "mail"])
+        self.assertEqual(vault.get_password("mail"), password)
+
+    def test_invalid_requests(self):
+        client = self.start_agent()
+
+        for op, arguments in (("fly", {}), ("get", {}), ("get", {"service": "missing"})):
+            with self.assertRaises(AssertionError):
+                client.request(op, **arguments)
+
+        # The connection stays open after an error.
+        client.store_password("service", "password")
+        self.assertEqual(client.get_password("service"), "password")
+        self.stop_agent(client)
+
+    def test_socket_is_private(self):
+        client = self.start_agent()
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+        self.stop_agent(client)
+
+    def test_idle_timeout(self):
+        client = self.start_agent(idle_timeout=0.2, flush_interval=0.05)
+        client.store_password("service", "password")
+        client.close()
+
+        # The agent writes the change and stops by itself.
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertEqual(self.open_vault().get_password("service"), "password")
+
+    def test_second_agent_is_refused(self):
+        client = self.start_agent()
+
+        with self.assertRaises(RuntimeError):
+            VaultAgent(self.open_vault(), self.socket_path).run()
+
+        # The first agent still answers.
+        client.store_password("service", "password")
+        self.assertEqual(client.get_password("service"), "password")
+        self.stop_agent(client)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import pickle
+import unittest
+
+from util.codec import HEADER, KIND_MAP, KIND_SEPARATED_MAP, decode_index, decode_list, decode_map, encode_index, \
+    encode_list, encode_map
+
+
+class MapTest(unittest.TestCase):
+    def test_separated_map(self):
+        passwords = {"service{}".format(number): "password{}".format(number) for number in range(100)}
+        data = encode_map(passwords)
+
+        self.assertEqual(HEADER.unpack_from(data)[2], KIND_SEPARATED_MAP)
+        self.assertEqual(decode_map(data), passwords)
+
+    def test_length_table_map(self):
+        # A NUL in a password, and None for a deleted service, don't fit the separated layout.
+        for passwords in ({"service": "pass\x00word"}, {"service": None}):
+            data = encode_map(passwords)
+
+            self.assertEqual(HEADER.unpack_from(data)[2], KIND_MAP)
+            self.assertEqual(decode_map(data), passwords)
+
+    def test_unicode(self):
+        for passwords in ({"sérvice": "pässwörd", "日本": "🔑"}, {"sérvice": "pä\x00ss", "日本": None}):
+            self.assertEqual(decode_map(encode_map(passwords)), passwords)
+
+    def test_empty(self):
+        self.assertEqual(decode_map(encode_map({})), {})
+
+    def test_pickle_fallback(self):
+        passwords = {"service": "password"}
+
+        self.assertEqual(decode_map(pickle.dumps(passwords)), passwords)
+        self.assertEqual(decode_index(pickle.dumps({"service": (0, 10)})), {"service": (0, 10)})
+
+
+class TruncatedTest(unittest.TestCase):
+    def test_short_header(self):
+        for decoder, data in ((decode_map, encode_map({"service": "password"})),
+                              (decode_index, encode_index({"service": (0, 10)})),
+                              (decode_list, encode_list(["service"]))):
+            for length in range(1, HEADER.size):
+                with self.assertRaises(ValueError):
+                    decoder(data[:length])
+
+    def test_truncated_length_table(self):
+        for decoder, data in ((decode_map, encode_map({"service": "pass\x00word"})),
+                              (decode_index, encode_index({"service": (0, 10)})),
+                              (decode_list, encode_list(["service", "other"]))):
+            for length in range(HEADER.size, len(data)):
+                with self.assertRaises(ValueError):
+                    decoder(data[:length])
+
+
+class IndexAndListTest(unittest.TestCase):
+    def test_index(self):
+        index = {"service": (0, 10), "日本": (10, 2 ** 40)}
+
+        self.assertEqual(decode_index(encode_index(index)), index)
+
+    def test_list(self):
+        strings = ["service", "sérvice", ""]
+
+        self.assertEqual(decode_list(encode_list(strings)), strings)
+
+
+if __name__ == '__main__':
+    unittest.main()
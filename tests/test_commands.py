@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from util.commands import run_batch
+from util.kdf import KdfParams
+from util.passgen import Vault
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_vault(self, vault_key: bytes = b"hunter22") -> Vault:
+        # A cheap kdf, the key derivation is not what is tested here.
+        return Vault(vault_key, self.path, kdf=KdfParams("pbkdf2", 1000))
+
+    def test_commands_see_earlier_commands(self):
+        lines = [
+            "# Set up the accounts.",
+            "set GitHub hunter22",
+            "",
+            'set "my bank" "correct horse"',
+            "gen mail 24 211",
+            "get github",
+            "rm github",
+            "ls",
+        ]
+
+        results = run_batch(self.open_vault(), lines)
+
+        self.assertEqual([result["line"] for result in results], [2, 4, 5, 6, 7, 8])
+        self.assertTrue(all(result["ok"] for result in results))
+        self.assertEqual(results[3]["password"], "hunter22")
+        self.assertEqual(len(results[2]["password"]), 24)
+        self.assertEqual(results[5]["services"], ["mail", "my bank"])
+
+        vault = self.open_vault()
+        self.assertEqual(vault.get_password("my bank"), "correct horse")
+        self.assertEqual(vault.get_password("mail"), results[2]["password"])
+
+    def test_failed_commands_do_not_stop_the_batch(self):
+        lines = [
+            "get missing",
+            "fly away",
+            "set only-a-service",
+            "gen service 0",
+            "gen service 16 999",
+            'set "unclosed quote',
+            "set service password",
+        ]
+
+        results = run_batch(self.open_vault(), lines)
+
+        self.assertEqual([result["ok"] for result in results], [False] * 6 + [True])
+        self.assertEqual([result["line"] for result in results], list(range(1, 8)))
+        self.assertTrue(all(result["error"] for result in results[:6]))
+        self.assertEqual(self.open_vault().get_services(), ["service"])
+
+    def test_single_write(self):
+        vault = self.open_vault()
+        vault.store_password("existing", "password")
+        lines = ["set service{} password".format(number) for number in range(50)] + ["rm existing"]
+
+        with mock.patch.object(Vault, "_write_changes", autospec=True, side_effect=Vault._write_changes) as write_changes:
+            run_batch(vault, lines)
+
+        self.assertEqual(write_changes.call_count, 1)
+        self.assertEqual(len(self.open_vault().get_services()), 50)
+
+    def test_wrong_key_raises(self):
+        self.open_vault().store_password("service", "password")
+
+        with self.assertRaises(ValueError):
+            run_batch(self.open_vault(b"wrong key"), ["get service"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from games.mcts import MonteCarloPlayer, search_tree
+
+
+class SearchLimitTest(unittest.TestCase):
+    def test_search_needs_a_limit(self):
+        # An empty 3x3 board for 2 players.
+        position = (3, 3, 2, (0, 0), 0)
+
+        with self.assertRaises(ValueError):
+            search_tree(position, None, None)
+        with self.assertRaises(ValueError):
+            MonteCarloPlayer(time_budget=None, rollouts=None)
+
+    def test_rollouts_without_time_budget(self):
+        done, moves = search_tree((3, 3, 2, (0, 0), 0), None, 50, seed=1)
+
+        self.assertEqual(done, 50)
+        self.assertEqual(sum(visits for visits, _ in moves.values()), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
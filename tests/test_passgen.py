@@ -0,0 +1,136 @@
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from util.kdf import KdfParams
+from util.passgen import Vault
+from util.transfer import read_entries
+
+
+class WriteBehindTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_vault(self, **options) -> Vault:
+        # A cheap kdf, the key derivation is not what is tested here.
+        return Vault(b"hunter22", self.path, kdf=KdfParams("pbkdf2", 1000), **options)
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "Timed out waiting for the flusher.")
+            time.sleep(0.01)
+
+    def test_store_does_not_wait_for_write(self):
+        vault = self.open_vault(write_behind=True, flush_threshold=1)
+        write_changes = Vault._write_changes
+        writing = threading.Event()
+        release = threading.Event()
+
+        def slow_write(*args):
+            writing.set()
+            release.wait(5)
+            write_changes(*args)
+
+        with mock.patch.object(Vault, "_write_changes", slow_write):
+            vault.store_password("first", "password")
+            self.assertTrue(writing.wait(5))
+
+            # The flusher is stuck writing, a store only changes memory.
+            start = time.perf_counter()
+            vault.store_password("second", "password")
+            self.assertLess(time.perf_counter() - start, 0.5)
+
+            release.set()
+            vault.close()
+
+        vault = self.open_vault()
+        self.assertEqual(vault.get_password("first"), "password")
+        self.assertEqual(vault.get_password("second"), "password")
+
+    def test_flush_error_is_raised(self):
+        vault = self.open_vault(write_behind=True, flush_threshold=1)
+
+        with mock.patch.object(Vault, "_write_changes", side_effect=OSError("No space left on device")):
+            vault.store_password("first", "password")
+            self.wait_for(lambda: vault.flush_error is not None)
+
+            with self.assertRaises(OSError):
+                vault.store_password("second", "password")
+            with self.assertRaises(OSError):
+                vault.flush()
+            with self.assertRaises(OSError):
+                vault.close()
+
+        # The changes stayed pending, and are written once writing works again.
+        vault.close()
+        vault = self.open_vault()
+        self.assertEqual(vault.get_services(), ["first"])
+
+
+class ImportTest(unittest.TestCase):
+    # The third line is broken, after two entries were read.
+    BROKEN_EXPORT = '{"service": "a", "password": "changed"}\n{"service": "b", "password": "2"}\n{"service": \n'
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_vault(self, **options) -> Vault:
+        return Vault(b"hunter22", self.path, kdf=KdfParams("pbkdf2", 1000), **options)
+
+    def import_broken(self, vault: Vault):
+        with self.assertRaises(ValueError):
+            vault.import_entries(read_entries(io.StringIO(self.BROKEN_EXPORT), "jsonl"))
+
+    def test_broken_import_stores_nothing(self):
+        vault = self.open_vault()
+        vault.store_password("a", "1")
+
+        self.import_broken(vault)
+
+        vault = self.open_vault()
+        self.assertEqual(vault.get_services(), ["a"])
+        self.assertEqual(vault.get_password("a"), "1")
+
+    def test_broken_import_keeps_session_changes(self):
+        vault = self.open_vault()
+        vault.store_password("a", "1")
+
+        with vault.session():
+            vault.store_password("a", "session")
+            vault.store_password("c", "3")
+            self.import_broken(vault)
+
+            self.assertEqual(vault.get_password("a"), "session")
+            self.assertNotIn("b", vault.get_services())
+
+        vault = self.open_vault()
+        self.assertEqual(vault.get_services(), ["a", "c"])
+        self.assertEqual(vault.get_password("a"), "session")
+
+    def test_broken_import_is_not_flushed_behind(self):
+        vault = self.open_vault(write_behind=True, flush_threshold=1)
+        vault.store_password("a", "1")
+
+        self.import_broken(vault)
+        vault.close()
+
+        vault = self.open_vault()
+        self.assertEqual(vault.get_services(), ["a"])
+        self.assertEqual(vault.get_password("a"), "1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from util.kdf import KdfParams
+from util.passgen import Vault
+from util.search import ServiceIndex
+
+
+class IndexFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_vault(self) -> Vault:
+        # A cheap kdf, the key derivation is not what is tested here.
+        return Vault(b"hunter22", self.path, file_format="log", kdf=KdfParams("pbkdf2", 1000))
+
+    def test_appended_names_are_read(self):
+        vault = self.open_vault()
+        vault.import_entries(("service{}".format(number), "password") for number in range(100))
+        size = os.path.getsize(vault.index_file)
+
+        vault.store_password("GitHub", "password")
+        vault.delete_service("service5")
+        self.assertLess(os.path.getsize(vault.index_file), size * 2)
+
+        vault = self.open_vault()
+        self.assertEqual(vault.search_services("git", "prefix"), ["github"])
+        self.assertEqual(vault.search_services("service5"), [])
+        self.assertEqual(len(vault.search_services("service", "prefix")), 99)
+
+    def test_index_file_is_compacted(self):
+        vault = self.open_vault()
+        vault.import_entries(("service{}".format(number), "password") for number in range(10))
+
+        with vault.session():
+            for number in range(200):
+                vault.store_password("new{}".format(number), "password")
+                vault.flush()
+                vault.delete_service("new{}".format(number))
+                vault.flush()
+
+        self.assertLess(os.path.getsize(vault.index_file), 3000)
+
+        key = vault.storage.kdf.derive(b"hunter22")
+        index = ServiceIndex.load(vault.index_file, vault.storage.cipher, key, vault.generation)
+        self.assertEqual(index.names, sorted("service{}".format(number) for number in range(10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+import os
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+from util.kdf import KdfParams
+from util.passgen import Vault
+from util.storage import LogStorage, VaultHeader, read_header
+
+
+class TornLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_vault(self) -> Vault:
+        # A cheap kdf, the key derivation is not what is tested here.
+        return Vault(b"hunter22", self.path, file_format="log", kdf=KdfParams("pbkdf2", 1000))
+
+    def tear_log(self):
+        # An append that was interrupted: the length says 200 bytes, but only 50 made it to disk.
+        with open(self.path, 'ab') as vault_file:
+            vault_file.write(struct.pack(">I", 200) + os.urandom(50))
+
+    def test_append_after_torn_record(self):
+        vault = self.open_vault()
+        for number in range(10):
+            vault.store_password("service{}".format(number), "password{}".format(number))
+
+        self.tear_log()
+
+        vault = self.open_vault()
+        vault.store_password("new", "password")
+        for number in range(3):
+            vault.store_password("more{}".format(number), "password{}".format(number))
+
+        # A new Vault reads everything from disk.
+        vault = self.open_vault()
+        self.assertEqual(vault.get_password("new"), "password")
+        self.assertEqual(vault.get_password("more2"), "password2")
+        self.assertEqual(vault.get_password("service9"), "password9")
+
+    def test_torn_record_is_ignored(self):
+        vault = self.open_vault()
+        vault.store_password("service", "password")
+
+        self.tear_log()
+
+        self.assertEqual(self.open_vault().get_services(), ["service"])
+
+
+class LogOffsetsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_vault(self) -> Vault:
+        return Vault(b"hunter22", self.path, file_format="log", kdf=KdfParams("pbkdf2", 1000))
+
+    def test_lookup_does_not_replay(self):
+        vault = self.open_vault()
+        vault.import_entries(("service{}".format(number), "password") for number in range(100))
+        vault.store_password("service1", "changed")
+        vault.delete_service("service2")
+
+        vault = self.open_vault()
+        with mock.patch.object(LogStorage, "load", side_effect=AssertionError("The log was replayed.")):
+            self.assertEqual(vault.get_password("service1"), "changed")
+            self.assertEqual(vault.get_password("service99"), "password")
+            with self.assertRaises(AssertionError):
+                vault.get_password("service2")
+
+    def test_stale_offsets_are_not_used(self):
+        vault = self.open_vault()
+        vault.import_entries(("service{}".format(number), "password") for number in range(10))
+        offsets_path = vault.storage.offsets_path()
+        with open(offsets_path, 'rb') as offsets_file:
+            offsets = offsets_file.read()
+
+        # An offset index of an older generation, as left behind by a crash after an append.
+        vault.store_password("service1", "changed")
+        with open(offsets_path, 'wb') as offsets_file:
+            offsets_file.write(offsets)
+
+        self.assertEqual(self.open_vault().get_password("service1"), "changed")
+
+        # The next write brings it up to date.
+        self.open_vault().store_password("service3", "changed")
+        self.assertEqual(read_header(offsets_path)[0].generation, read_header(self.path)[0].generation)
+        with mock.patch.object(LogStorage, "load", side_effect=AssertionError("The log was replayed.")):
+            self.assertEqual(self.open_vault().get_password("service1"), "changed")
+
+
+class ShardedWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_vault(self) -> Vault:
+        return Vault(b"hunter22", self.path, file_format="sharded", kdf=KdfParams("pbkdf2", 1000))
+
+    def read_shards(self, vault: Vault) -> list:
+        shards = []
+        for shard in range(vault.storage.shard_count):
+            with open(vault.storage.shard_path(shard), 'rb') as shard_file:
+                shards.append(shard_file.read())
+
+        return shards
+
+    def test_only_touched_shard_is_rewritten(self):
+        vault = self.open_vault()
+        vault.import_entries(("service{}".format(number), "password") for number in range(100))
+        before = self.read_shards(vault)
+
+        vault.store_password("service1", "changed")
+        after = self.read_shards(vault)
+
+        changed = [shard for shard in range(len(before)) if before[shard] != after[shard]]
+        self.assertEqual(changed, [vault.storage.shard_of("service1")])
+        self.assertEqual(self.open_vault().get_password("service1"), "changed")
+
+
+class HeaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_vault(self, **options) -> Vault:
+        return Vault(b"hunter22", self.path, kdf=KdfParams("pbkdf2", 1000), **options)
+
+    def test_changed_header_is_rejected(self):
+        vault = self.open_vault(compression="zlib", compression_level=9)
+        vault.store_password("service", "password")
+
+        # Lower the compression level. The payload still decompresses, but the header is not what was written.
+        with open(self.path, 'rb') as vault_file:
+            data = vault_file.read()
+
+        header, offset = VaultHeader.unpack(data)
+        header.compression.level = 1
+        with open(self.path, 'wb') as vault_file:
+            vault_file.write(header.pack() + data[offset:])
+
+        with self.assertRaises(ValueError):
+            self.open_vault().get_password("service")
+
+    def test_write_after_migration_elsewhere(self):
+        vault = self.open_vault(file_format="log")
+        vault.store_password("old", "password")
+
+        self.open_vault().migrate("indexed", cipher="chacha20-poly1305")
+        vault.store_password("new", "password")
+
+        header, _ = read_header(self.path)
+        self.assertEqual((header.file_format, header.cipher), ("indexed", "chacha20-poly1305"))
+        self.assertEqual(self.open_vault().get_password("old"), "password")
+        self.assertEqual(self.open_vault().get_password("new"), "password")
+
+
+class IndexedBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_vault(self) -> Vault:
+        return Vault(b"hunter22", self.path, file_format="indexed", kdf=KdfParams("pbkdf2", 1000))
+
+    def test_updates_are_appended(self):
+        vault = self.open_vault()
+        vault.import_entries(("service{}".format(number), "password") for number in range(1000))
+        size = os.path.getsize(self.path)
+
+        # A single write appends one bucket and the directory, it does not copy the file.
+        vault.store_password("service1", "changed")
+        vault.delete_service("service2")
+        self.assertLess(os.path.getsize(self.path) - size, size // 4)
+
+        vault = self.open_vault()
+        self.assertEqual(vault.get_password("service1"), "changed")
+        self.assertEqual(vault.get_password("service999"), "password")
+        self.assertNotIn("service2", vault.get_services())
+        self.assertEqual(len(vault.get_services()), 999)
+
+    def test_file_is_compacted_and_grown(self):
+        vault = self.open_vault()
+        vault.import_entries(("service{}".format(number), "password") for number in range(10))
+
+        with vault.session():
+            for number in range(300):
+                vault.store_password("service0", "password{}".format(number))
+                vault.store_password("new{}".format(number), "password")
+                vault.flush()
+
+        self.assertLess(os.path.getsize(self.path), 100000)
+
+        vault = self.open_vault()
+        self.assertEqual(vault.get_password("service0"), "password299")
+        self.assertGreater(vault.storage.bucket_count, 1)
+        self.assertEqual(vault.get_password("new150"), "password")
+        self.assertEqual(len(vault.get_services()), 310)
+
+    def test_changed_directory_is_rejected(self):
+        vault = self.open_vault()
+        vault.import_entries(("service{}".format(number), "password") for number in range(100))
+
+        # Flip a byte in the directory, which is at the end of the file.
+        with open(self.path, 'r+b') as vault_file:
+            vault_file.seek(-20, os.SEEK_END)
+            byte = vault_file.read(1)
+            vault_file.seek(-20, os.SEEK_END)
+            vault_file.write(bytes([byte[0] ^ 1]))
+
+        with self.assertRaises(ValueError):
+            self.open_vault().get_password("service1")
+
+
+if __name__ == '__main__':
+    unittest.main()
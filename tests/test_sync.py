@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from util.kdf import KdfParams
+from util.passgen import Vault
+from util.storage import read_header
+
+
+class VersionsFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "vault.edb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_vault(self, path: str = None) -> Vault:
+        # A cheap kdf, the key derivation is not what is tested here.
+        return Vault(b"hunter22", path or self.path, file_format="log", kdf=KdfParams("pbkdf2", 1000))
+
+    def test_appended_versions_are_read(self):
+        vault = self.open_vault()
+        vault.import_entries(("service{}".format(number), "password") for number in range(100))
+        size = os.path.getsize(vault.versions_file)
+
+        # Single writes only append their versions.
+        vault.store_password("service1", "changed")
+        vault.delete_service("service2")
+        self.assertLess(os.path.getsize(vault.versions_file), size * 2)
+
+        versions = self.open_vault().entry_versions()
+        self.assertEqual(versions, vault.entry_versions())
+        self.assertTrue(versions["service2"].endswith(":deleted"))
+
+    def test_versions_file_is_compacted(self):
+        vault = self.open_vault()
+        vault.import_entries(("service{}".format(number), "password") for number in range(10))
+
+        with vault.session():
+            for number in range(200):
+                vault.store_password("service0", "password{}".format(number))
+                vault.flush()
+
+        # The appended changes never take much more space than the table.
+        header, _ = read_header(vault.versions_file)
+        self.assertEqual(header.generation, vault.generation)
+        self.assertLess(os.path.getsize(vault.versions_file), 3000)
+        self.assertEqual(self.open_vault().entry_versions(), vault.entry_versions())
+
+    def test_sync_after_single_writes(self):
+        vault = self.open_vault()
+        vault.import_entries([("a", "1"), ("b", "2")])
+
+        other_path = os.path.join(self.directory.name, "other.edb")
+        vault.merge(other_path)
+
+        vault.store_password("a", "changed")
+        other = self.open_vault(other_path)
+        other.store_password("c", "3")
+        other.delete_service("b")
+
+        result = vault.merge(other_path)
+        self.assertEqual((result["pulled"], result["pushed"]), (2, 1))
+        for path in (self.path, other_path):
+            self.assertEqual(self.open_vault(path).get_services(), ["a", "c"])
+            self.assertEqual(self.open_vault(path).get_password("a"), "changed")
+
+
+if __name__ == '__main__':
+    unittest.main()
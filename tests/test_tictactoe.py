@@ -0,0 +1,188 @@
+import random
+import unittest
+
+from games.bitboard import BitboardTicTacToe
+from games.tictactoe import DRAW, LINE_DIRECTIONS, TicTacToe
+
+
+def play_random_game(board: TicTacToe, rng: random.Random) -> list:
+    # Random moves until the game ends.
+    while board.active:
+        free = [move for move in range(1, board.grid_size ** 2 + 1) if board.get_symbol_at(move) == " "]
+        if not free:
+            break
+
+        board.make_move(rng.choice(free))
+
+    return board.moves
+
+
+def count_live_lines(board: TicTacToe) -> int:
+    # Every line of win_length cells, live if it holds the symbols of at most one player.
+    live = 0
+    for row in range(board.grid_size):
+        for column in range(board.grid_size):
+            for row_step, column_step in LINE_DIRECTIONS:
+                cells = [(row + row_step * distance, column + column_step * distance) for distance in range(board.win_length)]
+                if all(0 <= cell_row < board.grid_size and 0 <= cell_column < board.grid_size for cell_row, cell_column in cells):
+                    live += len({board.grid[cell_row][cell_column] for cell_row, cell_column in cells} - {" "}) <= 1
+
+    return live
+
+
+def state(board: TicTacToe) -> tuple:
+    return [list(row) for row in board.grid], board.active, board.winner, board.current_player, board.dead_lines
+
+
+class UnmakeTest(unittest.TestCase):
+    def test_unmake_restores_every_position(self):
+        rng = random.Random(1)
+        for grid_size, players, win_length in ((3, 2, 3), (5, 3, 4), (7, 2, 4)):
+            for _ in range(20):
+                board = TicTacToe(grid_size, players, "XOA"[:players], win_length)
+                states = [state(board)]
+                while board.active and len(board.history) < grid_size ** 2:
+                    free = [move for move in range(1, grid_size ** 2 + 1) if board.get_symbol_at(move) == " "]
+                    board.make_move(rng.choice(free))
+                    states.append(state(board))
+
+                # Take every move back, the grid, win state and line counters are the ones from before it.
+                moves = board.moves
+                while board.history:
+                    self.assertEqual(board.unmake_move(), moves[len(board.history)])
+                    states.pop()
+                    self.assertEqual(state(board), states[-1])
+
+                with self.assertRaises(ValueError):
+                    board.unmake_move()
+
+    def test_unmake_winning_move(self):
+        board = TicTacToe.replay([1, 4, 2, 5, 3])
+        self.assertEqual((board.active, board.winner), (False, 0))
+
+        board.unmake_move()
+        self.assertEqual((board.active, board.winner, board.current_player), (True, None, 0))
+
+        board.make_move(7)
+        self.assertTrue(board.active)
+
+    def test_snapshot_restore(self):
+        rng = random.Random(2)
+        for _ in range(20):
+            board = TicTacToe(5, 2, ("X", "O"), 4)
+            play_random_game(board, rng)
+            while len(board.history) > 6:
+                board.unmake_move()
+
+            snapshot = board.snapshot()
+            expected = state(board)
+
+            # Restore on a board in another position.
+            other = TicTacToe(5, 2, ("X", "O"), 4)
+            play_random_game(other, rng)
+            other.restore(snapshot)
+
+            self.assertEqual(state(other), expected)
+            self.assertEqual(other.snapshot(), snapshot)
+            self.assertEqual(other.history, [])
+
+    def test_replay_equals_playing(self):
+        rng = random.Random(3)
+        for _ in range(20):
+            board = TicTacToe(6, 3, ("X", "O", "A"), 4)
+            moves = play_random_game(board, rng)
+
+            replayed = TicTacToe.replay(moves, 6, 3, ("X", "O", "A"), 4)
+            self.assertEqual(state(replayed), state(board))
+            self.assertEqual(replayed.moves, moves)
+
+    def test_replay_rejects_invalid_moves(self):
+        with self.assertRaises(ValueError):
+            TicTacToe.replay([1, 1])
+
+        # The game is over after the third X.
+        with self.assertRaises(ValueError):
+            TicTacToe.replay([1, 4, 2, 5, 3, 6])
+
+
+class DrawTest(unittest.TestCase):
+    # X and O have blocked every line, with cell 2 still empty.
+    DEAD_MOVES = [1, 9, 7, 5, 8, 4, 6, 3]
+
+    def test_dead_position_is_a_draw(self):
+        board = TicTacToe.replay(self.DEAD_MOVES)
+
+        self.assertEqual(board.get_symbol_at(2), " ")
+        self.assertEqual(board.live_lines, 0)
+        self.assertFalse(board.active)
+        self.assertEqual(board.result, DRAW)
+
+    def test_live_position_is_not_a_draw(self):
+        board = TicTacToe.replay(self.DEAD_MOVES[:-1])
+
+        self.assertGreater(board.live_lines, 0)
+        self.assertTrue(board.active)
+        self.assertIsNone(board.result)
+
+    def test_without_line_tracking(self):
+        board = TicTacToe.replay(self.DEAD_MOVES, track_lines=False)
+
+        self.assertIsNone(board.live_lines)
+        self.assertIsNone(board.result)
+
+    def test_live_lines_match_the_board(self):
+        rng = random.Random(4)
+        for grid_size, players, win_length in ((3, 2, 3), (4, 3, 3), (6, 2, 4), (8, 4, 5)):
+            for _ in range(10):
+                board = TicTacToe(grid_size, players, "XOAB"[:players], win_length)
+                while board.active:
+                    free = [move for move in range(1, grid_size ** 2 + 1) if board.get_symbol_at(move) == " "]
+                    board.make_move(rng.choice(free))
+
+                    # A draw exactly when no line can be completed, unless the move won.
+                    live = count_live_lines(board)
+                    self.assertEqual(board.live_lines, live)
+                    if board.winner is None:
+                        self.assertEqual(board.result, DRAW if not live else None)
+
+
+class BitboardParityTest(unittest.TestCase):
+    def test_same_moves_same_game(self):
+        rng = random.Random(5)
+        for grid_size, players, win_length in ((3, 2, 3), (4, 2, 4), (5, 3, 4), (7, 2, 5), (9, 4, 4)):
+            for _ in range(10):
+                symbols = "XOAB"[:players]
+                board = TicTacToe(grid_size, players, symbols, win_length)
+                bitboard = BitboardTicTacToe(grid_size, players, symbols, win_length)
+
+                while board.active:
+                    free = [move for move in range(1, grid_size ** 2 + 1) if board.get_symbol_at(move) == " "]
+                    self.assertEqual([move for move in range(1, grid_size ** 2 + 1) if bitboard.get_symbol_at(move) == " "], free)
+
+                    move = rng.choice(free)
+                    board.make_move(move)
+                    bitboard.make_move(move)
+
+                    self.assertEqual(bitboard.grid, board.grid)
+                    self.assertEqual((bitboard.winner, bitboard.result, bitboard.live_lines),
+                                     (board.winner, board.result, board.live_lines))
+                    self.assertEqual(bitboard.snapshot(), board.snapshot())
+
+                # Taking the moves back stays in step as well.
+                while board.history:
+                    self.assertEqual(bitboard.unmake_move(), board.unmake_move())
+                    self.assertEqual(bitboard.grid, board.grid)
+                    self.assertEqual((bitboard.active, bitboard.winner, bitboard.dead_lines),
+                                     (board.active, board.winner, board.dead_lines))
+
+    def test_from_board(self):
+        board = TicTacToe.replay([1, 9, 7, 5, 8], 3)
+        bitboard = BitboardTicTacToe.from_board(board)
+
+        self.assertEqual(bitboard.grid, board.grid)
+        self.assertEqual(bitboard.snapshot(), board.snapshot())
+        self.assertEqual(bitboard.dead_lines, bitboard.count_dead_lines())
+
+
+if __name__ == '__main__':
+    unittest.main()
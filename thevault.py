@@ -1,13 +1,26 @@
+import argparse
+import getpass
+import json
 import os
-
+import sys
+import time
+
+from util.agent import VaultAgent, connect_agent, default_socket_path
+from util.bulkgen import generate_into_vault, write_passwords
+from util.commands import COMMANDS, DEFAULT_COMPLEXITY, DEFAULT_LENGTH, run_batch, run_command
+from util.ciphers import CIPHERS, benchmark_cipher, fastest_cipher
+from util.kdf import calibrate_kdf
 from util.passgen import Vault
+from util.stats import format_stats
+from util.transfer import TRANSFER_FORMATS, guess_format, read_entries, write_entries
 from helpers import validate_input
 
 
-def new_vault() -> Vault:
+def new_vault(collect_stats: bool = False) -> Vault:
     """
     Generate a new vault.
 
+    :param collect_stats: Whether to time the vault operations.
     :return:
     """
 
@@ -15,8 +28,12 @@ def new_vault() -> Vault:
     print("To create a new vault, create a password below.")
     vault_key = validate_input("Password for new vault: ", lambda x: 8 <= len(x) <= 32 and x.isprintable(), err_text="It needs to be at least 8 characters, max 32. (no weird characters).\n")
 
-    # Make a new vault object.
-    vault = Vault(vault_key.encode("utf-8"))
+    # Make the key derivation take about a quarter of a second on this machine.
+    print("Calibrating the key derivation...")
+    kdf = calibrate_kdf(0.25)
+
+    # Make a new vault object, encrypted with the fastest cipher on this CPU.
+    vault = Vault(vault_key.encode("utf-8"), cipher=fastest_cipher(), kdf=kdf, collect_stats=collect_stats)
 
     # Remove vault key from memory for security.
     del vault_key
@@ -24,10 +41,11 @@ def new_vault() -> Vault:
     return vault
 
 
-def existing_vault() -> Vault:
+def existing_vault(collect_stats: bool = False) -> Vault:
     """
     Open an existing vault.
 
+    :param collect_stats: Whether to time the vault operations.
     :return:
     """
 
@@ -36,7 +54,7 @@ def existing_vault() -> Vault:
     vault_key = validate_input(": ", lambda x: 8 <= len(x) <= 32 and x.isprintable(), err_text="Has to be at least 8 characters long, max 32. No weird characters.\n")
 
     # Key is provided for existing vault. Try to open it.
-    vault = Vault(vault_key.encode("utf-8"))
+    vault = Vault(vault_key.encode("utf-8"), collect_stats=collect_stats)
     try:
         vault.unlock_vault()
         vault.lock_vault()
@@ -50,29 +68,396 @@ def existing_vault() -> Vault:
     return vault
 
 
-def get_vault() -> Vault:
+def get_vault(collect_stats: bool = False) -> Vault:
     """
     Try to retrieve an existing vault.
 
+    :param collect_stats: Whether to time the vault operations, see print_stats().
     :return:
     """
 
     if os.path.isfile("vault.edb"):
-        return existing_vault()
+        return existing_vault(collect_stats)
+    else:
+        return new_vault(collect_stats)
+
+
+def open_vault(collect_stats: bool = False):
+    """
+    Open the vault for the scriptable commands, without the menu.
+    A running agent is used if there is one. Otherwise the password comes from the VAULT_PASSWORD environment variable,
+    or is asked on the terminal, so stdin stays free for batch files.
+
+    :param collect_stats: Whether to time the vault operations.
+    :return: The vault or agent client.
+    """
+
+    agent = connect_agent(default_socket_path())
+    if agent is not None:
+        return agent
+
+    vault_key = os.environ.get("VAULT_PASSWORD")
+    if vault_key is None:
+        vault_key = getpass.getpass("Vault password: ")
+
+    if not (8 <= len(vault_key) <= 32 and vault_key.isprintable()):
+        print("The vault password has to be at least 8 characters long, max 32. No weird characters.", file=sys.stderr)
+        exit(2)
+
+    # A new vault gets the same cipher and key derivation as one made from the menu.
+    if os.path.isfile("vault.edb"):
+        vault = Vault(vault_key.encode("utf-8"), collect_stats=collect_stats)
+    else:
+        vault = Vault(vault_key.encode("utf-8"), cipher=fastest_cipher(), kdf=calibrate_kdf(0.25), collect_stats=collect_stats)
+
+    # Remove vault key from memory for security.
+    del vault_key
+
+    return vault
+
+
+def print_stats(vault, stream=None):
+    """
+    Print where the time of the vault operations went.
+
+    :param vault: The vault or agent client.
+    :param stream: The stream to print to, stdout if None.
+    :return:
+    """
+
+    print("\nVault stats:", file=stream)
+    print(format_stats(vault.stats()), file=stream)
+
+
+def print_result(result: dict, as_json: bool = False):
+    """
+    Print the result of a scriptable command.
+    Plain output is the password, or a service per line. Errors go to stderr.
+
+    :param result: The result, see util.commands.run_command().
+    :param as_json: Whether to print the result as a JSON object on one line instead.
+    :return:
+    """
+
+    if as_json:
+        print(json.dumps(result))
+    elif not result["ok"]:
+        print("{}: {}".format(result["command"], result["error"]), file=sys.stderr)
+    elif "password" in result:
+        print(result["password"])
+    elif "services" in result:
+        for service in result["services"]:
+            print(service)
+
+
+def run_commands(args: argparse.Namespace):
+    """
+    Run a single scriptable command, or a batch of them with a single unlock and write of the vault.
+    The exit status is 1 if a command failed, 2 for a wrong vault password.
+
+    :param args: The parsed arguments of the command.
+    :return:
+    """
+
+    if args.command == "batch":
+        arguments = None
+    elif args.command == "set":
+        # Read the password from stdin if it isn't given, so it doesn't end up in the shell history.
+        arguments = [args.service, args.password if args.password is not None else sys.stdin.readline().rstrip("\n")]
+    elif args.command == "gen":
+        arguments = [args.service, str(args.length), args.complexity]
+    elif args.command == "ls":
+        arguments = [args.prefix] if args.prefix is not None else []
     else:
-        return new_vault()
+        arguments = [args.service]
+
+    vault = open_vault(args.stats)
+
+    try:
+        if arguments is None:
+            if args.file == "-":
+                results = run_batch(vault, sys.stdin)
+            else:
+                with open(args.file, encoding="utf-8") as stream:
+                    results = run_batch(vault, stream)
+        else:
+            results = [run_command(vault, args.command, arguments)]
+    except ValueError:
+        print("Invalid vault key provided.", file=sys.stderr)
+        exit(2)
+
+    for result in results:
+        print_result(result, args.json)
+
+    if args.stats:
+        print_stats(vault, sys.stderr)
+
+    if not all(result["ok"] for result in results):
+        exit(1)
+
+
+def start_agent(show_stats: bool = False):
+    """
+    Unlock the vault and keep it unlocked in a background agent.
+
+    :param show_stats: Whether to collect stats, and print them when the agent stops.
+    :return:
+    """
+
+    vault = get_vault(show_stats)
+    socket_path = default_socket_path()
+
+    print("\nThe vault agent is listening on {}.".format(socket_path))
+    try:
+        VaultAgent(vault, socket_path).run()
+    except RuntimeError as e:
+        print(e)
+        return
+
+    print("The vault agent has stopped and the vault is locked.")
+
+    if show_stats:
+        print_stats(vault)
+
+
+def import_file(path: str, file_format: str = None, show_stats: bool = False):
+    """
+    Import the passwords from an export file with a single write of the vault.
+
+    :param path: The path to the CSV or JSON lines file.
+    :param file_format: The format of the file, guessed from the file name if None.
+    :param show_stats: Whether to print the vault stats afterwards.
+    :return:
+    """
+
+    vault = get_vault(show_stats)
+
+    def warn(line_number: int, reason: str):
+        print("Skipped line {} of {}: {}.".format(line_number, path, reason), file=sys.stderr)
+
+    start = time.perf_counter()
+    with open(path, newline="", encoding="utf-8") as stream:
+        try:
+            count = vault.import_entries(read_entries(stream, file_format or guess_format(path), warn))
+        except ValueError as e:
+            print("\nCould not import {}, nothing was imported: {}".format(path, e), file=sys.stderr)
+            exit(1)
+
+    print("\nImported {} passwords in {:.2f} seconds.".format(count, time.perf_counter() - start))
+
+    if show_stats:
+        print_stats(vault)
+
+
+def export_file(path: str, file_format: str = None, show_stats: bool = False):
+    """
+    Export the passwords to a plain text file.
+
+    :param path: The path to the CSV or JSON lines file.
+    :param file_format: The format of the file, guessed from the file name if None.
+    :param show_stats: Whether to print the vault stats afterwards.
+    :return:
+    """
+
+    vault = get_vault(show_stats)
+
+    # The file holds the passwords in plain text, so only the owner may read it, from the moment it exists.
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
 
+    # The mode of os.open() only applies to new files.
+    os.fchmod(descriptor, 0o600)
 
-def main():
+    with open(descriptor, 'w', newline="", encoding="utf-8") as stream:
+        count = write_entries(vault.export_entries(), stream, file_format or guess_format(path))
+
+    print("\nExported {} passwords to {}. This file is not encrypted!".format(count, path))
+
+    if show_stats:
+        print_stats(vault)
+
+
+def sync_vault(path: str, ask_password: bool = False, show_stats: bool = False):
+    """
+    Sync the vault with a copy of it, i.e. in a synced folder or on a USB drive.
+
+    :param path: The other vault file, or the directory that holds it.
+    :param ask_password: Whether the other vault has its own password.
+    :param show_stats: Whether to print the vault stats afterwards.
+    :return:
+    """
+
+    vault = get_vault(show_stats)
+
+    other_key = None
+    if ask_password:
+        other_key = validate_input("Password of the other vault: ", lambda x: 8 <= len(x) <= 32 and x.isprintable(), err_text="Has to be at least 8 characters long, max 32. No weird characters.\n").encode("utf-8")
+
+    start = time.perf_counter()
+    try:
+        result = vault.merge(path, other_key)
+    except ValueError:
+        print("\nInvalid password for the other vault.")
+        exit(0)
+
+    print("\nSynced in {:.2f} seconds: {} entries pulled, {} entries pushed, {} hashes compared.".format(
+        time.perf_counter() - start, result["pulled"], result["pushed"], result["hashes"]))
+
+    if show_stats:
+        print_stats(vault)
+
+
+def bulk_generate(args: argparse.Namespace):
+    """
+    Generate many passwords on all CPU cores, and write them to a file or store them in the vault.
+
+    :param args: The parsed arguments of the bulk-generate command.
+    :return:
+    """
+
+    start = time.perf_counter()
+
+    if args.store is not None:
+        vault = get_vault(args.stats)
+        count = generate_into_vault(vault, args.store, args.count, args.length, args.complexity, args.workers)
+        print("\nStored {} passwords in the vault in {:.2f} seconds.".format(count, time.perf_counter() - start))
+
+        if args.stats:
+            print_stats(vault)
+
+    elif args.output == "-":
+        write_passwords(sys.stdout, args.count, args.length, args.complexity, args.workers)
+
+    else:
+        with open(args.output, 'w') as stream:
+            count = write_passwords(stream, args.count, args.length, args.complexity, args.workers)
+
+        print("Wrote {} passwords to {} in {:.2f} seconds.".format(count, args.output, time.perf_counter() - start))
+
+
+def bench_ciphers():
+    """
+    Measure the throughput of every cipher for realistic vault sizes, and show the one new vaults use.
+
+    :return:
+    """
+
+    # (description, payload size, payload count) for a whole vault and for the entries of an indexed vault.
+    workloads = (
+        ("1k entry vault", 30000, 1),
+        ("100k entry vault", 3000000, 1),
+        ("1k single entries", 40, 1000)
+    )
+
+    print("{:>20} {:>20} {:>14} {:>14}".format("workload", "cipher", "seal (MB/s)", "open (MB/s)"))
+    for description, payload_size, payload_count in workloads:
+        for name, cipher in CIPHERS.items():
+            seal_speed, open_speed = benchmark_cipher(cipher, payload_size, payload_count)
+            print("{:>20} {:>20} {:>14.1f} {:>14.1f}".format(description, name, seal_speed, open_speed))
+
+    print("\nNew vaults on this machine use {}.".format(fastest_cipher()))
+
+
+def parse_arguments(arguments: list = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    :param arguments: The arguments to parse, sys.argv if None.
+    :return: The parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(description="EyeDevelop's password vault. Without a command, the interactive menu is started.")
+    parser.add_argument("--stats", action="store_true", help="Print where the time of the vault operations went when done.")
+    commands = parser.add_subparsers(dest="command")
+
+    commands.add_parser("agent", help="Keep the vault unlocked in a background agent.")
+
+    for command, action in (("import", "Import passwords from"), ("export", "Export passwords to")):
+        command_parser = commands.add_parser(command, help="{} a CSV or JSON lines file.".format(action))
+        command_parser.add_argument("file", help="The path to the file.")
+        command_parser.add_argument("--format", choices=TRANSFER_FORMATS, help="The format of the file. Guessed from the file name by default.")
+
+    commands.add_parser("bench-ciphers", help="Measure which cipher is fastest on this machine.")
+
+    sync_parser = commands.add_parser("sync", help="Sync the vault with a copy of it. Both end up with the newest version of every entry.")
+    sync_parser.add_argument("path", help="The other vault file, or the directory that holds it.")
+    sync_parser.add_argument("--ask-password", action="store_true", help="Ask for the password of the other vault, if it differs.")
+
+    # The scriptable commands, see util.commands.
+    get_parser = commands.add_parser("get", help="Print the password of a service.")
+    get_parser.add_argument("service", help="The name of the service.")
+
+    set_parser = commands.add_parser("set", help="Store the password of a service.")
+    set_parser.add_argument("service", help="The name of the service.")
+    set_parser.add_argument("password", nargs="?", help="The password. Read from stdin if it isn't given.")
+
+    gen_parser = commands.add_parser("gen", help="Generate and store the password of a service, and print it.")
+    gen_parser.add_argument("service", help="The name of the service.")
+    gen_parser.add_argument("--length", type=int, default=DEFAULT_LENGTH, help="The length of the password. Default: {}.".format(DEFAULT_LENGTH))
+    gen_parser.add_argument("--complexity", default=DEFAULT_COMPLEXITY, help="The complexity of the password as <letters><digits><symbols>. Default: {}.".format(DEFAULT_COMPLEXITY))
+
+    rm_parser = commands.add_parser("rm", help="Delete the password of a service.")
+    rm_parser.add_argument("service", help="The name of the service.")
+
+    ls_parser = commands.add_parser("ls", help="List the services, one per line.")
+    ls_parser.add_argument("prefix", nargs="?", help="Only list the services starting with this.")
+
+    batch_parser = commands.add_parser("batch", help="Run many commands with a single unlock and write of the vault, and print the results as JSON lines.")
+    batch_parser.add_argument("file", nargs="?", default="-", help="A file with a command per line, i.e. 'set github hunter22'. Default: stdin.")
+
+    for command_parser in (get_parser, set_parser, gen_parser, rm_parser, ls_parser):
+        command_parser.add_argument("--json", action="store_true", help="Print the result as a JSON object.")
+
+    batch_parser.set_defaults(json=True)
+
+    generate_parser = commands.add_parser("bulk-generate", help="Generate many passwords on all CPU cores.")
+    generate_parser.add_argument("count", type=int, help="The amount of passwords.")
+    generate_parser.add_argument("--length", type=int, default=16, help="The length of the passwords. Default: 16.")
+    generate_parser.add_argument("--complexity", default="311", help="The complexity of the passwords as <letters><digits><symbols>. Default: 311.")
+    generate_parser.add_argument("--workers", type=int, help="The amount of processes. Default: the amount of CPUs.")
+    generate_parser.add_argument("--output", default="-", help="The file to write the passwords to, one per line. Default: stdout.")
+    generate_parser.add_argument("--store", metavar="PREFIX", help="Store the passwords in the vault as <PREFIX><number> instead.")
+
+    return parser.parse_args(arguments)
+
+
+def main(show_stats: bool = False):
     print("Welcome to the Password Vault!")
 
+    # Use a running agent instead of decrypting the vault again.
+    agent = connect_agent(default_socket_path())
+    if agent is not None:
+        print("\nConnected to the vault agent.")
+        run_menu(agent)
+
+        # The agent only has stats when it was started with --stats.
+        if show_stats:
+            print_stats(agent)
+
+        agent.close()
+        return
+
     # Gather input.
-    vault = get_vault()
+    vault = get_vault(show_stats)
 
     print()
     print("\nLogged into the vault.")
 
-    # Run the menu.
+    # Run the menu. The session keeps the vault unlocked and writes it once on exit.
+    with vault.session():
+        run_menu(vault)
+
+    if show_stats:
+        print_stats(vault)
+
+
+def run_menu(vault):
+    """
+    Run the interactive menu on an unlocked vault.
+
+    :param vault: The vault to operate on.
+    :return:
+    """
+
     menu = True
     while menu:
         print("\nPlease choose what you want to do.")
@@ -80,15 +465,16 @@ def main():
         print("2: Generate a new password.")
         print("3: Retrieve a password.")
         print("4: Delete a password.")
-        print("5: Show the list of saved services.\n")
+        print("5: Show the list of saved services.")
+        print("6: Search the saved services.\n")
         print("0: Exit and lock the vault.\n")
 
-        option = int(validate_input("> ", lambda x: 0 <= int(x) <= 5))
+        option = int(validate_input("> ", lambda x: 0 <= int(x) <= 6))
 
         # Exit.
         if option == 0:
             print("\nLocking vault...")
-            vault.lock_vault()
+            vault.flush()
 
             print("Thanks for using EyeDevelop's Vault!")
             menu = False
@@ -131,11 +517,17 @@ def main():
         elif option == 3:
             service = validate_input("Please enter the service name: ", lambda x: x.isprintable() and len(x) > 0)
 
-            if service in vault.get_services():
-                print("Your password for {}: {}".format(service, vault.get_password(service)))
+            matches = vault.search_services(service)
+            if matches:
+                print("Your password for {}: {}".format(matches[0], vault.get_password(matches[0])))
             else:
                 print("That service is not stored in the vault.")
 
+                # Suggest services with a typo or two.
+                suggestions = vault.search_services(service, "fuzzy")
+                if suggestions:
+                    print("Did you mean: {}?".format(", ".join(suggestions[:5])))
+
         # Delete service.
         elif option == 4:
             service = validate_input("Please enter the service name: ", lambda x: x.isprintable() and len(x) > 0)
@@ -152,9 +544,37 @@ def main():
             for service in services:
                 print(service)
 
+        # Search services.
+        elif option == 6:
+            query = validate_input("Please enter (the start of) the service name: ", lambda x: x.isprintable() and len(x) > 0)
+
+            # Show the services starting with the query, or the ones close to it.
+            services = vault.search_services(query, "prefix") or vault.search_services(query, "fuzzy")
+
+            print("Found {} services:\n".format(len(services)))
+            for service in services:
+                print(service)
+
 
 if __name__ == '__main__':
     try:
-        main()
+        args = parse_arguments()
+
+        if args.command == "agent":
+            start_agent(args.stats)
+        elif args.command == "import":
+            import_file(args.file, args.format, args.stats)
+        elif args.command == "export":
+            export_file(args.file, args.format, args.stats)
+        elif args.command == "bulk-generate":
+            bulk_generate(args)
+        elif args.command == "bench-ciphers":
+            bench_ciphers()
+        elif args.command == "sync":
+            sync_vault(args.path, args.ask_password, args.stats)
+        elif args.command in COMMANDS or args.command == "batch":
+            run_commands(args)
+        else:
+            main(args.stats)
     except KeyboardInterrupt:
         exit(0)
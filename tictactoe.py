@@ -1,15 +1,21 @@
-from games.tictactoe import TicTacToe
+from games.ai import AlphaBetaPlayer
+from games.mcts import MonteCarloPlayer
+from games.tictactoe import DRAW, TicTacToe
 from helpers import validate_input
 
 
-def main(board_obj: TicTacToe):
+def main(board_obj: TicTacToe, computer_players: dict = None):
     """
     The main function to play a game of Tic Tac Toe.
     
     :param board_obj: The Board object to run the game on.
+    :param computer_players: The computer players by PlayerID, i.e. {1: AlphaBetaPlayer()} or {1: MonteCarloPlayer()}.
+                             The others are human.
     :return: 
     """
 
+    computer_players = computer_players or {}
+
     print("Welcome to Tic Tac Toe.")
     print("Possible moves are:")
     board_obj.print_move_grid()
@@ -18,16 +24,22 @@ def main(board_obj: TicTacToe):
         # Print a newline.
         print()
 
-        # Get the move the player made.
-        move = input(f"{board_obj.get_player_icon(board_obj.current_player)} > ")
+        if board_obj.current_player in computer_players:
+            # Let the computer pick a move.
+            move = computer_players[board_obj.current_player].choose_move(board_obj)
+            print(f"{board_obj.get_player_icon(board_obj.current_player)} > {move}")
 
-        # Check the validity of the move.
-        while not board_obj.check_move_validity(move):
-            print("Invalid move.")
+        else:
+            # Get the move the player made.
             move = input(f"{board_obj.get_player_icon(board_obj.current_player)} > ")
 
-        # Convert the move to an int.
-        move = int(move)
+            # Check the validity of the move.
+            while not board_obj.check_move_validity(move):
+                print("Invalid move.")
+                move = input(f"{board_obj.get_player_icon(board_obj.current_player)} > ")
+
+            # Convert the move to an int.
+            move = int(move)
 
         # Make the move.
         board_obj.make_move(move)
@@ -37,22 +49,45 @@ def main(board_obj: TicTacToe):
 
     # Print the winner.
     print("\nThe game ended!")
-    print(f"Player {board_obj.get_player_icon(board_obj.winner)} won!")
+    if board_obj.result == DRAW:
+        print("It's a draw, nobody can get a line anymore.")
+    else:
+        print(f"Player {board_obj.get_player_icon(board_obj.winner)} won!")
 
 
 if __name__ == '__main__':
     try:
         # Ask the user for parameters.
         grid_size = int(validate_input("Size of the grid: ", lambda x: x.isnumeric()))
+        win_length = validate_input("Symbols in a row to win (empty for the whole row): ", lambda x: x == "" or 1 <= int(x) <= grid_size)
         amount_of_players = int(validate_input("Amount of players: ", lambda x: x.isnumeric()))
         player_symbols = validate_input("Enter the symbols for the players, separated by space.\n", lambda x: len(set(x.split())) >= amount_of_players).split()[:amount_of_players]
         player_symbols = [x[:1] for x in player_symbols]  # Only use the first character of each symbol.
 
+        # Ask which players the computer plays, and how long it may think.
+        computer_symbols = validate_input("Symbols of the computer players, separated by space (empty for none): ", lambda x: set(x.split()) <= set(player_symbols)).split()
+        computer_players = {}
+        if computer_symbols:
+            time_budget = float(validate_input("Seconds the computer may think per move: ", lambda x: float(x) > 0))
+
+            # Alpha-beta is perfect on small boards, Monte Carlo tree search plays better on large ones.
+            engine = validate_input("Engine, alphabeta or mcts (empty for mcts above 5x5): ", lambda x: x in ("", "alphabeta", "mcts"))
+            if engine == "":
+                engine = "mcts" if grid_size > 5 else "alphabeta"
+
+            engine_class = MonteCarloPlayer if engine == "mcts" else AlphaBetaPlayer
+            computer_players = {player_symbols.index(symbol): engine_class(time_budget) for symbol in computer_symbols}
+
         # Create the Board class
-        board = TicTacToe(grid_size=grid_size, players=amount_of_players, player_symbols=player_symbols)
+        board = TicTacToe(grid_size=grid_size, players=amount_of_players, player_symbols=player_symbols, win_length=int(win_length) if win_length else None)
 
         # Run the main function.
-        main(board)
+        try:
+            main(board, computer_players)
+        finally:
+            # Stop the worker processes of the computer players.
+            for computer_player in computer_players.values():
+                computer_player.close()
 
     except KeyboardInterrupt:
         print("\n\nThanks for playing.")
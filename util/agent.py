@@ -0,0 +1,368 @@
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .passgen import Vault
+
+
+def default_socket_path(vault_file: str = "vault.edb") -> str:
+    """
+    A function which returns the agent socket of a vault file.
+    The VAULT_AGENT_SOCK environment variable overrides it.
+
+    :param vault_file: The path to the vault file.
+    :return: The path to the Unix socket.
+    """
+
+    return os.environ.get("VAULT_AGENT_SOCK", os.path.abspath(vault_file) + ".sock")
+
+
+class VaultAgent:
+    def __init__(self, vault: Vault, socket_path: str, idle_timeout: float = 900, flush_interval: float = 5):
+        """
+        A daemon which keeps a vault unlocked in memory and serves requests over a Unix socket, like ssh-agent.
+
+        Requests and responses are JSON objects, one per line.
+        Changes are written to disk in batches every flush_interval seconds.
+        The vault is locked and the agent stops after idle_timeout seconds without requests.
+        """
+
+        self.vault = vault
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.flush_interval = flush_interval
+
+        self.last_request = time.monotonic()
+        self.loop = None
+        self.stopped = None
+        self.clients = set()
+
+        # Decrypting and writing the vault blocks, so it runs on a worker thread instead of the event loop.
+        # A single thread keeps the vault work one request at a time.
+        self.executor = None
+
+    def handle_request(self, request: dict) -> dict:
+        """
+        A function which runs a single request on the vault.
+
+        :param request: The request, with an "op" and its arguments.
+        :return: The response.
+        """
+
+        op = request.get("op")
+
+        if op == "get":
+            return {"ok": True, "password": self.vault.get_password(request["service"])}
+
+        elif op == "store":
+            self.vault.store_password(request["service"], request["password"])
+            return {"ok": True}
+
+        elif op == "generate":
+            password = self.vault.generate_password(request["service"], int(request["length"]), request["complexity"])
+            return {"ok": True, "password": password}
+
+        elif op == "list":
+            return {"ok": True, "services": list(self.vault.get_services())}
+
+        elif op == "search":
+            services = self.vault.search_services(request["query"], request.get("mode", "exact"), int(request.get("max_distance", 2)))
+            return {"ok": True, "services": services}
+
+        elif op == "delete":
+            self.vault.delete_service(request["service"])
+            return {"ok": True}
+
+        elif op == "flush":
+            self.vault.flush()
+            return {"ok": True}
+
+        elif op == "stats":
+            return {"ok": True, "stats": self.vault.stats()}
+
+        elif op == "stop":
+            # This runs on the executor thread, the event belongs to the event loop.
+            self.loop.call_soon_threadsafe(self.stopped.set)
+            return {"ok": True}
+
+        return {"ok": False, "error": "Unknown operation: {}".format(op)}
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        A function which serves the requests of one client connection.
+
+        :param reader: The stream to read requests from.
+        :param writer: The stream to write responses to.
+        :return:
+        """
+
+        self.clients.add(asyncio.current_task())
+
+        try:
+            while not self.stopped.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+
+                self.last_request = time.monotonic()
+
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request has to be a JSON object.")
+
+                    response = await self.loop.run_in_executor(self.executor, self.handle_request, request)
+                except (AssertionError, AttributeError, KeyError, TypeError, ValueError) as e:
+                    # Invalid requests get an error response, the connection stays open.
+                    response = {"ok": False, "error": str(e) or type(e).__name__}
+
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except asyncio.CancelledError:
+            # The agent is shutting down.
+            pass
+        finally:
+            self.clients.discard(asyncio.current_task())
+            writer.close()
+
+    async def flush_periodically(self):
+        """
+        A task which writes batched changes to disk and stops the agent when it has been idle for too long.
+
+        :return:
+        """
+
+        while not self.stopped.is_set():
+            try:
+                await asyncio.wait_for(self.stopped.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            await self.loop.run_in_executor(self.executor, self.vault.flush)
+
+            if time.monotonic() - self.last_request > self.idle_timeout:
+                self.stopped.set()
+
+    async def serve(self):
+        """
+        A function which runs the agent until it is stopped or idle.
+
+        :return:
+        """
+
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+
+        if os.path.exists(self.socket_path):
+            # Don't take the socket away from an agent that is still running.
+            agent = connect_agent(self.socket_path)
+            if agent is not None:
+                agent.close()
+                raise RuntimeError("A vault agent is already running on {}.".format(self.socket_path))
+
+            # Nothing answers, so the socket was left behind by an agent that did not shut down cleanly.
+            os.remove(self.socket_path)
+
+        with self.vault.session(), ThreadPoolExecutor(max_workers=1) as self.executor:
+            # Only the owner may talk to the agent, from the moment the socket exists.
+            old_umask = os.umask(0o077)
+            try:
+                server = await asyncio.start_unix_server(self.handle_client, self.socket_path)
+            finally:
+                os.umask(old_umask)
+
+            # The socket doesn't need to be executable.
+            os.chmod(self.socket_path, 0o600)
+
+            try:
+                async with server:
+                    await self.flush_periodically()
+
+                    # Disconnect the clients that are still connected.
+                    for task in self.clients:
+                        task.cancel()
+
+                    await asyncio.gather(*self.clients, return_exceptions=True)
+            finally:
+                os.remove(self.socket_path)
+
+    def run(self):
+        """
+        A function which runs the agent in the foreground.
+
+        :return:
+        """
+
+        asyncio.run(self.serve())
+
+
+class AgentClient:
+    def __init__(self, socket_path: str):
+        """
+        A client for a running VaultAgent.
+        It has the same methods as a Vault, so it can be used in place of one.
+        """
+
+        self.socket_path = socket_path
+
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(socket_path)
+        self.stream = self.connection.makefile("rwb")
+
+    def request(self, op: str, **arguments) -> dict:
+        """
+        A function which sends a request to the agent and waits for the response.
+
+        :param op: The operation.
+        :param arguments: The arguments of the operation.
+        :return: The response.
+        """
+
+        arguments["op"] = op
+        self.stream.write(json.dumps(arguments).encode("utf-8") + b"\n")
+        self.stream.flush()
+
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("The vault agent closed the connection.")
+
+        response = json.loads(line)
+        assert response["ok"], response.get("error")
+
+        return response
+
+    def store_password(self, service_name: str, password: str):
+        """
+        A function which stores a password through the agent.
+
+        :param service_name: The name of the password.
+        :param password: The password to add.
+        :return:
+        """
+
+        self.request("store", service=service_name, password=password)
+
+    def generate_password(self, service_name: str, length: int, complexity_info: str) -> str:
+        """
+        A function which generates and stores a password through the agent.
+
+        :param service_name: The name of the password.
+        :param length: The length of the password.
+        :param complexity_info: The complexity of the password, see Vault.generate_password().
+        :return: The generated password.
+        """
+
+        return self.request("generate", service=service_name, length=length, complexity=complexity_info)["password"]
+
+    def get_password(self, service_name: str) -> str:
+        """
+        A function which retrieves a password through the agent.
+
+        :param service_name: The name of the password.
+        :return: The password.
+        """
+
+        return self.request("get", service=service_name)["password"]
+
+    def get_services(self) -> list:
+        """
+        A function which lists the services through the agent.
+
+        :return: The list of service names.
+        """
+
+        return self.request("list")["services"]
+
+    def search_services(self, query: str, mode: str = "exact", max_distance: int = 2) -> list:
+        """
+        A function which searches the services through the agent.
+
+        :param query: The service name, or the start of it for a prefix search.
+        :param mode: "exact", "prefix" or "fuzzy".
+        :param max_distance: The largest amount of typos a fuzzy search allows.
+        :return: The matching service names.
+        """
+
+        return self.request("search", query=query, mode=mode, max_distance=max_distance)["services"]
+
+    def delete_service(self, service_name: str):
+        """
+        A function which deletes a password through the agent.
+
+        :param service_name: The service to delete.
+        :return:
+        """
+
+        self.request("delete", service=service_name)
+
+    def flush(self):
+        """
+        A function which makes the agent write its changes to disk.
+
+        :return:
+        """
+
+        self.request("flush")
+
+    @contextlib.contextmanager
+    def session(self):
+        """
+        A context manager for a batch of operations, like Vault.session().
+        The agent keeps the vault unlocked already, so the session only writes the changes to disk when it ends.
+
+        :return:
+        """
+
+        try:
+            yield self
+        finally:
+            self.flush()
+
+    def stats(self) -> dict:
+        """
+        A function which returns the stats of the vault in the agent, see Vault.stats().
+
+        :return: The stats snapshot.
+        """
+
+        return self.request("stats")["stats"]
+
+    def stop(self):
+        """
+        A function which stops the agent, which writes and locks the vault.
+
+        :return:
+        """
+
+        self.request("stop")
+
+    def close(self):
+        """
+        A function which closes the connection to the agent.
+
+        :return:
+        """
+
+        self.stream.close()
+        self.connection.close()
+
+
+def connect_agent(socket_path: str):
+    """
+    A function which connects to a running agent.
+
+    :param socket_path: The path to the Unix socket of the agent.
+    :return: The client, or None if no agent is running.
+    """
+
+    if not os.path.exists(socket_path):
+        return None
+
+    try:
+        return AgentClient(socket_path)
+    except (ConnectionError, FileNotFoundError):
+        return None
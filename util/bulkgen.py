@@ -0,0 +1,97 @@
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .passgen import Vault, generate_passwords
+
+
+def _generate_chunk(count: int, length: int, complexity_info: str) -> list:
+    """
+    A function which generates one chunk of passwords in a worker process.
+    Every worker reads from os.urandom, which the kernel keeps safe to use from forked processes,
+    so the workers never share random state.
+
+    :param count: The amount of passwords.
+    :param length: The length of the passwords.
+    :param complexity_info: The complexity of the passwords, see generate_passwords().
+    :return: The list of passwords.
+    """
+
+    return generate_passwords(count, length, complexity_info)
+
+
+def stream_passwords(count: int, length: int, complexity_info: str, workers: int = None, chunk_size: int = 50000):
+    """
+    A generator which generates passwords on a pool of processes and yields them in chunks.
+    Only a few chunks per worker are in flight at a time, so memory use does not depend on count.
+
+    :param count: The amount of passwords.
+    :param length: The length of the passwords.
+    :param complexity_info: The complexity of the passwords, see generate_passwords().
+    :param workers: The amount of processes, the amount of CPUs if None.
+    :param chunk_size: The amount of passwords per chunk.
+    :return:
+    """
+
+    workers = workers or os.cpu_count() or 1
+
+    # A single worker doesn't need the pool.
+    if workers == 1:
+        for start in range(0, count, chunk_size):
+            yield generate_passwords(min(chunk_size, count - start), length, complexity_info)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        chunks = iter(range(0, count, chunk_size))
+
+        while True:
+            # Keep two chunks per worker in flight.
+            for start in chunks:
+                pending.append(executor.submit(_generate_chunk, min(chunk_size, count - start), length, complexity_info))
+                if len(pending) >= workers * 2:
+                    break
+
+            if not pending:
+                break
+
+            yield pending.popleft().result()
+
+
+def write_passwords(stream, count: int, length: int, complexity_info: str, workers: int = None) -> int:
+    """
+    A function which writes generated passwords to a text stream, one per line.
+
+    :param stream: The text stream to write to.
+    :param count: The amount of passwords.
+    :param length: The length of the passwords.
+    :param complexity_info: The complexity of the passwords, see generate_passwords().
+    :param workers: The amount of processes, the amount of CPUs if None.
+    :return: The amount of passwords written.
+    """
+
+    written = 0
+    for chunk in stream_passwords(count, length, complexity_info, workers):
+        stream.write("\n".join(chunk))
+        stream.write("\n")
+        written += len(chunk)
+
+    return written
+
+
+def generate_into_vault(vault: Vault, service_prefix: str, count: int, length: int, complexity_info: str, workers: int = None) -> int:
+    """
+    A function which generates passwords for "<service_prefix><number>" services and stores them with a single write.
+
+    :param vault: The vault to store the passwords in.
+    :param service_prefix: The start of the service names.
+    :param count: The amount of passwords.
+    :param length: The length of the passwords.
+    :param complexity_info: The complexity of the passwords, see generate_passwords().
+    :param workers: The amount of processes, the amount of CPUs if None.
+    :return: The amount of passwords stored.
+    """
+
+    passwords = (password for chunk in stream_passwords(count, length, complexity_info, workers) for password in chunk)
+
+    return vault.import_entries(("{}{}".format(service_prefix, index), password) for index, password in enumerate(passwords))
@@ -0,0 +1,191 @@
+import time
+
+from Crypto.Cipher import AES, ChaCha20_Poly1305
+from Crypto.Random import get_random_bytes
+
+# All backends use 128 bit authentication tags.
+TAG_SIZE = 16
+
+
+class Cipher:
+    def __init__(self, name: str, nonce_size: int):
+        """
+        The base class of the authenticated encryption backends.
+        Sealed data is laid out as nonce | tag | cipher text.
+        """
+
+        self.name = name
+        self.nonce_size = nonce_size
+
+    def new(self, key: bytes, nonce: bytes):
+        """
+        A function which creates a pycryptodome cipher object.
+
+        :param key: The 32 byte key.
+        :param nonce: The nonce.
+        :return: The cipher object.
+        """
+
+        raise NotImplementedError
+
+    def seal(self, key: bytes, data: bytes, associated_data: bytes = None) -> bytes:
+        """
+        A function which encrypts and authenticates data.
+
+        :param key: The 32 byte key.
+        :param data: The plain text data.
+        :param associated_data: Plain text that is authenticated along with the data, but not stored with it.
+        :return: nonce | tag | cipher text.
+        """
+
+        nonce = get_random_bytes(self.nonce_size)
+        cipher = self.new(key, nonce)
+        if associated_data is not None:
+            cipher.update(associated_data)
+
+        encrypted, tag = cipher.encrypt_and_digest(data)
+
+        return b"".join([nonce, tag, encrypted])
+
+    def unseal(self, key: bytes, data, associated_data: bytes = None) -> bytes:
+        """
+        A function which verifies and decrypts data made by seal().
+
+        :param key: The 32 byte key.
+        :param data: nonce | tag | cipher text.
+        :param associated_data: The associated data it was sealed with, it fails to verify with any other.
+        :return: The plain text data.
+        """
+
+        tag_start = self.nonce_size
+        data_start = tag_start + TAG_SIZE
+
+        cipher = self.new(key, bytes(data[:tag_start]))
+        if associated_data is not None:
+            cipher.update(associated_data)
+
+        return cipher.decrypt_and_verify(data[data_start:], data[tag_start:data_start])
+
+
+class AESCipher(Cipher):
+    def __init__(self, name: str, mode: int, nonce_size: int):
+        """
+        An AES backend in one of the authenticated modes of pycryptodome.
+        """
+
+        super().__init__(name, nonce_size)
+        self.mode = mode
+
+    def new(self, key: bytes, nonce: bytes):
+        return AES.new(key, self.mode, nonce=nonce)
+
+
+class ChaCha20Poly1305Cipher(Cipher):
+    def __init__(self):
+        """
+        The ChaCha20-Poly1305 backend, which is fast on CPUs without AES instructions.
+        """
+
+        super().__init__("chacha20-poly1305", 12)
+
+    def new(self, key: bytes, nonce: bytes):
+        return ChaCha20_Poly1305.new(key=key, nonce=nonce)
+
+
+# The available backends by the name stored in the vault header.
+CIPHERS = {cipher.name: cipher for cipher in (
+    AESCipher("aes-gcm", AES.MODE_GCM, 12),
+    AESCipher("aes-eax", AES.MODE_EAX, 16),
+    AESCipher("aes-ocb", AES.MODE_OCB, 15),
+    ChaCha20Poly1305Cipher()
+)}
+
+# The backends for the aes_type argument of Vault.
+AES_MODE_CIPHERS = {
+    AES.MODE_EAX: "aes-eax",
+    AES.MODE_GCM: "aes-gcm",
+    AES.MODE_OCB: "aes-ocb"
+}
+
+
+# Vaults from before the cipher was stored used the AES mode of the Vault with 16 byte nonces.
+LEGACY_SUFFIX = "-nonce16"
+
+
+def legacy_cipher(aes_type: int) -> Cipher:
+    """
+    A function which returns the backend for vaults from before the cipher was stored in the header.
+
+    :param aes_type: The AES mode the vault was created with.
+    :return: The backend.
+    """
+
+    name = AES_MODE_CIPHERS[aes_type]
+    if CIPHERS[name].nonce_size == 16:
+        return CIPHERS[name]
+
+    return AESCipher(name + LEGACY_SUFFIX, aes_type, 16)
+
+
+def get_cipher(name: str) -> Cipher:
+    """
+    A function which returns the backend with the name stored in a vault header.
+
+    :param name: The name of the backend.
+    :return: The backend.
+    """
+
+    if name in CIPHERS:
+        return CIPHERS[name]
+
+    if name.endswith(LEGACY_SUFFIX) and name[:-len(LEGACY_SUFFIX)] in CIPHERS:
+        return AESCipher(name, CIPHERS[name[:-len(LEGACY_SUFFIX)]].mode, 16)
+
+    raise ValueError("Unknown vault cipher: {}".format(name))
+
+
+def benchmark_cipher(cipher: Cipher, payload_size: int, payload_count: int = 1, repeat: int = 3):
+    """
+    A function which measures the seal and open throughput of a backend.
+
+    :param cipher: The backend.
+    :param payload_size: The size of every payload in bytes.
+    :param payload_count: The amount of payloads, i.e. the entries of an indexed vault.
+    :param repeat: The amount of runs, the best one is used.
+    :return: The seal and open throughput in MB/s.
+    """
+
+    key = get_random_bytes(32)
+    payloads = [get_random_bytes(payload_size) for _ in range(payload_count)]
+
+    seal_time = open_time = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sealed = [cipher.seal(key, payload) for payload in payloads]
+        elapsed = time.perf_counter() - start
+        seal_time = elapsed if seal_time is None else min(seal_time, elapsed)
+
+        start = time.perf_counter()
+        for data in sealed:
+            cipher.unseal(key, data)
+        elapsed = time.perf_counter() - start
+        open_time = elapsed if open_time is None else min(open_time, elapsed)
+
+    megabytes = payload_size * payload_count / 1e6
+
+    return megabytes / seal_time, megabytes / open_time
+
+
+def fastest_cipher(payload_size: int = 1 << 20) -> str:
+    """
+    A function which picks the backend with the best combined seal and open time on this CPU.
+
+    :param payload_size: The size of the payload to measure with.
+    :return: The name of the fastest backend.
+    """
+
+    def total_time(name: str) -> float:
+        seal_speed, open_speed = benchmark_cipher(CIPHERS[name], payload_size)
+        return 1 / seal_speed + 1 / open_speed
+
+    return min(CIPHERS, key=total_time)
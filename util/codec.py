@@ -0,0 +1,317 @@
+import itertools
+import pickle
+import struct
+import sys
+from array import array
+
+# Encoded data starts with the magic, the codec version, the kind of data, the length typecode and the amount of entries.
+MAGIC = b"EVC"
+VERSION = 1
+HEADER = struct.Struct("<3sBBcI")
+
+# The kinds of encoded data.
+KIND_MAP = 0
+KIND_INDEX = 1
+KIND_LIST = 2
+KIND_SEPARATED_MAP = 3
+
+# Separates the strings of a separated map.
+SEPARATOR = "\x00"
+
+# The typecodes used for the length table, smallest first.
+# The largest value of a typecode marks a None value, which log records use for deletions.
+LENGTH_TYPECODES = (b"B", b"H", b"I")
+
+# Pickle data starts with the PROTO opcode.
+PICKLE_PROTO = 0x80
+
+
+def _none_length(typecode: str) -> int:
+    """
+    A function which returns the length that marks a None value.
+
+    :param typecode: The typecode of the length table.
+    :return: The largest value of the typecode.
+    """
+
+    return (1 << (8 * array(typecode).itemsize)) - 1
+
+
+def _read_array(data, offset: int, count: int, typecode: str) -> array:
+    """
+    A function which reads a little endian array from the encoded data.
+
+    :param data: A memoryview of the encoded data.
+    :param offset: The offset of the array.
+    :param count: The amount of items.
+    :param typecode: The array typecode.
+    :return: The array.
+    """
+
+    values = array(typecode)
+    values.frombytes(data[offset:offset + count * values.itemsize])
+    if len(values) != count:
+        raise ValueError("Truncated vault codec payload.")
+
+    if sys.byteorder != "little":
+        values.byteswap()
+
+    return values
+
+
+def _write_array(values: array) -> bytes:
+    """
+    A function which writes an array as little endian.
+
+    :param values: The array.
+    :return: The bytes.
+    """
+
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+
+    return values.tobytes()
+
+
+def _encode_strings(strings: list):
+    """
+    A function which encodes strings into a length table and one block of UTF-8 data.
+
+    :param strings: The strings to encode, which may contain None.
+    :return: The typecode, the length table and the UTF-8 data.
+    """
+
+    if None in strings:
+        # Only small payloads such as log records contain None, so this path does not need to be fast.
+        encoded = [string.encode("utf-8") for string in strings if string is not None]
+        lengths = [None if string is None else len(string.encode("utf-8")) for string in strings]
+    else:
+        text = "".join(strings)
+        if text.isascii():
+            # ASCII strings have as many bytes as characters, so everything is encoded at once.
+            encoded = [text.encode("ascii")]
+            lengths = list(map(len, strings))
+        else:
+            encoded = list(map(str.encode, strings))
+            lengths = list(map(len, encoded))
+
+    # Use the smallest typecode that fits every length.
+    longest = max((length for length in lengths if length is not None), default=0)
+    for typecode in LENGTH_TYPECODES:
+        typecode = typecode.decode("ascii")
+        if longest < _none_length(typecode):
+            break
+    else:
+        raise ValueError("String is too long to encode.")
+
+    if None in lengths:
+        none_length = _none_length(typecode)
+        lengths = [none_length if length is None else length for length in lengths]
+
+    return typecode, array(typecode, lengths), b"".join(encoded)
+
+
+def _decode_strings(data, offset: int, lengths: array) -> list:
+    """
+    A function which decodes a block of UTF-8 data with its length table.
+    The data is sliced through a memoryview, so only the strings themselves are copied.
+
+    :param data: A memoryview of the encoded data.
+    :param offset: The offset of the first string.
+    :param lengths: The byte lengths of the strings.
+    :return: The list of strings.
+    """
+
+    none_length = _none_length(lengths.typecode)
+    if none_length in lengths:
+        # Only small payloads such as log records contain None.
+        strings = []
+        for length in lengths:
+            if length == none_length:
+                strings.append(None)
+            else:
+                strings.append(str(data[offset:offset + length], "utf-8"))
+                offset += length
+
+        if offset > len(data):
+            raise ValueError("Truncated vault codec payload.")
+
+        return strings
+
+    ends = list(itertools.accumulate(lengths))
+    block = data[offset:offset + (ends[-1] if ends else 0)]
+    if len(block) != (ends[-1] if ends else 0):
+        raise ValueError("Truncated vault codec payload.")
+    slices = map(slice, itertools.chain((0,), ends), ends)
+
+    text = str(block, "utf-8")
+    if len(text) == len(block):
+        # Pure ASCII, so byte offsets are character offsets.
+        return list(map(text.__getitem__, slices))
+
+    block = bytes(block)
+    return list(map(bytes.decode, map(block.__getitem__, slices)))
+
+
+def _read_header(data, kind: int):
+    """
+    A function which validates the header of the encoded data.
+
+    :param data: A memoryview of the encoded data.
+    :param kind: The expected kind of data.
+    :return: The typecode of the length table and the amount of entries.
+    """
+
+    if len(data) < HEADER.size:
+        raise ValueError("Truncated vault codec payload.")
+
+    magic, version, data_kind, typecode, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a vault codec payload.")
+
+    if version > VERSION:
+        raise ValueError("Unsupported vault codec version: {}".format(version))
+
+    if data_kind != kind:
+        raise ValueError("Unexpected vault codec payload kind: {}".format(data_kind))
+
+    if typecode not in LENGTH_TYPECODES:
+        raise ValueError("Invalid vault codec length typecode.")
+
+    return typecode.decode("ascii"), count
+
+
+def encode_map(passwords: dict) -> bytes:
+    """
+    A function which encodes a service -> password dictionary.
+    A password may be None, which log records use to mark deleted services.
+
+    The layout is the header and the UTF-8 data of the keys and values, separated by NUL characters.
+    That decodes with a single split, which is what makes reading a vault as fast as pickle.
+    If a string contains a NUL, or a password is None, the separators are replaced by a table with the byte lengths.
+
+    :param passwords: The dictionary to encode.
+    :return: The encoded data.
+    """
+
+    # Keys and values alternate.
+    strings = list(itertools.chain.from_iterable(passwords.items()))
+
+    if strings and None not in strings:
+        text = SEPARATOR.join(strings)
+
+        # Only the separators themselves may be NUL characters.
+        if text.count(SEPARATOR) == len(strings) - 1:
+            header = HEADER.pack(MAGIC, VERSION, KIND_SEPARATED_MAP, LENGTH_TYPECODES[0], len(passwords))
+            return header + text.encode("utf-8")
+
+    typecode, lengths, strings = _encode_strings(strings)
+
+    header = HEADER.pack(MAGIC, VERSION, KIND_MAP, typecode.encode("ascii"), len(passwords))
+
+    return b"".join([header, _write_array(lengths), strings])
+
+
+def decode_map(data) -> dict:
+    """
+    A function which decodes a dictionary made by encode_map(), in either layout.
+    Pickled dictionaries from older vaults are still read, so they can be migrated.
+
+    :param data: The encoded data.
+    :return: The dictionary.
+    """
+
+    data = memoryview(data)
+
+    # Vaults from before the codec stored a pickle.
+    if len(data) and data[0] == PICKLE_PROTO:
+        return pickle.loads(data)
+
+    if len(data) < HEADER.size:
+        raise ValueError("Truncated vault codec payload.")
+
+    if HEADER.unpack_from(data, 0)[2] == KIND_SEPARATED_MAP:
+        typecode, count = _read_header(data, KIND_SEPARATED_MAP)
+        strings = str(data[HEADER.size:], "utf-8").split(SEPARATOR)
+        if len(strings) != count * 2:
+            raise ValueError("Invalid vault codec map.")
+    else:
+        typecode, count = _read_header(data, KIND_MAP)
+        lengths = _read_array(data, HEADER.size, count * 2, typecode)
+        strings = _decode_strings(data, HEADER.size + len(lengths) * lengths.itemsize, lengths)
+
+    iterator = iter(strings)
+    return dict(zip(iterator, iterator))
+
+
+def encode_index(index: dict) -> bytes:
+    """
+    A function which encodes a service -> (offset, length) index.
+
+    :param index: The index to encode.
+    :return: The encoded data.
+    """
+
+    typecode, lengths, strings = _encode_strings(list(index))
+    positions = array("Q", itertools.chain.from_iterable(index.values()))
+
+    header = HEADER.pack(MAGIC, VERSION, KIND_INDEX, typecode.encode("ascii"), len(index))
+
+    return b"".join([header, _write_array(positions), _write_array(lengths), strings])
+
+
+def decode_index(data) -> dict:
+    """
+    A function which decodes an index made by encode_index().
+    Pickled indexes are still read, so they can be migrated.
+
+    :param data: The encoded data.
+    :return: The index.
+    """
+
+    data = memoryview(data)
+
+    if len(data) and data[0] == PICKLE_PROTO:
+        return pickle.loads(data)
+
+    typecode, count = _read_header(data, KIND_INDEX)
+    positions = _read_array(data, HEADER.size, count * 2, "Q")
+
+    offset = HEADER.size + len(positions) * positions.itemsize
+    lengths = _read_array(data, offset, count, typecode)
+    service_names = _decode_strings(data, offset + len(lengths) * lengths.itemsize, lengths)
+
+    iterator = iter(positions)
+    return dict(zip(service_names, zip(iterator, iterator)))
+
+
+def encode_list(strings: list) -> bytes:
+    """
+    A function which encodes a list of strings, i.e. the service names of a vault.
+
+    :param strings: The strings to encode.
+    :return: The encoded data.
+    """
+
+    typecode, lengths, strings = _encode_strings(list(strings))
+
+    header = HEADER.pack(MAGIC, VERSION, KIND_LIST, typecode.encode("ascii"), len(lengths))
+
+    return b"".join([header, _write_array(lengths), strings])
+
+
+def decode_list(data) -> list:
+    """
+    A function which decodes a list made by encode_list().
+
+    :param data: The encoded data.
+    :return: The list of strings.
+    """
+
+    data = memoryview(data)
+
+    typecode, count = _read_header(data, KIND_LIST)
+    lengths = _read_array(data, HEADER.size, count, typecode)
+
+    return _decode_strings(data, HEADER.size + len(lengths) * lengths.itemsize, lengths)
@@ -0,0 +1,144 @@
+import shlex
+
+# The arguments of every command, optional ones in brackets.
+COMMANDS = {
+    "get": ("service",),
+    "set": ("service", "password"),
+    "gen": ("service", "[length]", "[complexity]"),
+    "rm": ("service",),
+    "ls": ("[prefix]",)
+}
+
+# The defaults of gen, the same as bulk-generate.
+DEFAULT_LENGTH = 16
+DEFAULT_COMPLEXITY = "311"
+
+
+def parse_command(line: str) -> list:
+    """
+    A function which splits a line of a batch file into a command and its arguments, like a shell would.
+
+    :param line: The line, i.e. 'set "my bank" hunter22'.
+    :return: The command and its arguments, an empty list for blank lines and # comments.
+    """
+
+    return shlex.split(line, comments=True)
+
+
+def _check_arguments(command: str, arguments: list):
+    """
+    A function which checks the amount of arguments of a command.
+
+    :param command: The command.
+    :param arguments: The arguments of the command.
+    :return:
+    """
+
+    if command not in COMMANDS:
+        raise ValueError("Unknown command: {}. Use one of {}.".format(command, ", ".join(COMMANDS)))
+
+    names = COMMANDS[command]
+    required = len([name for name in names if not name.startswith("[")])
+    if not required <= len(arguments) <= len(names):
+        raise ValueError("Usage: {} {}".format(command, " ".join(name.upper() for name in names)))
+
+
+def _check_complexity(complexity: str) -> str:
+    """
+    A function which checks a complexity, see Vault.generate_password().
+
+    :param complexity: The complexity, i.e. "311".
+    :return: The complexity.
+    """
+
+    if len(complexity) != 3 or not complexity.isdigit() or complexity[0] > "3" or complexity[1] > "1" or complexity[2] > "1":
+        raise ValueError("The complexity has to be <letters 0-3><digits 0-1><symbols 0-1>, i.e. 311.")
+
+    return complexity
+
+
+def run_command(vault, command: str, arguments: list) -> dict:
+    """
+    A function which runs one command on a vault or agent client.
+
+        get SERVICE                         Retrieve a password.
+        set SERVICE PASSWORD                Store a password.
+        gen SERVICE [LENGTH] [COMPLEXITY]   Generate and store a password, 16 and 311 by default.
+        rm SERVICE                          Delete a password.
+        ls [PREFIX]                         List the services, or the ones starting with PREFIX.
+
+    Invalid commands and missing services give a failed result instead of an error, so a batch can go on.
+    An invalid vault key still raises the ValueError of the vault.
+
+    :param vault: The vault or agent client.
+    :param command: The command.
+    :param arguments: The arguments of the command.
+    :return: The result, with "ok" and the output of the command, or "error".
+    """
+
+    result = {"command": command, "ok": True}
+
+    # Check the arguments before the vault is touched, so a ValueError from the vault is always a wrong key.
+    try:
+        _check_arguments(command, arguments)
+
+        if command == "gen":
+            length = int(arguments[1]) if len(arguments) > 1 else DEFAULT_LENGTH
+            if length < 1:
+                raise ValueError("The length has to be at least 1.")
+
+            complexity = _check_complexity(arguments[2]) if len(arguments) > 2 else DEFAULT_COMPLEXITY
+    except ValueError as e:
+        return dict(result, ok=False, error=str(e))
+
+    if command == "ls":
+        result["services"] = vault.search_services(arguments[0], "prefix") if arguments else sorted(vault.get_services())
+        return result
+
+    result["service"] = arguments[0].lower()
+
+    try:
+        if command == "get":
+            result["password"] = vault.get_password(arguments[0])
+
+        elif command == "set":
+            vault.store_password(arguments[0], arguments[1])
+
+        elif command == "gen":
+            result["password"] = vault.generate_password(arguments[0], length, complexity)
+
+        elif command == "rm":
+            vault.delete_service(arguments[0])
+
+    except AssertionError as e:
+        # The vault asserts that a service exists.
+        return dict(result, ok=False, error=str(e))
+
+    return result
+
+
+def run_batch(vault, lines) -> list:
+    """
+    A function which runs the commands of a batch file with a single unlock and a single write of the vault.
+    The results are returned after the write, so they only report changes that are on disk.
+
+    :param vault: The vault or agent client.
+    :param lines: An iterable of lines, see parse_command() and run_command().
+    :return: The results, with the line number of every command.
+    """
+
+    results = []
+    with vault.session():
+        for number, line in enumerate(lines, 1):
+            try:
+                arguments = parse_command(line)
+            except ValueError as e:
+                results.append({"line": number, "ok": False, "error": str(e)})
+                continue
+
+            if arguments:
+                result = run_command(vault, arguments[0], arguments[1:])
+                result["line"] = number
+                results.append(result)
+
+    return results
@@ -0,0 +1,75 @@
+import lzma
+import zlib
+
+# The available codecs by the name stored in the vault header, with their default level.
+COMPRESSORS = {
+    "zlib": 6,
+    "lzma": 6
+}
+
+
+class Compression:
+    def __init__(self, name: str = "zlib", level: int = None):
+        """
+        Compression of the vault payloads before they are encrypted.
+        The level is 0 (fastest) to 9 (smallest) for both codecs. It is stored in the vault header with the codec,
+        so later writes use the same level.
+        """
+
+        if name not in COMPRESSORS:
+            raise ValueError("Unknown compression: {}".format(name))
+
+        level = COMPRESSORS[name] if level is None else level
+        if not 0 <= level <= 9:
+            raise ValueError("The compression level has to be between 0 and 9.")
+
+        self.name = name
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        A function which compresses a payload.
+
+        :param data: The payload.
+        :return: The compressed payload.
+        """
+
+        if self.name == "zlib":
+            return zlib.compress(data, self.level)
+
+        return lzma.compress(data, preset=self.level)
+
+    def decompress(self, data) -> bytes:
+        """
+        A function which decompresses a payload made by compress().
+
+        :param data: The compressed payload.
+        :return: The payload.
+        """
+
+        if self.name == "zlib":
+            return zlib.decompress(data)
+
+        return lzma.decompress(data)
+
+    def pack(self) -> bytes:
+        """
+        A function which serialises the codec and level for the vault header.
+
+        :return: The codec and level as bytes.
+        """
+
+        return "{}:{}".format(self.name, self.level).encode("ascii")
+
+    @classmethod
+    def unpack(cls, data: bytes):
+        """
+        A function which parses a codec and level made by pack().
+
+        :param data: The codec and level as bytes.
+        :return: The compression.
+        """
+
+        name, level = data.decode("ascii").split(":")
+
+        return cls(name, int(level))
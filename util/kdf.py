@@ -0,0 +1,96 @@
+import math
+import time
+
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import PBKDF2, scrypt
+from Crypto.Random import get_random_bytes
+
+# The size of the derived vault key.
+KEY_SIZE = 32
+
+
+class KdfParams:
+    def __init__(self, name: str = "scrypt", cost: int = 1 << 15, salt: bytes = None, block_size: int = 8, parallelism: int = 1):
+        """
+        The parameters to derive the vault key from the master password.
+        They are stored in the vault header, so every vault can have its own salt and cost.
+
+        For scrypt the cost is N, with block_size r and parallelism p. For PBKDF2 it is the iteration count.
+        """
+
+        if name not in ("scrypt", "pbkdf2"):
+            raise ValueError("Unknown key derivation function: {}".format(name))
+
+        self.name = name
+        self.cost = cost
+        self.salt = salt if salt is not None else get_random_bytes(16)
+        self.block_size = block_size
+        self.parallelism = parallelism
+
+    def pack(self) -> bytes:
+        """
+        A function which serialises the parameters for the vault header.
+
+        :return: The parameters as bytes.
+        """
+
+        return "${}${}${}${}${}".format(self.name, self.cost, self.block_size, self.parallelism, self.salt.hex()).encode("ascii")
+
+    @classmethod
+    def unpack(cls, data: bytes):
+        """
+        A function which parses parameters made by pack().
+
+        :param data: The parameters as bytes.
+        :return: The parameters.
+        """
+
+        _, name, cost, block_size, parallelism, salt = data.decode("ascii").split("$")
+
+        return cls(name, int(cost), bytes.fromhex(salt), int(block_size), int(parallelism))
+
+    def derive(self, password: bytes) -> bytes:
+        """
+        A function which derives the vault key. This is slow on purpose.
+
+        :param password: The master password.
+        :return: The 32 byte vault key.
+        """
+
+        if self.name == "scrypt":
+            return scrypt(password, self.salt, KEY_SIZE, N=self.cost, r=self.block_size, p=self.parallelism)
+
+        return PBKDF2(password, self.salt, KEY_SIZE, count=self.cost, hmac_hash_module=SHA256)
+
+
+def calibrate_kdf(target_seconds: float = 0.25, name: str = "scrypt") -> KdfParams:
+    """
+    A function which picks the cost that makes deriving the key take about target_seconds on this machine.
+    A higher cost makes guessing the master password slower, but also makes unlocking the vault slower.
+
+    :param target_seconds: The time unlocking the vault may take.
+    :param name: The key derivation function, "scrypt" or "pbkdf2".
+    :return: The calibrated parameters, with a new salt.
+    """
+
+    params = KdfParams(name, 1 << 10 if name == "scrypt" else 10000)
+
+    while True:
+        start = time.perf_counter()
+        params.derive(b"calibration")
+        elapsed = time.perf_counter() - start
+
+        # The time grows linearly with the cost, so the final cost can be estimated once measuring is reliable.
+        if elapsed >= target_seconds / 4 or params.cost >= 1 << 30:
+            break
+
+        params.cost *= 2
+
+    cost = max(1, round(params.cost * target_seconds / elapsed))
+    if name == "scrypt":
+        # scrypt needs a power of two, pick the closest one.
+        cost = max(1 << 10, 1 << round(math.log2(cost)))
+
+    params.cost = cost
+
+    return params
@@ -0,0 +1,34 @@
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    # Advisory locking is only available on POSIX systems.
+    fcntl = None
+
+
+@contextlib.contextmanager
+def vault_lock(vault_file: str, exclusive: bool = False):
+    """
+    A context manager which holds an advisory lock on a vault.
+    Many processes can hold the shared lock to read at the same time, the exclusive lock is for writing.
+
+    The lock is taken on "<vault_file>.lock", as some vault formats replace the vault file when writing it.
+    On systems without fcntl this does not lock anything.
+
+    :param vault_file: The path to the vault file.
+    :param exclusive: Whether to take the exclusive writer lock instead of the shared reader lock.
+    :return:
+    """
+
+    if fcntl is None:
+        yield
+        return
+
+    with open(vault_file + ".lock", 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -1,24 +1,143 @@
+import atexit
+import contextlib
+import functools
 import os
-import pickle
 import random
 import string
+import threading
 
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad
 from Crypto.Random import get_random_bytes
 
+from .ciphers import AES_MODE_CIPHERS, CIPHERS, legacy_cipher
+from .compression import Compression
+from .kdf import KdfParams
+from .locking import vault_lock
+from .search import ServiceIndex
+from .stats import DISABLED, VaultStats, timed
+from .storage import open_storage, reopen_storage, STORAGE_FORMATS
+from .sync import LocalPeer, VersionTable, is_deleted, sync_peers
+
 # Garble memory so this isn't in a static place.
 a = [0] * int(random.gauss(10, 5))
 ANTI_MEMORY_KEY = get_random_bytes(32)
 del a
 
+# The characters used for each complexity parameter.
+DATASET_OPTIONS = {
+    "letter": {
+        "0": "",
+        "1": string.ascii_lowercase,
+        "2": string.ascii_uppercase,
+        "3": string.ascii_letters
+    },
+
+    "digit": {
+        "0": "",
+        "1": string.digits
+    },
+
+    "symbol": {
+        "0": "",
+        "1": "!@#$%^&*()-_=+[{}];:|,./<>?"
+    }
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _charset_table(complexity_info: str):
+    """
+    A function which builds the translation table for a complexity, once per complexity string.
+
+    Random bytes below the largest multiple of the charset size are mapped to charset[byte % size].
+    The other bytes are rejected, so every character is equally likely.
+
+    :param complexity_info: The complexity of the password, see generate_passwords().
+    :return: The translation table, the rejected bytes and the fraction of bytes that is accepted.
+    """
+
+    # Assemble the dataset.
+    letter_complexity, digit_complexity, symbol_complexity = list(complexity_info)
+    dataset = DATASET_OPTIONS["letter"][letter_complexity] + DATASET_OPTIONS["digit"][digit_complexity] + DATASET_OPTIONS["symbol"][symbol_complexity]
+
+    if not dataset:
+        raise ValueError("The complexity leaves no characters to choose from.")
+
+    limit = 256 - 256 % len(dataset)
+    table = bytes(ord(dataset[byte % len(dataset)]) if byte < limit else 0 for byte in range(256))
+
+    return table, bytes(range(limit, 256)), limit / 256
+
+
+def generate_passwords(count: int, length: int, complexity_info: str) -> list:
+    """
+    A function which generates a batch of passwords with the operating system's CSPRNG.
+    Random bytes are read in large blocks and mapped to characters without a Python loop per character.
+
+    :param count: The amount of passwords.
+    :param length: The length of the passwords.
+    :param complexity_info: The complexity of the password as a string: "<letter parameter><digit parameter><symbol parameter>". I.e. "311" for the strongest password.
+
+    Letter parameter:
+      0 - No letters.
+      1 - All lowercase.
+      2 - All uppercase.
+      3 - Mixed lowercase and uppercase.
+
+    Digit parameter:
+      0 - No digits.
+      1 - Digits.
+
+    Symbol parameter:
+      0 - No symbols
+      1 - Symbols.
+    :return: The list of passwords.
+    """
+
+    table, rejected, accepted = _charset_table(complexity_info)
+
+    # Keep drawing random bytes until there are enough accepted characters.
+    needed = count * length
+    characters = b""
+    while len(characters) < needed:
+        missing = needed - len(characters)
+        characters += os.urandom(int(missing / accepted) + 64).translate(table, rejected)
+
+    text = characters[:needed].decode("ascii")
+
+    return [text[index:index + length] for index in range(0, needed, length)] if length else [""] * count
+
 
 class Vault:
-    def __init__(self, vault_key: bytes, vault_file: str = "vault.edb", aes_type: int = AES.MODE_EAX):
+    def __init__(self, vault_key: bytes, vault_file: str = "vault.edb", aes_type: int = AES.MODE_EAX, file_format: str = "blob",
+                 storage_options: dict = None, cache_plaintext: bool = False, cipher: str = None, kdf: KdfParams = None,
+                 compression: str = None, compression_level: int = None, collect_stats: bool = False, stats_hook=None,
+                 write_behind: bool = False, flush_interval: float = 1.0, flush_threshold: int = 1000):
         """
         A class which generates and stores passwords.
+
+        file_format and cipher are used when a new vault file is created, existing files keep the ones in their header.
+        See util.storage.STORAGE_FORMATS for the available formats, storage_options are passed on to the format.
+        See util.ciphers.CIPHERS for the available ciphers. The cipher defaults to the one for aes_type.
+        The vault key is derived from vault_key with kdf, see util.kdf. It defaults to scrypt with a new salt.
+        The vault is compressed before encrypting it if compression is "zlib" or "lzma", at compression_level 0 to 9.
+
+        With cache_plaintext, the decrypted passwords are kept after locking the vault, and reused when unlocking it
+        if no other process has written the vault in the meantime.
+
+        With collect_stats, the time spent per operation and phase is recorded, see stats().
+        The stats_hook is called as stats_hook(phase, seconds) after every timed phase, which also enables the stats.
+
+        With write_behind, the vault stays unlocked after the first operation and changes only update memory.
+        A background thread writes them every flush_interval seconds, or as soon as flush_threshold changes are
+        pending. flush() writes them right away, and close() (or the end of the program) writes the rest and locks
+        the vault.
         """
 
+        # Without stats, the shared no-op stats keep the overhead down to an attribute lookup.
+        self.metrics = VaultStats(stats_hook) if collect_stats or stats_hook is not None else DISABLED
+
         # Store the main passwords dictionary
         self.passwords = {}
 
@@ -26,11 +145,58 @@ class Vault:
         self.vault_unlocked = False
         self.vault_file = vault_file
 
+        # Keep track of open sessions and unsaved changes.
+        # Changes map a service to its new password, or None if it was deleted.
+        self.session_depth = 0
+        self.changes = {}
+
+        # The generation of the vault file the passwords were read from.
+        self.generation = 0
+
+        # The background writer of write-behind mode.
+        # The state lock guards the passwords and changes, the write lock makes sure one write runs at a time.
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.state_lock = threading.RLock()
+        self.write_lock = threading.RLock()
+        self.flusher = None
+        self.flusher_stopping = False
+        self.flush_wanted = threading.Event()
+        self.flush_error = None
+
+        # The (generation, passwords) that were last locked, when caching is enabled.
+        self.cache_plaintext = cache_plaintext
+        self.plaintext_cache = None
+
+        # The encrypted index of the service names, kept next to the vault file.
+        self.index_file = vault_file + ".names"
+        self.service_index = None
+
+        # The versions of the entries for syncing copies of the vault, see util.sync.
+        # Synced versions are the ones of changes that came from another copy, which they keep when written.
+        self.versions_file = vault_file + ".versions"
+        self.version_table = None
+        self.synced_versions = {}
+        self.replica = os.urandom(8).hex()
+
         # Set the password requirements.
         self.aes_type = aes_type
+        self.cipher = CIPHERS[cipher or AES_MODE_CIPHERS[aes_type]]
+
+        # Set up the vault file format.
+        self.kdf = kdf or KdfParams()
+        self.compression = Compression(compression, compression_level) if compression else None
+        self.storage_options = storage_options or {}
+        self.storage = open_storage(vault_file, self.cipher, file_format, legacy_cipher(aes_type), self.kdf, self.compression,
+                                    **self.storage_options)
+        self.storage.stats = self.metrics
 
         # Store the vault key for ease-of-use.
-        self.vault_key = self.__encrypt_password(pad(vault_key, 32))
+        self.vault_key = self.__encrypt_password(vault_key)
+
+        # The packed kdf parameters and the key derived with them, so the slow derivation only runs once.
+        self.derived_key = None
 
     @staticmethod
     def __encrypt_password(key: bytes):
@@ -45,7 +211,7 @@ class Vault:
         cipher = AES.new(ANTI_MEMORY_KEY, AES.MODE_EAX)
         obfuscated_password, tag = cipher.encrypt_and_digest(key)
 
-        return b";".join([obfuscated_password, tag, cipher.nonce])
+        return obfuscated_password, tag, cipher.nonce
 
     @staticmethod
     def __decrypt_password(key: bytes):
@@ -57,11 +223,34 @@ class Vault:
         """
 
         # Decrypt the password.
-        obfuscated_password, tag, nonce = key.split(b";")
+        obfuscated_password, tag, nonce = key
         cipher = AES.new(ANTI_MEMORY_KEY, AES.MODE_EAX, nonce)
 
         return cipher.decrypt_and_verify(obfuscated_password, tag)
 
+    def __storage_key(self) -> bytes:
+        """
+        A function that returns the key the vault file is encrypted with.
+        The key is derived once for the kdf of the vault file, and kept obfuscated like the password.
+
+        :return: The 32 byte vault key.
+        """
+
+        kdf = self.storage.kdf
+
+        # Vaults from before the kdf was stored use the padded password.
+        if kdf is None:
+            return pad(self.__decrypt_password(self.vault_key), 32)
+
+        params = kdf.pack()
+        if self.derived_key is None or self.derived_key[0] != params:
+            with self.metrics.phase("kdf"):
+                derived_key = kdf.derive(self.__decrypt_password(self.vault_key))
+
+            self.derived_key = params, self.__encrypt_password(derived_key)
+
+        return self.__decrypt_password(self.derived_key[1])
+
     @staticmethod
     def _generate_password(length: int, complexity_info: str) -> str:
         """
@@ -86,37 +275,10 @@ class Vault:
         :return:
         """
 
-        # Prepare the dataset with options.
-        dataset_options = {
-            "letter": {
-                "0": "",
-                "1": string.ascii_lowercase,
-                "2": string.ascii_uppercase,
-                "3": string.ascii_letters
-            },
-
-            "digit": {
-                "0": "",
-                "1": string.digits
-            },
-
-            "symbol": {
-                "0": "",
-                "1": "!@#$%^&*()-_=+[{}];:|,./<>?"
-            }
-        }
-
-        # Retrieve the dataset_options.
-        letter_complexity, digit_complexity, symbol_complexity = list(complexity_info)
-
-        # Assemble the dataset.
-        dataset = dataset_options["letter"][letter_complexity] + dataset_options["digit"][digit_complexity] + dataset_options["symbol"][symbol_complexity]
-
         # Generate a password.
-        password = "".join([random.choice(dataset) for _ in range(length)])
-
-        return password
+        return generate_passwords(1, length, complexity_info)[0]
 
+    @timed("generate")
     def generate_password(self, service_name: str, length: int, complexity_info: str) -> str:
         """
         A function which generates a password, then stores it in the vault.
@@ -150,6 +312,7 @@ class Vault:
         # Return the password.
         return password
 
+    @timed("unlock")
     def unlock_vault(self):
         """
         A function which unlocks the vault.
@@ -161,21 +324,31 @@ class Vault:
         if self.vault_unlocked:
             return
 
-        # If the file doesn't exist, the vault is automatically unlocked.
-        if not os.path.isfile(self.vault_file):
+        with vault_lock(self.vault_file):
+            # If the file doesn't exist, the vault is automatically unlocked.
+            if not self.storage.exists():
+                self.passwords = {}
+                self.generation = 0
+                self.vault_unlocked = True
+                return
+
+            # Skip decrypting if nobody has written the vault since it was locked.
+            if self.plaintext_cache is not None and self.plaintext_cache[0] == self.storage.read_generation():
+                self.generation, self.passwords = self.plaintext_cache
+                self.vault_unlocked = True
+                return
+
+            # Open the vault.
+            self._check_storage()
+            self.passwords = self.storage.load(self.__storage_key())
+            self.generation = self.storage.generation
             self.vault_unlocked = True
-            return
 
-        # Open the vault.
-        with open(self.vault_file, 'rb') as vault_file:
-            nonce, tag, vault_encrypted = [vault_file.read(x) for x in (16, 16, -1)]
-            cipher = AES.new(self.__decrypt_password(self.vault_key), self.aes_type, nonce)
-
-            vault_decrypted = cipher.decrypt_and_verify(vault_encrypted, tag)
-            self.passwords = pickle.loads(vault_decrypted)
-
-            self.vault_unlocked = True
+        # Forget the service index if it is from another version of the vault.
+        if self.service_index is not None and self.service_index.generation != self.generation:
+            self.service_index = None
 
+    @timed("lock")
     def lock_vault(self):
         """
         A function which locks the vault.
@@ -183,82 +356,673 @@ class Vault:
         :return:
         """
 
+        # The flusher writes what it has before it stops.
+        self._stop_flusher()
+
         # Don't lock if it's already locked.
         if not self.vault_unlocked:
             return
 
-        # Lock the vault and write the data.
-        with open(self.vault_file, 'wb') as vault_file:
-            cipher = AES.new(self.__decrypt_password(self.vault_key), self.aes_type)
-
-            data, tag = cipher.encrypt_and_digest(pickle.dumps(self.passwords))
-            for x in [cipher.nonce, tag, data]:
-                vault_file.write(x)
+        # Write any unsaved changes.
+        self.flush()
 
         self.vault_unlocked = False
 
-        # For security, remove all references to the key and data.
+        # Keep the data for the next unlock if requested.
+        if self.cache_plaintext:
+            self.plaintext_cache = (self.generation, self.passwords)
+
+        # For security, remove all references to the data.
         self.passwords = None
-        cipher, data, tag = [None] * 3
 
-        del cipher
-        del data
-        del tag
+    @timed("flush")
+    def flush(self):
+        """
+        A function which writes the vault to disk if it has unsaved changes.
+        The vault stays unlocked.
+
+        If another process wrote the vault since it was unlocked, the changes are merged into that version.
+        Services changed here win over the same services changed by the other process.
+
+        In write-behind mode, a copy of the passwords is written, so new changes can be made during the write.
+
+        :return:
+        """
+
+        with self.write_lock:
+            with self.state_lock:
+                # Nothing to write.
+                if not self.vault_unlocked or not self.changes:
+                    return
+
+                # Take the changes, new ones are collected for the next write.
+                changes, self.changes = self.changes, {}
+                synced, self.synced_versions = self.synced_versions, {}
+                passwords = dict(self.passwords) if self.write_behind else self.passwords
+                index = self.service_index.copy() if self.write_behind and self.service_index is not None else None
+
+            try:
+                self._write_changes(passwords, changes, synced, index)
+                self.flush_error = None
+            except BaseException:
+                # Keep the changes for the next write. Changes made in the meantime are newer.
+                with self.state_lock:
+                    synced = {service_name: version for service_name, version in synced.items() if service_name not in self.changes}
+                    self.changes = {**changes, **self.changes}
+                    self.synced_versions = {**synced, **self.synced_versions}
+                raise
+
+    def _write_changes(self, passwords: dict, changes: dict, synced: dict, index: ServiceIndex = None):
+        """
+        A function which writes the vault, with its service index and versions, see flush().
+
+        :param passwords: The passwords to write.
+        :param changes: The changes since the last write.
+        :param synced: The versions of changes that came from another copy of the vault.
+        :param index: A copy of the service index in write-behind mode, None to use the one of this Vault.
+        :return:
+        """
+
+        with vault_lock(self.vault_file, exclusive=True):
+            self._check_storage()
+
+            # Merge with the version on disk if it changed.
+            disk_generation = self.storage.read_generation()
+            if self.storage.exists() and disk_generation != self.generation:
+                passwords = self.storage.load(self.__storage_key())
+                for service_name, password in changes.items():
+                    if password is None:
+                        passwords.pop(service_name, None)
+                    else:
+                        passwords[service_name] = password
+
+                with self.state_lock:
+                    # Changes made during the write stay on top of the merged version.
+                    merged = dict(passwords) if self.write_behind else passwords
+                    for service_name, password in self.changes.items():
+                        if password is None:
+                            merged.pop(service_name, None)
+                        else:
+                            merged[service_name] = password
+
+                    self.passwords = merged
+                    self.service_index = None
+
+                index = ServiceIndex(passwords) if self.write_behind else None
+
+            # Write the data.
+            versions = self._version_table(disk_generation, passwords)
+            self.storage.save(self.__storage_key(), passwords, changes)
+            self._save_service_index(index, changes, disk_generation)
+            self._save_versions(versions, changes, synced)
+            self.generation = self.storage.generation
+
+    @timed("migrate")
+    def migrate(self, file_format: str, cipher: str = None, kdf: KdfParams = None, compression: str = None,
+                compression_level: int = None, **options):
+        """
+        A function which rewrites the vault in another file format, with the cipher of this Vault.
+        This also upgrades vaults in the original headerless format, and reshards sharded vaults.
+
+        :param file_format: The new file format, see util.storage.STORAGE_FORMATS.
+        :param cipher: A new cipher for this Vault, see util.ciphers.CIPHERS.
+        :param kdf: New key derivation parameters, i.e. from util.kdf.calibrate_kdf(). Vaults keep their kdf otherwise.
+        :param compression: A new compression, "zlib", "lzma" or "none". Vaults keep their compression otherwise.
+        :param compression_level: The level of the new compression.
+        :param options: Extra arguments for the format, i.e. shard_count for sharded vaults.
+        :return:
+        """
+
+        if file_format not in STORAGE_FORMATS:
+            raise ValueError("Unknown vault format: {}".format(file_format))
+
+        if cipher is not None:
+            self.cipher = CIPHERS[cipher]
+
+        if compression is not None:
+            self.compression = Compression(compression, compression_level) if compression != "none" else None
+
+        with self.session(), self.write_lock:
+            # Write any unsaved changes and merge in changes from other processes first.
+            self.flush()
+
+            with vault_lock(self.vault_file, exclusive=True):
+                versions = self._version_table(self.generation, self.passwords)
+                old_storage = self.storage
+                kdf = kdf or old_storage.kdf or self.kdf
+                compression = self.compression if compression is not None else old_storage.compression
+                self.storage = STORAGE_FORMATS[file_format](self.vault_file, self.cipher, kdf, compression, **options)
+                self.storage.stats = self.metrics
+                self.storage_options = options
+                self.storage.save(self.__storage_key(), self.passwords)
+                self.generation = self.storage.generation
+                self._save_service_index()
+                self._save_versions(versions, {}, {})
+
+                # Remove files the old format needed, i.e. shards that are no longer used.
+                for path in set(old_storage.extra_files()) - set(self.storage.extra_files()):
+                    os.remove(path)
+
+    def reshard(self, shard_count: int):
+        """
+        A function which spreads the vault over a new amount of shard files.
+
+        :param shard_count: The new amount of shards.
+        :return:
+        """
+
+        self.migrate("sharded", shard_count=shard_count)
+
+    @contextlib.contextmanager
+    def session(self):
+        """
+        A context manager which keeps the vault unlocked for a batch of operations.
+        Changes are kept in memory and written once when the session ends, or on flush().
+
+        Sessions can be nested, only the outermost session locks the vault.
+
+        :return:
+        """
+
+        self.unlock_vault()
+        self.session_depth += 1
+
+        try:
+            yield self
+        finally:
+            self.session_depth -= 1
+
+            # Only the outermost session locks the vault.
+            if not self.session_depth:
+                self.lock_vault()
+
+    def stats(self) -> dict:
+        """
+        A function which returns a snapshot of the stats, see util.stats.VaultStats.snapshot().
+        The snapshot is empty unless the stats are enabled.
+
+        :return: The timers of every operation and phase, and the counters.
+        """
+
+        return self.metrics.snapshot()
+
+    def enable_stats(self, hook=None):
+        """
+        A function which starts collecting stats, from zero.
+
+        :param hook: Called as hook(phase, seconds) after every timed phase.
+        :return:
+        """
+
+        self.metrics = VaultStats(hook)
+        self.storage.stats = self.metrics
+
+    def _release_vault(self):
+        """
+        A function which locks the vault after an operation, unless a session keeps it open.
+
+        :return:
+        """
+
+        if self.write_behind:
+            self._schedule_flush()
+        elif not self.session_depth:
+            self.lock_vault()
+
+    def _schedule_flush(self):
+        """
+        A function which starts the flusher thread of write-behind mode, and wakes it when enough changes are pending.
+
+        :return:
+        """
+
+        if self.flusher is None:
+            self.flusher = threading.Thread(target=self._flush_behind, name="vault-flusher", daemon=True)
+            self.flusher.start()
+
+            # Write the last changes when the program ends without close().
+            atexit.register(self.close)
+
+        if len(self.changes) >= self.flush_threshold:
+            self.flush_wanted.set()
+
+    def _flush_behind(self):
+        """
+        The loop of the flusher thread, which writes the changes every flush_interval seconds or when woken.
+
+        :return:
+        """
+
+        while True:
+            self.flush_wanted.wait(self.flush_interval)
+            self.flush_wanted.clear()
+            stopping = self.flusher_stopping
+
+            try:
+                self.flush()
+            except Exception as e:
+                # The changes stay pending, so the next flush tries again. The next store_password() raises the error,
+                # and flush() or close() raise it as well if writing still fails.
+                self.flush_error = e
+
+            if stopping:
+                return
+
+    def _stop_flusher(self):
+        """
+        A function which stops the flusher thread, after it wrote the pending changes.
+
+        :return:
+        """
+
+        if self.flusher is None:
+            return
+
+        self.flusher_stopping = True
+        self.flush_wanted.set()
+        self.flusher.join()
+
+        self.flusher = None
+        self.flusher_stopping = False
+        atexit.unregister(self.close)
+
+    def _raise_flush_error(self):
+        """
+        A function which raises the error of the last failed background write, once.
+
+        :return:
+        """
+
+        error, self.flush_error = self.flush_error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        """
+        A function which writes any pending changes and locks the vault.
+        Write-behind vaults should be closed when done, otherwise this runs when the program ends.
+        If the changes can't be written, the error is raised and they stay pending.
+
+        :return:
+        """
 
+        self.lock_vault()
+
+    @timed("store")
     def store_password(self, service_name: str, password: str):
         """
         An intermediary function to store password in the dictionary.
-        The vault is locked after storing.
+        The vault is locked after storing, unless a session is open.
 
         :param service_name: The name of the password.
         :param password: The password to add.
         :return:
         """
 
+        # Report a failed background write before taking more changes.
+        self._raise_flush_error()
+
         # First unlock the vault.
         self.unlock_vault()
         assert self.vault_unlocked, "Failed to unlock vault."
 
         # Store the password and lock the vault.
-        self.passwords[service_name.lower()] = password
-        self.lock_vault()
-
+        with self.state_lock:
+            self.passwords[service_name.lower()] = password
+            self.changes[service_name.lower()] = password
+            if self.service_index is not None:
+                self.service_index.add(service_name)
+        self._release_vault()
+
+    @timed("get")
     def get_password(self, service_name: str):
         """
         An intermediary function to retrieve passwords from the vault.
+        Outside a session only the requested entry is read, if the vault format supports it.
 
         :param service_name: The name of the password.
         :return:
         """
 
-        # First unlock the vault.
-        self.unlock_vault()
-        assert self.vault_unlocked, "Failed to unlock vault."
-        assert service_name.lower() in self.passwords, "Password not found in vault."
+        # Without an open session, let the storage read just this entry.
+        if not self.vault_unlocked:
+            password = None
+            with vault_lock(self.vault_file):
+                if self.storage.exists():
+                    self._check_storage()
+                    password = self.storage.get(self.__storage_key(), service_name.lower())
 
-        # Retrieve the password and lock the vault.
-        password = self.passwords[service_name.lower()]
-        self.lock_vault()
+            assert password is not None, "Password not found in vault."
+            return password
 
-        return password
+        assert service_name.lower() in self.passwords, "Password not found in vault."
 
+        return self.passwords[service_name.lower()]
+
+    @timed("list")
     def get_services(self):
         """
         A function to return the keys of the password dictionary for retrieval.
+        Outside a session the names are read from the service index, without decrypting the passwords.
 
         :return:
         """
 
-        # First unlock the vault.
-        self.unlock_vault()
-        assert self.vault_unlocked, "Failed to unlock vault."
+        if not self.vault_unlocked:
+            return list(self._service_index().names)
 
-        # Get the services and lock the vault.
-        keys = self.passwords.keys()
-        self.lock_vault()
+        return list(self.passwords.keys())
+
+    @timed("search")
+    def search_services(self, query: str, mode: str = "exact", max_distance: int = 2) -> list:
+        """
+        A function to search the stored services, ignoring case.
+        Outside a session this only reads the service index, never the passwords.
+
+        :param query: The service name, or the start of it for a prefix search.
+        :param mode: "exact", "prefix" or "fuzzy", see util.search.SEARCH_MODES.
+        :param max_distance: The largest amount of typos a fuzzy search allows.
+        :return: The matching service names.
+        """
+
+        return self._service_index().search(query, mode, max_distance)
+
+    def _service_index(self) -> ServiceIndex:
+        """
+        A function which returns the index of the service names for the current version of the vault.
+        Outside a session it is read from the index file, which is rebuilt if it is missing or out of date.
+
+        :return: The service index.
+        """
+
+        # Inside a session the index is built from the unlocked vault, and kept up to date by every change.
+        if self.vault_unlocked:
+            if self.service_index is None:
+                self.service_index = ServiceIndex(self.passwords, self.generation)
+
+            return self.service_index
+
+        with vault_lock(self.vault_file):
+            if not self.storage.exists():
+                return ServiceIndex()
+
+            self._check_storage()
+            generation = self.storage.read_generation()
+            if self.service_index is not None and self.service_index.generation == generation:
+                return self.service_index
+
+            # Headerless vaults have no generation to tell if the index file is out of date.
+            key = self.__storage_key()
+            with self.metrics.phase("index_read"):
+                index = ServiceIndex.load(self.index_file, self.storage.cipher, key, generation) if generation else None
+
+            if index is None:
+                index = ServiceIndex(self.storage.services(key), generation)
+                if generation:
+                    with self.metrics.phase("index_write"):
+                        index.save(self.index_file, self.storage.cipher, key)
+
+            self.service_index = index
+
+        return index
+
+    def _check_storage(self):
+        """
+        A function which opens the storage again if another process migrated the vault file since it was last read,
+        so it is read and written with the format, cipher, kdf and compression in its header.
+        It has to be called while the vault is locked on disk.
+
+        :return:
+        """
+
+        self.storage = reopen_storage(self.storage, legacy_cipher(self.aes_type), **self.storage_options)
+
+    def _save_service_index(self, index: ServiceIndex = None, changes: dict = None, previous_generation: int = 0):
+        """
+        A function which writes the service index for the generation that was just written.
+        If the index file holds the index of previous_generation, only the changes are appended to it.
+        It has to be called while holding the exclusive lock.
+
+        :param index: The index to write, i.e. a copy in write-behind mode. The index of this Vault if None.
+        :param changes: The changes of the write, None to write the whole index.
+        :param previous_generation: The generation of the vault file before the write.
+        :return:
+        """
+
+        key = self.__storage_key()
+        with self.metrics.phase("index_write"):
+            if changes is not None and ServiceIndex.append_changes(self.index_file, self.storage.cipher, key, changes,
+                                                                   previous_generation, self.storage.generation):
+                index = index or self.service_index
+                if index is not None:
+                    index.generation = self.storage.generation
+
+                return
+
+            if index is None:
+                if self.service_index is None:
+                    self.service_index = ServiceIndex(self.passwords)
+
+                index = self.service_index
+
+            index.generation = self.storage.generation
+            index.save(self.index_file, self.storage.cipher, key)
+
+    def _version_table(self, generation: int, passwords: dict) -> VersionTable:
+        """
+        A function which returns the versions of the entries for a generation of the vault file.
+        The table is read from the versions file, or repaired if the vault was written without it.
+        It has to be called while the vault is unlocked and locked on disk.
+
+        :param generation: The generation of the vault file.
+        :param passwords: The passwords of the vault, to repair the table with.
+        :return: The version table.
+        """
+
+        # The table of this Vault was reconciled when it was read.
+        if self.version_table is not None and self.version_table.generation == generation:
+            return self.version_table
+
+        with self.metrics.phase("versions_read"):
+            table = VersionTable.load(self.versions_file, self.storage.cipher, self.__storage_key(), generation)
+
+        if table is None or table.has_bare_versions():
+            table = table or VersionTable(generation=generation)
+            table.reconcile(passwords, self.replica)
+
+        self.version_table = table
+
+        return table
+
+    def _stored_version_table(self):
+        """
+        A function which reads the version table of the vault file, without decrypting the vault.
+        It has to be called while the vault is locked on disk.
+
+        :return: The table, or None if it is missing, out of date, or has to be reconciled with the passwords.
+        """
 
-        return keys
+        self._check_storage()
+        generation = self.storage.read_generation()
+        if self.version_table is not None and self.version_table.generation == generation:
+            table = self.version_table
+        else:
+            with self.metrics.phase("versions_read"):
+                table = VersionTable.load(self.versions_file, self.storage.cipher, self.__storage_key(), generation)
 
+        if table is None or table.has_bare_versions():
+            return None
+
+        self.version_table = table
+
+        return table
+
+    def _save_versions(self, table: VersionTable, changes: dict, synced: dict):
+        """
+        A function which records the versions of the written changes, and writes the table for the new generation.
+        It has to be called while holding the exclusive lock.
+
+        :param table: The version table of the generation before the write.
+        :param changes: The written changes.
+        :param synced: The versions of written changes that came from another copy of the vault.
+        :return:
+        """
+
+        previous_generation = table.generation
+        table.apply(changes, synced, self.replica)
+        table.generation = self.storage.generation
+
+        # Only the versions of the changes are appended to the file.
+        with self.metrics.phase("versions_write"):
+            table.save(self.versions_file, self.storage.cipher, self.__storage_key(), changes, previous_generation)
+
+    def entry_versions(self) -> dict:
+        """
+        A function which returns the version of every entry, including deleted ones, see util.sync.
+        Changes that are not flushed yet have no version yet.
+
+        :return: The versions by service name.
+        """
+
+        # A locked vault is read from its versions file.
+        if not self.vault_unlocked:
+            with self.write_lock, vault_lock(self.vault_file):
+                table = self._stored_version_table() if self.storage.exists() else VersionTable()
+
+            if table is not None:
+                return table.versions
+
+        # Otherwise the table is built from the unlocked vault. A repaired table is written, so the next sync
+        # doesn't have to unlock the vault.
+        with self.session(), self.write_lock, vault_lock(self.vault_file, exclusive=True):
+            table = self._version_table(self.generation, self.passwords)
+            if table.repaired and table.generation and table.generation == self.storage.read_generation():
+                with self.metrics.phase("versions_write"):
+                    table.save(self.versions_file, self.storage.cipher, self.__storage_key())
+
+            return table.versions
+
+    def read_synced_entries(self, service_names: list) -> dict:
+        """
+        A function which reads entries to send to another copy of the vault.
+        A locked vault only decrypts these entries, as far as its format allows, see Storage.get_many().
+
+        :param service_names: The names of the services.
+        :return: (version, password) by service name, the password is None for deleted entries.
+        """
+
+        versions = self.entry_versions()
+
+        if self.vault_unlocked:
+            with self.state_lock:
+                passwords = {service_name: self.passwords.get(service_name) for service_name in service_names}
+        else:
+            live = [service_name for service_name in service_names if not is_deleted(versions[service_name])]
+            with vault_lock(self.vault_file):
+                self._check_storage()
+                passwords = self.storage.get_many(self.__storage_key(), live)
+
+        return {service_name: (versions[service_name], passwords.get(service_name)) for service_name in service_names}
+
+    def apply_synced_entries(self, entries: dict):
+        """
+        A function which stores entries from another copy of the vault. They keep their version when written.
+
+        :param entries: (version, password) by service name, the password is None for deleted entries.
+        :return:
+        """
+
+        # A locked vault only encrypts the new entries, as far as its format allows.
+        if not self.vault_unlocked and self._write_synced_entries(entries):
+            return
+
+        with self.session(), self.state_lock:
+            for service_name, (version, password) in entries.items():
+                if password is None:
+                    self.passwords.pop(service_name, None)
+                    if self.service_index is not None:
+                        self.service_index.remove(service_name)
+                else:
+                    self.passwords[service_name] = password
+                    if self.service_index is not None:
+                        self.service_index.add(service_name)
+
+                self.changes[service_name] = password
+                self.synced_versions[service_name] = version
+
+    def _write_synced_entries(self, entries: dict) -> bool:
+        """
+        A function which writes entries from another copy of the vault without unlocking it, see Storage.save_changes().
+
+        :param entries: (version, password) by service name, the password is None for deleted entries.
+        :return: Whether they were written. Vaults without an up to date version table have to be unlocked instead.
+        """
+
+        changes = {service_name: password for service_name, (_, password) in entries.items()}
+        synced = {service_name: version for service_name, (version, _) in entries.items()}
+
+        with self.write_lock, vault_lock(self.vault_file, exclusive=True):
+            table = self._stored_version_table() if self.storage.exists() else None
+            if table is None:
+                return False
+
+            key = self.__storage_key()
+            self.storage.save_changes(key, changes)
+
+            # Keep the service index up to date, if there is one. The changes are appended to it if possible.
+            with self.metrics.phase("index_write"):
+                appended = ServiceIndex.append_changes(self.index_file, self.storage.cipher, key, changes, table.generation,
+                                                       self.storage.generation)
+
+            if not appended:
+                with self.metrics.phase("index_read"):
+                    index = ServiceIndex.load(self.index_file, self.storage.cipher, key, table.generation)
+
+                if index is not None:
+                    for service_name, password in changes.items():
+                        if password is None:
+                            index.remove(service_name)
+                        else:
+                            index.add(service_name)
+
+                    self._save_service_index(index)
+
+                self.service_index = index
+
+            self._save_versions(table, changes, synced)
+            self.generation = self.storage.generation
+
+        return True
+
+    @timed("merge")
+    def merge(self, other_path: str, other_key: bytes = None) -> dict:
+        """
+        A function which syncs this vault with another copy of it, i.e. from another machine.
+        Afterwards both copies hold the newest version of every entry, including deletes.
+        The differing entries are found by comparing the versions files of both copies through a hash tree, see
+        util.sync.sync_peers. Only those entries are decrypted and written again.
+
+        :param other_path: The other vault file, or the directory that holds it under the same file name.
+                           It is created if it does not exist.
+        :param other_key: The password of the other vault, if it differs from the password of this one.
+        :return: The depth of the hash tree, the amount of compared hashes, and the pulled and pushed entries.
+        """
+
+        if os.path.isdir(other_path):
+            other_path = os.path.join(other_path, os.path.basename(self.vault_file))
+
+        if os.path.abspath(other_path) == os.path.abspath(self.vault_file):
+            raise ValueError("A vault can't be merged with itself.")
+
+        other = Vault(other_key or self.__decrypt_password(self.vault_key), other_path, self.aes_type, self.storage.file_format,
+                      cipher=self.cipher.name, kdf=self.storage.kdf or self.kdf)
+
+        # Only written changes have versions.
+        self.flush()
+
+        return sync_peers(LocalPeer(self), LocalPeer(other))
+
+    @timed("delete")
     def delete_service(self, service_name: str):
         """
         A function to delete a password from the vault.
@@ -272,8 +1036,69 @@ class Vault:
         assert self.vault_unlocked, "Failed to unlock vault."
 
         # Delete the service.
-        if service_name in self.passwords.keys():
-            del self.passwords[service_name]
+        service_name = service_name.lower()
+        with self.state_lock:
+            if service_name in self.passwords.keys():
+                del self.passwords[service_name]
+                self.changes[service_name] = None
+                if self.service_index is not None:
+                    self.service_index.remove(service_name)
 
         # Lock the vault.
-        self.lock_vault()
+        self._release_vault()
+
+    @timed("import")
+    def import_entries(self, entries) -> int:
+        """
+        A function which stores many passwords with a single write of the vault.
+        If reading the entries fails midway, i.e. on a broken export file, none of them are stored.
+
+        :param entries: An iterable of (service, password) tuples, i.e. from util.transfer.read_entries().
+        :return: The amount of entries stored.
+        """
+
+        count = 0
+
+        # The write lock keeps the flusher of write-behind mode from writing half an import.
+        with self.session(), self.write_lock:
+            # What the import replaced, as (password, changed, change) by service name, to put back on an error.
+            replaced = {}
+
+            try:
+                for count, (service_name, password) in enumerate(entries, 1):
+                    service_name = service_name.lower()
+                    if service_name not in replaced:
+                        replaced[service_name] = (self.passwords.get(service_name), service_name in self.changes,
+                                                  self.changes.get(service_name))
+
+                    self.store_password(service_name, password)
+            except BaseException:
+                with self.state_lock:
+                    for service_name, (password, changed, change) in replaced.items():
+                        if password is None:
+                            self.passwords.pop(service_name, None)
+                        else:
+                            self.passwords[service_name] = password
+
+                        if changed:
+                            self.changes[service_name] = change
+                        else:
+                            self.changes.pop(service_name, None)
+
+                    # The index may hold names of the import, it is read again when needed.
+                    self.service_index = None
+                raise
+
+        return count
+
+    def export_entries(self):
+        """
+        A generator which yields every (service, password) in the vault.
+        The entries are read straight from the unlocked vault, without copying them into a list first.
+
+        :return:
+        """
+
+        with self.session():
+            for service_name, password in self.passwords.items():
+                yield service_name, password
@@ -0,0 +1,236 @@
+import bisect
+
+from .ciphers import Cipher
+from .codec import encode_list, decode_list, encode_map, decode_map
+from .storage import DeltaLog
+
+# The ways services can be searched.
+SEARCH_MODES = ("exact", "prefix", "fuzzy")
+
+
+class ServiceIndex:
+    def __init__(self, services=(), generation: int = 0):
+        """
+        A sorted array of the lowercased service names of a vault.
+        Searching it never needs the passwords, and it is kept next to the vault file, encrypted, to list and
+        search the services without decrypting the vault.
+
+        The generation is the one of the vault file the names belong to.
+        """
+
+        self.names = sorted({service_name.lower() for service_name in services})
+        self.generation = generation
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def copy(self):
+        """
+        A function which copies the index, i.e. to write it while the vault keeps changing.
+
+        :return: The copy.
+        """
+
+        index = ServiceIndex(generation=self.generation)
+        index.names = list(self.names)
+
+        return index
+
+    def add(self, service_name: str):
+        """
+        A function which adds a service to the index.
+
+        :param service_name: The name of the service.
+        :return:
+        """
+
+        service_name = service_name.lower()
+        position = bisect.bisect_left(self.names, service_name)
+        if position == len(self.names) or self.names[position] != service_name:
+            self.names.insert(position, service_name)
+
+    def remove(self, service_name: str):
+        """
+        A function which removes a service from the index.
+
+        :param service_name: The name of the service.
+        :return:
+        """
+
+        service_name = service_name.lower()
+        position = bisect.bisect_left(self.names, service_name)
+        if position < len(self.names) and self.names[position] == service_name:
+            del self.names[position]
+
+    def exact(self, service_name: str) -> list:
+        """
+        A function which finds a service, ignoring case.
+
+        :param service_name: The name of the service.
+        :return: A list with the stored name, or an empty list.
+        """
+
+        service_name = service_name.lower()
+        position = bisect.bisect_left(self.names, service_name)
+        if position < len(self.names) and self.names[position] == service_name:
+            return [service_name]
+
+        return []
+
+    def prefix(self, prefix: str) -> list:
+        """
+        A function which finds the services starting with a prefix, ignoring case.
+
+        :param prefix: The start of the service names.
+        :return: The matching names, sorted.
+        """
+
+        prefix = prefix.lower()
+        start = end = bisect.bisect_left(self.names, prefix)
+        while end < len(self.names) and self.names[end].startswith(prefix):
+            end += 1
+
+        return self.names[start:end]
+
+    def fuzzy(self, query: str, max_distance: int = 2) -> list:
+        """
+        A function which finds the services within max_distance edits (insertions, deletions, substitutions) of the query.
+
+        The names are walked in sorted order like a trie. Neighbouring names share a prefix, so the rows of the
+        edit distance table for that prefix are reused, and a prefix that is already too far skips every name
+        starting with it.
+
+        :param query: The service name to look for.
+        :param max_distance: The largest edit distance to match.
+        :return: The matching names, closest first.
+        """
+
+        query = query.lower()
+        names = self.names
+
+        # rows[i] holds the distances between the first i characters of the current name and every prefix of the query.
+        rows = [list(range(len(query) + 1))]
+        previous = ""
+        matches = []
+
+        position = 0
+        while position < len(names):
+            name = names[position]
+
+            # Keep the rows of the prefix shared with the previous name.
+            shared = 0
+            limit = min(len(previous), len(name), len(rows) - 1)
+            while shared < limit and previous[shared] == name[shared]:
+                shared += 1
+            del rows[shared + 1:]
+            previous = name
+
+            too_far = False
+            for character in name[shared:]:
+                last = rows[-1]
+                row = [last[0] + 1]
+                for column, query_character in enumerate(query, 1):
+                    row.append(min(row[column - 1] + 1, last[column] + 1, last[column - 1] + (query_character != character)))
+                rows.append(row)
+
+                if min(row) > max_distance:
+                    too_far = True
+                    break
+
+            if too_far:
+                # No name with this prefix can match.
+                dead_prefix = name[:len(rows) - 1]
+                position += 1
+                while position < len(names) and names[position].startswith(dead_prefix):
+                    position += 1
+                continue
+
+            if rows[-1][-1] <= max_distance:
+                matches.append((rows[-1][-1], name))
+            position += 1
+
+        return [name for _, name in sorted(matches)]
+
+    def search(self, query: str, mode: str = "exact", max_distance: int = 2) -> list:
+        """
+        A function which searches the index.
+
+        :param query: The service name, or the start of it for a prefix search.
+        :param mode: One of SEARCH_MODES.
+        :param max_distance: The largest edit distance of a fuzzy search.
+        :return: The matching names.
+        """
+
+        if mode == "exact":
+            return self.exact(query)
+        elif mode == "prefix":
+            return self.prefix(query)
+        elif mode == "fuzzy":
+            return self.fuzzy(query, max_distance)
+
+        raise ValueError("Unknown search mode: {}".format(mode))
+
+    def save(self, path: str, cipher: Cipher, key: bytes):
+        """
+        A function which encrypts and writes the whole index.
+        The file is replaced at once, so readers never see half of it.
+
+        :param path: The path to the index file.
+        :param cipher: The cipher backend of the vault.
+        :param key: The vault key.
+        :return:
+        """
+
+        DeltaLog(path, "names", cipher).write(key, self.generation, encode_list(self.names))
+
+    @staticmethod
+    def append_changes(path: str, cipher: Cipher, key: bytes, changes: dict, previous_generation: int, generation: int) -> bool:
+        """
+        A function which appends the changed services to the index file, without reading or writing the rest of it.
+        See util.storage.DeltaLog.
+
+        :param path: The path to the index file.
+        :param cipher: The cipher backend of the vault.
+        :param key: The vault key.
+        :param changes: The changed services, mapped to the new password or None when deleted.
+        :param previous_generation: The generation of the vault file the index file has to hold.
+        :param generation: The generation of the vault file after the changes.
+        :return: Whether they were appended. If not, the whole index has to be saved.
+        """
+
+        # Added names are stored with an empty string, removed ones with None.
+        names = {service_name.lower(): None if password is None else "" for service_name, password in changes.items()}
+
+        return DeltaLog(path, "names", cipher).append(key, previous_generation, generation, encode_map(names))
+
+    @classmethod
+    def load(cls, path: str, cipher: Cipher, key: bytes, generation: int):
+        """
+        A function which reads the index of a vault.
+
+        :param path: The path to the index file.
+        :param cipher: The cipher backend of the vault.
+        :param key: The vault key.
+        :param generation: The generation of the vault file.
+        :return: The index, or None if it is missing or belongs to another generation of the vault.
+        """
+
+        payloads = DeltaLog(path, "names", cipher).read(key, generation)
+        if payloads is None:
+            return None
+
+        index = cls(generation=generation)
+        index.names = decode_list(payloads[0])
+
+        if len(payloads) > 1:
+            names = set(index.names)
+            for changes in payloads[1:]:
+                for service_name, present in decode_map(changes).items():
+                    if present is None:
+                        names.discard(service_name)
+                    else:
+                        names.add(service_name)
+
+            index.names = sorted(names)
+
+        return index
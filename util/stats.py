@@ -0,0 +1,184 @@
+import collections
+import functools
+import time
+
+
+class _Timer:
+    def __init__(self, stats, name: str):
+        """
+        A context manager which adds the time spent in its block to a phase of VaultStats.
+        """
+
+        self.stats = stats
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.add_time(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    """
+    A context manager that does nothing, for when the stats are disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class VaultStats:
+    enabled = True
+
+    def __init__(self, hook=None):
+        """
+        Timers and counters for the hot paths of a vault.
+
+        Phases are timed blocks, like "read", "decrypt", "decode", "kdf", or a whole operation like "unlock".
+        Operations include the phases they run, so the phases of an operation add up to roughly its time.
+        Counters count amounts, like "bytes_read" and "bytes_written".
+
+        The hook is called as hook(phase, seconds) whenever a phase ends.
+        """
+
+        self.hook = hook
+        self.seconds = collections.Counter()
+        self.calls = collections.Counter()
+        self.counters = collections.Counter()
+
+    def phase(self, name: str) -> _Timer:
+        """
+        A function which times a block.
+
+        :param name: The name of the phase.
+        :return: A context manager around the block.
+        """
+
+        return _Timer(self, name)
+
+    def add_time(self, name: str, seconds: float):
+        """
+        A function which records a finished phase.
+
+        :param name: The name of the phase.
+        :param seconds: The time it took.
+        :return:
+        """
+
+        self.seconds[name] += seconds
+        self.calls[name] += 1
+
+        if self.hook is not None:
+            self.hook(name, seconds)
+
+    def count(self, name: str, amount: int = 1):
+        """
+        A function which adds to a counter.
+
+        :param name: The name of the counter.
+        :param amount: The amount to add.
+        :return:
+        """
+
+        self.counters[name] += amount
+
+    def snapshot(self) -> dict:
+        """
+        A function which copies the current stats.
+
+        :return: {"phases": {phase: {"count": calls, "seconds": total}}, "counters": {counter: amount}}
+        """
+
+        return {
+            "phases": {name: {"count": self.calls[name], "seconds": self.seconds[name]} for name in sorted(self.calls)},
+            "counters": dict(sorted(self.counters.items()))
+        }
+
+    def reset(self):
+        """
+        A function which sets every timer and counter back to zero.
+
+        :return:
+        """
+
+        self.seconds.clear()
+        self.calls.clear()
+        self.counters.clear()
+
+
+class NullStats:
+    """
+    The stats of a vault without instrumentation. Every call does as little as possible.
+    """
+
+    enabled = False
+    hook = None
+
+    _timer = _NullTimer()
+
+    def phase(self, name: str) -> _NullTimer:
+        return self._timer
+
+    def add_time(self, name: str, seconds: float):
+        pass
+
+    def count(self, name: str, amount: int = 1):
+        pass
+
+    def snapshot(self) -> dict:
+        return {"phases": {}, "counters": {}}
+
+    def reset(self):
+        pass
+
+
+# Shared by every vault and storage that does not collect stats.
+DISABLED = NullStats()
+
+
+def timed(name: str):
+    """
+    A decorator which times a method of an object with a "metrics" attribute as the phase name.
+
+    :param name: The name of the phase.
+    :return: The decorator.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            # Skip the timer completely when the stats are disabled.
+            if not self.metrics.enabled:
+                return function(self, *args, **kwargs)
+
+            with self.metrics.phase(name):
+                return function(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def format_stats(snapshot: dict) -> str:
+    """
+    A function which formats a stats snapshot as a table.
+
+    :param snapshot: The snapshot from VaultStats.snapshot().
+    :return: The table.
+    """
+
+    lines = ["{:>14} {:>10} {:>14} {:>14}".format("phase", "count", "total (ms)", "mean (ms)")]
+    for name, phase in snapshot["phases"].items():
+        lines.append("{:>14} {:>10} {:>14.3f} {:>14.4f}".format(name, phase["count"], phase["seconds"] * 1000,
+                                                              phase["seconds"] * 1000 / phase["count"]))
+
+    for name, amount in snapshot["counters"].items():
+        lines.append("{:>14} {:>10}".format(name, amount))
+
+    return "\n".join(lines)
@@ -0,0 +1,1513 @@
+import contextlib
+import hashlib
+import hmac
+import mmap
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from Crypto.Random import get_random_bytes
+
+from .ciphers import Cipher, get_cipher
+from .compression import Compression
+from .codec import encode_map, decode_map, encode_index, decode_index
+from .kdf import KdfParams
+from .stats import DISABLED
+
+# Every vault file written by this module starts with this magic.
+# Files without it are vaults in the original headerless format.
+MAGIC = b"EDVAULT\x00"
+
+# Header field tags.
+FIELD_FORMAT = 1
+FIELD_GENERATION = 2
+FIELD_CIPHER = 3
+FIELD_KDF = 4
+FIELD_COMPRESSION = 5
+FIELD_AUTHENTICATED = 6
+FIELD_BUCKETS = 7
+
+# Length prefix of a record in a log vault, and of the index in an indexed vault.
+RECORD_LENGTH = struct.Struct(">I")
+
+# Length and generation prefix of a record in a DeltaLog.
+DELTA_RECORD = struct.Struct(">IQ")
+
+# The average amount of entries per bucket of an indexed vault.
+ENTRIES_PER_BUCKET = 64
+
+# The offset and length of the current bucket directory of an indexed vault, right after the header.
+DIRECTORY_ROOT = struct.Struct(">QI")
+
+# The start of a bucket directory: the amount of entries and the size of the live buckets.
+# It is followed by the offset and length of every bucket, (0, 0) for an empty one, and a MAC.
+DIRECTORY_START = struct.Struct(">QQ")
+DIRECTORY_ENTRY = struct.Struct(">QI")
+DIRECTORY_MAC_SIZE = 16
+
+
+class VaultHeader:
+    def __init__(self, file_format: str = "blob", generation: int = 0, cipher: str = None, kdf: KdfParams = None,
+                 compression: Compression = None, authenticated: bool = False, bucket_count: int = None):
+        """
+        The plain text header at the start of a vault file.
+        It is stored as tag-length-value fields so new fields can be added later on.
+
+        The generation goes up with every write, so readers can tell if the vault changed without decrypting it.
+        The header of a file always has the same size, so it can be rewritten in place.
+        The cipher is the name of the backend in util.ciphers, None for vaults from before it was stored.
+        The kdf holds the salt and cost to derive the vault key with, None for vaults that use the padded password.
+        The compression is the codec the payloads are compressed with before encrypting them, None if they are not.
+        With authenticated, the payloads are sealed with the header as associated data, see associated_data().
+        Files from before that leave it out, and their payloads are sealed without associated data.
+        The bucket count is the amount of hash buckets of an indexed vault, None for other formats and for indexed
+        vaults from before the buckets.
+        """
+
+        self.file_format = file_format
+        self.generation = generation
+        self.cipher = cipher
+        self.kdf = kdf
+        self.compression = compression
+        self.authenticated = authenticated
+        self.bucket_count = bucket_count
+
+    def pack(self) -> bytes:
+        """
+        A function which serialises the header, including the magic.
+
+        :return: The header as bytes.
+        """
+
+        fields = {
+            FIELD_FORMAT: self.file_format.encode("ascii"),
+            FIELD_GENERATION: struct.pack(">Q", self.generation)
+        }
+
+        if self.cipher is not None:
+            fields[FIELD_CIPHER] = self.cipher.encode("ascii")
+
+        if self.kdf is not None:
+            fields[FIELD_KDF] = self.kdf.pack()
+
+        if self.compression is not None:
+            fields[FIELD_COMPRESSION] = self.compression.pack()
+
+        if self.authenticated:
+            fields[FIELD_AUTHENTICATED] = b""
+
+        if self.bucket_count is not None:
+            fields[FIELD_BUCKETS] = struct.pack(">I", self.bucket_count)
+
+        body = b"".join(struct.pack(">BH", tag, len(value)) + value for tag, value in fields.items())
+
+        return MAGIC + struct.pack(">H", len(body)) + body
+
+    @classmethod
+    def unpack(cls, data: bytes):
+        """
+        A function which parses a header from the start of a vault file.
+
+        :param data: The bytes at the start of the file.
+        :return: The header and its size in bytes, or (None, 0) for a headerless vault.
+        """
+
+        if data[:len(MAGIC)] != MAGIC:
+            return None, 0
+
+        offset = len(MAGIC)
+        body_length, = struct.unpack_from(">H", data, offset)
+        offset += 2
+
+        header = cls()
+        end = offset + body_length
+        while offset < end:
+            tag, length = struct.unpack_from(">BH", data, offset)
+            offset += 3
+            value = bytes(data[offset:offset + length])
+            offset += length
+
+            # Unknown fields are skipped, so older versions can still read newer headers.
+            if tag == FIELD_FORMAT:
+                header.file_format = value.decode("ascii")
+            elif tag == FIELD_GENERATION:
+                header.generation, = struct.unpack(">Q", value)
+            elif tag == FIELD_CIPHER:
+                header.cipher = value.decode("ascii")
+            elif tag == FIELD_KDF:
+                header.kdf = KdfParams.unpack(value)
+            elif tag == FIELD_COMPRESSION:
+                header.compression = Compression.unpack(value)
+            elif tag == FIELD_AUTHENTICATED:
+                header.authenticated = True
+            elif tag == FIELD_BUCKETS:
+                header.bucket_count, = struct.unpack(">I", value)
+
+        return header, end
+
+    def associated_data(self) -> bytes:
+        """
+        A function which returns the associated data the payloads of the vault file are sealed with.
+        This is the packed header with generation 0. The generation is rewritten in place after appends and in place
+        updates, which would otherwise invalidate the payloads that were already there.
+
+        :return: The associated data.
+        """
+
+        return VaultHeader(self.file_format, 0, self.cipher, self.kdf, self.compression, self.authenticated,
+                           self.bucket_count).pack()
+
+
+def read_header(path: str):
+    """
+    A function which reads the header of a vault file.
+
+    :param path: The path to the vault file.
+    :return: The header and its size in bytes, or (None, 0) for a headerless vault.
+    """
+
+    with open(path, 'rb') as vault_file:
+        start = vault_file.read(len(MAGIC) + 2)
+        if start[:len(MAGIC)] != MAGIC:
+            return None, 0
+
+        body_length, = struct.unpack_from(">H", start, len(MAGIC))
+        return VaultHeader.unpack(start + vault_file.read(body_length))
+
+
+class DeltaLog:
+    def __init__(self, path: str, name: str, cipher: Cipher):
+        """
+        An encrypted file next to the vault file, i.e. the versions of the entries or the service index.
+        It holds a full table followed by the changes of later writes, so a write only encrypts its own changes.
+        The file is written again as a single table once the changes take more space than the table.
+
+        Every record is laid out as length | generation | sealed payload, where the generation is the one of the vault
+        file after the record. It is sealed along with the header, so a record can't be moved to another generation.
+        The header holds the generation of the last record, anything after it is left by an interrupted append.
+
+        The header format is "<name>-log". Files with the format name are from before the changes were appended,
+        and hold a single table sealed with the whole header.
+        """
+
+        self.path = path
+        self.name = name
+        self.file_format = "{}-log".format(name)
+        self.cipher = cipher
+
+    def _pack_record(self, key: bytes, header: VaultHeader, generation: int, payload: bytes) -> bytes:
+        """
+        A function which encrypts a single record.
+
+        :param key: The vault key.
+        :param header: The header of the file.
+        :param generation: The generation of the vault file after the record.
+        :param payload: The encoded table or changes.
+        :return: The prefixed record.
+        """
+
+        record = self.cipher.seal(key, payload, header.associated_data() + struct.pack(">Q", generation))
+
+        return DELTA_RECORD.pack(len(record), generation) + record
+
+    def read(self, key: bytes, generation: int):
+        """
+        A function which decrypts the records of the file.
+
+        :param key: The vault key.
+        :param generation: The generation of the vault file.
+        :return: The table followed by the changes, or None if the file is missing or belongs to another generation.
+        """
+
+        if not generation or not os.path.isfile(self.path):
+            return None
+
+        with open(self.path, 'rb') as delta_file:
+            data = delta_file.read()
+
+        header, offset = VaultHeader.unpack(data)
+        if header is None or header.generation != generation:
+            return None
+
+        if header.file_format == self.name:
+            return [self.cipher.unseal(key, data[offset:], data[:offset] if header.authenticated else None)]
+
+        if header.file_format != self.file_format:
+            return None
+
+        associated_data = header.associated_data()
+        payloads = []
+        while offset + DELTA_RECORD.size <= len(data):
+            length, record_generation = DELTA_RECORD.unpack_from(data, offset)
+            start = offset + DELTA_RECORD.size
+            if start + length > len(data):
+                break
+
+            payloads.append(self.cipher.unseal(key, data[start:start + length], associated_data + struct.pack(">Q", record_generation)))
+            offset = start + length
+
+            if record_generation == generation:
+                return payloads
+
+        return None
+
+    def write(self, key: bytes, generation: int, table: bytes):
+        """
+        A function which replaces the file with a single table.
+
+        :param key: The vault key.
+        :param generation: The generation of the vault file.
+        :param table: The encoded table.
+        :return:
+        """
+
+        header = VaultHeader(self.file_format, generation, self.cipher.name, authenticated=True)
+
+        temp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(temp_path, 'wb') as delta_file:
+            delta_file.write(header.pack() + self._pack_record(key, header, generation, table))
+
+        os.replace(temp_path, self.path)
+
+    def append(self, key: bytes, previous_generation: int, generation: int, changes: bytes) -> bool:
+        """
+        A function which appends the changes of a write to the file.
+
+        :param key: The vault key.
+        :param previous_generation: The generation of the vault file before the write.
+        :param generation: The generation of the vault file after the write.
+        :param changes: The encoded changes.
+        :return: Whether they were appended. If not, the file is missing, out of date or due to be compacted,
+                 and the whole table has to be written.
+        """
+
+        if not previous_generation or not os.path.isfile(self.path):
+            return False
+
+        # A file that holds another generation misses changes, or has an interrupted append at the end.
+        header, offset = read_header(self.path)
+        if header is None or header.file_format != self.file_format or header.generation != previous_generation \
+                or header.cipher != self.cipher.name:
+            return False
+
+        record = self._pack_record(key, header, generation, changes)
+        with open(self.path, 'r+b') as delta_file:
+            delta_file.seek(offset)
+            table_length, _ = DELTA_RECORD.unpack(delta_file.read(DELTA_RECORD.size))
+            end = delta_file.seek(0, os.SEEK_END)
+
+            # Compact once the changes take more space than the table.
+            if end + len(record) - offset > 2 * (DELTA_RECORD.size + table_length):
+                return False
+
+            delta_file.write(record)
+
+            header.generation = generation
+            delta_file.seek(0)
+            delta_file.write(header.pack())
+
+        return True
+
+
+class Storage:
+    file_format = None
+
+    def __init__(self, path: str, cipher: Cipher, kdf: KdfParams = None, compression: Compression = None):
+        """
+        The base class of the vault file formats.
+        The kdf is stored in the header, so the vault key can be derived before anything is decrypted.
+        """
+
+        self.path = path
+        self.cipher = cipher
+        self.kdf = kdf
+        self.compression = compression
+
+        # The generation of the vault file when it was last read or written.
+        self.generation = 0
+
+        # The associated data of the payloads in the vault file when it was last read or written.
+        # None for files from before the header was authenticated.
+        self.associated_data = None
+
+        # The Vault replaces this to collect util.stats.VaultStats.
+        self.stats = DISABLED
+
+    def exists(self) -> bool:
+        """
+        A function which checks if the vault file exists.
+
+        :return:
+        """
+
+        return os.path.isfile(self.path)
+
+    def read_generation(self) -> int:
+        """
+        A function which reads the generation of the vault file from its header, without decrypting anything.
+
+        :return: The generation, 0 for a missing or headerless vault.
+        """
+
+        if not self.exists():
+            return 0
+
+        header, _ = read_header(self.path)
+
+        return header.generation if header is not None else 0
+
+    def _new_header(self) -> VaultHeader:
+        """
+        A function which makes the header for a write, with the next generation.
+        This has to be called before the vault file is truncated, and before the payloads are sealed with it.
+
+        :return: The header.
+        """
+
+        self.generation = self.read_generation() + 1
+
+        header = VaultHeader(self.file_format, self.generation, self.cipher.name, self.kdf, self.compression, True)
+        self.associated_data = header.associated_data()
+
+        return header
+
+    def _rewrite_header(self):
+        """
+        A function which writes the next generation into the header of the vault file, after an in place update.
+
+        :return:
+        """
+
+        header = self._new_header()
+        with open(self.path, 'r+b') as vault_file:
+            self._write(vault_file, header.pack())
+
+    def _parse_header(self, data) -> int:
+        """
+        A function which parses the header at the start of the vault file and records its generation.
+
+        :param data: The contents of the vault file.
+        :return: The size of the header.
+        """
+
+        header, offset = VaultHeader.unpack(data)
+        self.generation = header.generation if header is not None else 0
+        self.associated_data = header.associated_data() if header is not None and header.authenticated else None
+
+        return offset
+
+    def _read_file(self, path: str = None) -> bytes:
+        """
+        A function which reads a whole file of the vault.
+
+        :param path: The path to the file, the vault file if None.
+        :return: The contents of the file.
+        """
+
+        with self.stats.phase("read"), open(path or self.path, 'rb') as vault_file:
+            data = vault_file.read()
+
+        self.stats.count("bytes_read", len(data))
+
+        return data
+
+    def _read_mapped(self, data, start: int, end: int) -> bytes:
+        """
+        A function which reads a part of a memory mapped vault file.
+
+        :param data: The memory map.
+        :param start: The offset of the first byte.
+        :param end: The offset after the last byte.
+        :return: The bytes.
+        """
+
+        with self.stats.phase("read"):
+            part = data[start:end]
+
+        self.stats.count("bytes_read", len(part))
+
+        return part
+
+    @contextlib.contextmanager
+    def _replace_file(self, path: str = None):
+        """
+        A context manager which opens a temporary file, that replaces the file at path when the block succeeds.
+        Readers and crashes never see a half written file, they see the old file or the new one.
+
+        :param path: The path to the file, the vault file if None.
+        :return: The open temporary file.
+        """
+
+        path = path or self.path
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+
+        try:
+            with open(temp_path, 'wb') as temp_file:
+                yield temp_file
+
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _write(self, vault_file, data: bytes):
+        """
+        A function which writes to a file of the vault.
+
+        :param vault_file: The open file.
+        :param data: The bytes to write.
+        :return:
+        """
+
+        with self.stats.phase("write"):
+            vault_file.write(data)
+
+        self.stats.count("bytes_written", len(data))
+
+    def _encode(self, encoder, value) -> bytes:
+        """
+        A function which serialises a payload with one of the util.codec encoders.
+
+        :param encoder: The encoder, i.e. encode_map.
+        :param value: The value to encode.
+        :return: The encoded payload.
+        """
+
+        with self.stats.phase("encode"):
+            return encoder(value)
+
+    def _decode(self, decoder, data):
+        """
+        A function which deserialises a payload with one of the util.codec decoders.
+
+        :param decoder: The decoder, i.e. decode_map.
+        :param data: The encoded payload.
+        :return: The value.
+        """
+
+        with self.stats.phase("decode"):
+            return decoder(data)
+
+    def _seal(self, key: bytes, data: bytes, compress: bool = True, context: bytes = None) -> bytes:
+        """
+        A function which compresses and encrypts an encoded payload.
+
+        :param key: The vault key.
+        :param data: The encoded payload.
+        :param compress: Whether to use the compression of the vault, single entries are too short for it.
+        :param context: Extra associated data of an authenticated file, i.e. the place of the payload in the file.
+        :return: The sealed payload.
+        """
+
+        if compress and self.compression is not None:
+            with self.stats.phase("compress"):
+                data = self.compression.compress(data)
+
+        associated_data = self.associated_data if context is None else self.associated_data + context
+        with self.stats.phase("encrypt"):
+            return self.cipher.seal(key, data, associated_data)
+
+    def _unseal(self, key: bytes, data, compress: bool = True, context: bytes = None) -> bytes:
+        """
+        A function which decrypts and decompresses a payload made by _seal().
+
+        :param key: The vault key.
+        :param data: The sealed payload.
+        :param compress: Whether the payload was compressed.
+        :param context: The extra associated data it was sealed with.
+        :return: The encoded payload.
+        """
+
+        associated_data = self.associated_data if context is None else self.associated_data + context
+        with self.stats.phase("decrypt"):
+            data = self.cipher.unseal(key, data, associated_data)
+
+        if compress and self.compression is not None:
+            with self.stats.phase("decompress"):
+                data = self.compression.decompress(data)
+
+        return data
+
+    def load(self, key: bytes) -> dict:
+        """
+        A function which reads and decrypts the vault.
+
+        :param key: The vault key.
+        :return: The passwords dictionary.
+        """
+
+        raise NotImplementedError
+
+    def save(self, key: bytes, passwords: dict, changes: dict = None):
+        """
+        A function which encrypts and writes the vault.
+
+        :param key: The vault key.
+        :param passwords: The complete passwords dictionary.
+        :param changes: The services changed since the last save, mapped to the new password or None when deleted.
+                        None if everything should be rewritten.
+        :return:
+        """
+
+        raise NotImplementedError
+
+    def get(self, key: bytes, service_name: str):
+        """
+        A function which reads a single password from the vault.
+        Formats that can do this without decrypting the whole vault override it.
+
+        :param key: The vault key.
+        :param service_name: The name of the service.
+        :return: The password, or None if the service is not stored.
+        """
+
+        return self.load(key).get(service_name)
+
+    def services(self, key: bytes) -> list:
+        """
+        A function which reads the stored service names.
+
+        :param key: The vault key.
+        :return: The list of service names.
+        """
+
+        return list(self.load(key).keys())
+
+    def get_many(self, key: bytes, service_names: list) -> dict:
+        """
+        A function which reads some passwords from the vault.
+        Formats that can do this without decrypting the whole vault override it.
+
+        :param key: The vault key.
+        :param service_names: The names of the services.
+        :return: The passwords by service name, without the services that are not stored.
+        """
+
+        passwords = self.load(key)
+
+        return {service_name: passwords[service_name] for service_name in service_names if service_name in passwords}
+
+    def save_changes(self, key: bytes, changes: dict):
+        """
+        A function which writes changes to the vault, without the caller having all passwords.
+        Formats that can do this without decrypting the whole vault override it.
+
+        :param key: The vault key.
+        :param changes: The changed services, mapped to the new password or None when deleted.
+        :return:
+        """
+
+        passwords = self.load(key) if self.exists() else {}
+        for service_name, password in changes.items():
+            if password is None:
+                passwords.pop(service_name, None)
+            else:
+                passwords[service_name] = password
+
+        self.save(key, passwords, changes)
+
+    def extra_files(self) -> list:
+        """
+        A function which lists the files the format keeps next to the vault file.
+
+        :return: The list of paths.
+        """
+
+        return []
+
+
+class BlobStorage(Storage):
+    """
+    Stores the whole vault as one encrypted payload.
+    Every save re-encrypts and rewrites the entire file.
+    """
+
+    file_format = "blob"
+
+    def load(self, key: bytes) -> dict:
+        data = self._read_file()
+
+        # Headerless vaults are read the same way, they simply start at the nonce.
+        offset = self._parse_header(data)
+
+        return self._decode(decode_map, self._unseal(key, data[offset:]))
+
+    def save(self, key: bytes, passwords: dict, changes: dict = None):
+        header = self._new_header()
+        payload = self._seal(key, self._encode(encode_map, passwords))
+
+        with self._replace_file() as vault_file:
+            self._write(vault_file, header.pack() + payload)
+
+
+class LogStorage(Storage):
+    """
+    Stores the vault as an append-only log of independently encrypted records.
+    A save only appends the changed entries. The log is rewritten once the ratio of dead records
+    passes compaction_ratio.
+
+    Replaying the log costs a decryption per record, about 0.35 ms per entry, so lookups go through an OffsetIndex
+    at "<path>.offsets" instead, which points at the live record of every service. A lookup then decrypts one bucket
+    of the offset index and the record itself. Without an offset index of the current generation, i.e. after a crash
+    between the append and the index update, lookups replay the log until the next save writes it.
+    """
+
+    file_format = "log"
+
+    def __init__(self, path: str, cipher: Cipher, kdf: KdfParams = None, compression: Compression = None, compaction_ratio: float = 0.5):
+        # Records hold a single entry, which only gets larger when compressed.
+        super().__init__(path, cipher, kdf, None)
+
+        self.compaction_ratio = compaction_ratio
+
+        # Keep track of the log size to decide when to compact.
+        self.record_count = 0
+        self.live_count = 0
+
+        # The offset after the last complete record, where the next append goes. None until the log was read or written.
+        self.log_end = None
+
+        # The offset and length of the live record of every service, known along with log_end.
+        self.record_offsets = None
+
+    def offsets_path(self) -> str:
+        """
+        A function which returns the file of the offset index.
+
+        :return: The path to the offset index.
+        """
+
+        return "{}.offsets".format(self.path)
+
+    def extra_files(self) -> list:
+        return [self.offsets_path()] if os.path.isfile(self.offsets_path()) else []
+
+    def _offset_index(self) -> "OffsetIndex":
+        """
+        A function which returns the offset index, for the generation of the log when it was last read or written.
+
+        :return: The offset index.
+        """
+
+        offset_index = OffsetIndex(self.offsets_path(), self.cipher, self.kdf, self.generation)
+        offset_index.stats = self.stats
+
+        return offset_index
+
+    def load(self, key: bytes) -> dict:
+        """
+        A function which replays the log to rebuild the vault.
+
+        :param key: The vault key.
+        :return: The passwords dictionary.
+        """
+
+        data = self._read_file()
+        offset = self._parse_header(data)
+
+        passwords = {}
+        record_offsets = {}
+        record_count = 0
+        while offset + RECORD_LENGTH.size <= len(data):
+            length, = RECORD_LENGTH.unpack_from(data, offset)
+            start = offset + RECORD_LENGTH.size
+
+            # A torn record at the end comes from an interrupted append. Ignore it, the next append cuts it off.
+            if start + length > len(data):
+                break
+
+            record = self._decode(decode_map, self._unseal(key, data[start:start + length]))
+
+            # Records from before the codec are pickled (service_name, password) tuples.
+            service_name, password = record if isinstance(record, tuple) else next(iter(record.items()))
+            offset = start + length
+            record_count += 1
+
+            # A password of None marks a deleted service.
+            if password is None:
+                passwords.pop(service_name, None)
+                record_offsets.pop(service_name, None)
+            else:
+                passwords[service_name] = password
+                record_offsets[service_name] = (start, length)
+
+        self.record_count = record_count
+        self.live_count = len(passwords)
+        self.log_end = offset
+        self.record_offsets = record_offsets
+
+        return passwords
+
+    def get(self, key: bytes, service_name: str):
+        return self.get_many(key, [service_name]).get(service_name)
+
+    def get_many(self, key: bytes, service_names: list) -> dict:
+        offset_index = self._offset_index()
+        if not offset_index.exists():
+            return super().get_many(key, service_names)
+
+        offsets = offset_index.get_many(key, service_names)
+        with open(self.path, 'rb') as vault_file, mmap.mmap(vault_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            self._parse_header(data)
+
+            # Replay the log if the offset index is not of this generation.
+            if self.associated_data is None or self.generation != offset_index.generation:
+                return super().get_many(key, service_names)
+
+            passwords = {}
+            for service_name, value in offsets.items():
+                start, length = map(int, value.split(":"))
+                record = self._decode(decode_map, self._unseal(key, self._read_mapped(data, start, start + length)))
+                if service_name not in record:
+                    raise ValueError("The offset index does not match the log.")
+
+                passwords[service_name] = record[service_name]
+
+            return passwords
+
+    def _pack_record(self, key: bytes, service_name: str, password) -> bytes:
+        """
+        A function which encrypts a single log record.
+
+        :param key: The vault key.
+        :param service_name: The service of the record.
+        :param password: The password, or None for a deletion.
+        :return: The length prefixed record.
+        """
+
+        record = self._seal(key, self._encode(encode_map, {service_name: password}))
+
+        return RECORD_LENGTH.pack(len(record)) + record
+
+    def save(self, key: bytes, passwords: dict, changes: dict = None):
+        """
+        A function which appends the changes to the log, compacting it when needed.
+
+        :param key: The vault key.
+        :param passwords: The complete passwords dictionary.
+        :param changes: The services changed since the last save, mapped to the new password or None when deleted.
+                        None if everything should be rewritten.
+        :return:
+        """
+
+        # Check if appending would leave too many dead records behind.
+        # Without a known end of the log, there is no safe place to append, so it is rewritten.
+        # Logs from before the header was authenticated are rewritten as well, records can't mix both.
+        if changes is not None and self.exists() and self.log_end is not None and self.associated_data is not None:
+            record_count = self.record_count + len(changes)
+            if record_count and 1 - len(passwords) / record_count <= self.compaction_ratio:
+                previous_generation = self.generation
+                with open(self.path, 'r+b') as vault_file:
+                    # Cut off a torn record of an interrupted append, so the new records follow the last complete one.
+                    vault_file.truncate(self.log_end)
+                    vault_file.seek(self.log_end)
+                    for service_name, password in changes.items():
+                        self._write_record(vault_file, key, service_name, password)
+
+                    self.log_end = vault_file.tell()
+
+                self._rewrite_header()
+                self.record_count = record_count
+                self.live_count = len(passwords)
+                self._save_offsets(key, changes, previous_generation)
+                return
+
+        self.compact(key, passwords)
+
+    def _write_record(self, vault_file, key: bytes, service_name: str, password):
+        """
+        A function which writes a log record at the end of the open log, and records where it is.
+
+        :param vault_file: The open log, at its end.
+        :param key: The vault key.
+        :param service_name: The service of the record.
+        :param password: The password, or None for a deletion.
+        :return:
+        """
+
+        record = self._pack_record(key, service_name, password)
+        start = vault_file.tell() + RECORD_LENGTH.size
+        self._write(vault_file, record)
+
+        if password is None:
+            self.record_offsets.pop(service_name, None)
+        else:
+            self.record_offsets[service_name] = (start, len(record) - RECORD_LENGTH.size)
+
+    def _save_offsets(self, key: bytes, changes: dict = None, previous_generation: int = 0):
+        """
+        A function which writes the offset index for the generation that was just written.
+        If it holds the offsets of previous_generation, only the changed services are updated.
+
+        :param key: The vault key.
+        :param changes: The changes of the write, None to write the whole offset index.
+        :param previous_generation: The generation of the log before the write.
+        :return:
+        """
+
+        offset_index = self._offset_index()
+        if changes is not None and offset_index.exists() and offset_index.read_generation() == previous_generation:
+            offset_changes = {service_name: self._offset_value(service_name) for service_name in changes}
+            if offset_index._update(key, offset_changes):
+                return
+
+        offset_index.write_all(key, {service_name: self._offset_value(service_name) for service_name in self.record_offsets})
+
+    def _offset_value(self, service_name: str):
+        """
+        A function which formats the place of the live record of a service for the offset index.
+
+        :param service_name: The name of the service.
+        :return: "<offset>:<length>", or None if the service is deleted.
+        """
+
+        if service_name not in self.record_offsets:
+            return None
+
+        return "{}:{}".format(*self.record_offsets[service_name])
+
+    def compact(self, key: bytes, passwords: dict):
+        """
+        A function which rewrites the log with one record per live entry.
+
+        :param key: The vault key.
+        :param passwords: The complete passwords dictionary.
+        :return:
+        """
+
+        header = self._new_header()
+        self.record_offsets = {}
+        with self._replace_file() as vault_file:
+            self._write(vault_file, header.pack())
+            for service_name, password in passwords.items():
+                self._write_record(vault_file, key, service_name, password)
+
+            log_end = vault_file.tell()
+
+        self.record_count = len(passwords)
+        self.live_count = len(passwords)
+        self.log_end = log_end
+        self._save_offsets(key)
+
+
+class IndexedStorage(Storage):
+    """
+    Spreads the entries over buckets, chosen by a keyed hash of the service name, that are encrypted on their own.
+    A lookup checks the bucket directory and decrypts a single bucket of about ENTRIES_PER_BUCKET entries, read through
+    mmap.
+    A write appends the changed buckets and a new directory, and then points the root after the header at it.
+    The file is rewritten once more than half of it is dead, or the buckets hold too many entries.
+
+    The file is laid out as header | root | buckets and directories. The root holds the offset and length of the
+    current directory, which holds the amount of entries, the size of the live buckets and the offset and length of
+    every bucket. The directory says nothing the file sizes don't, so it is only authenticated with a MAC. The hash and MAC
+    keys are derived from the vault key.
+
+    Vaults from before the buckets hold an encrypted index of service -> (offset, length) followed by the entries.
+    They are read as they are, and the next save writes them with buckets.
+    """
+
+    file_format = "indexed"
+
+    def __init__(self, path: str, cipher: Cipher, kdf: KdfParams = None, compression: Compression = None):
+        super().__init__(path, cipher, kdf, compression)
+
+        # The layout of the file when it was last read or written, see _read_directory().
+        self.bucket_count = None
+        self.entry_count = 0
+        self.live_size = 0
+        self.data_start = 0
+        self.directory_length = 0
+
+    def bucket_of(self, key: bytes, service_name: str) -> int:
+        """
+        A function which picks the bucket of a service.
+
+        :param key: The vault key.
+        :param service_name: The name of the service.
+        :return: The bucket number.
+        """
+
+        hash_key = hashlib.blake2b(key, digest_size=32, person=b"indexed-buckets").digest()
+        digest = hashlib.blake2b(service_name.lower().encode("utf-8"), key=hash_key, digest_size=8).digest()
+
+        return int.from_bytes(digest, "big") % self.bucket_count
+
+    def _directory_mac(self, key: bytes, directory) -> bytes:
+        """
+        A function which authenticates a bucket directory, along with the header and the generation it is written for.
+
+        :param key: The vault key.
+        :param directory: The bucket directory, without its MAC.
+        :return: The MAC.
+        """
+
+        mac_key = hashlib.blake2b(key, digest_size=32, person=b"indexed-dir").digest()
+        mac = hashlib.blake2b(self.associated_data, key=mac_key, digest_size=DIRECTORY_MAC_SIZE)
+        mac.update(struct.pack(">Q", self.generation))
+        mac.update(directory)
+
+        return mac.digest()
+
+    def _new_header(self) -> VaultHeader:
+        header = super()._new_header()
+
+        # The bucket count is part of the associated data.
+        header.bucket_count = self.bucket_count
+        self.associated_data = header.associated_data()
+
+        return header
+
+    def _read_directory(self, key: bytes, data):
+        """
+        A function which decrypts the bucket directory of the vault.
+
+        :param key: The vault key.
+        :param data: The memory mapped vault file.
+        :return: The directory, or None for a vault from before the buckets.
+        """
+
+        offset = self._parse_header(data)
+        self.bucket_count = VaultHeader.unpack(data)[0].bucket_count if offset else None
+        if self.bucket_count is None:
+            return None
+
+        directory_offset, self.directory_length = DIRECTORY_ROOT.unpack_from(data, offset)
+        self.data_start = offset + DIRECTORY_ROOT.size
+
+        directory = self._read_mapped(data, directory_offset, directory_offset + self.directory_length)
+        size = DIRECTORY_START.size + self.bucket_count * DIRECTORY_ENTRY.size
+        if len(directory) != size + DIRECTORY_MAC_SIZE or \
+                not hmac.compare_digest(directory[size:], self._directory_mac(key, directory[:size])):
+            raise ValueError("The bucket directory of the vault is corrupted.")
+
+        self.entry_count, self.live_size = DIRECTORY_START.unpack_from(directory)
+
+        return directory[:size]
+
+    def _read_bucket(self, key: bytes, data, directory: bytes, bucket: int) -> dict:
+        """
+        A function which decrypts a single bucket.
+
+        :param key: The vault key.
+        :param data: The memory mapped vault file.
+        :param directory: The bucket directory.
+        :param bucket: The bucket number.
+        :return: The passwords in the bucket.
+        """
+
+        offset, length = DIRECTORY_ENTRY.unpack_from(directory, DIRECTORY_START.size + bucket * DIRECTORY_ENTRY.size)
+        if not length:
+            return {}
+
+        sealed = self._read_mapped(data, offset, offset + length)
+
+        return self._decode(decode_map, self._unseal(key, sealed, True, b"B" + struct.pack(">I", bucket)))
+
+    def _seal_bucket(self, key: bytes, bucket: int, passwords: dict) -> bytes:
+        """
+        A function which encrypts a single bucket. It is bound to its number, so buckets can't be swapped.
+
+        :param key: The vault key.
+        :param bucket: The bucket number.
+        :param passwords: The passwords in the bucket.
+        :return: The sealed bucket.
+        """
+
+        return self._seal(key, self._encode(encode_map, passwords), True, b"B" + struct.pack(">I", bucket))
+
+    def _read_index(self, key: bytes, data, service_names=None) -> dict:
+        """
+        A function which decrypts entries of a vault from before the buckets, through its index.
+
+        :param key: The vault key.
+        :param data: The memory mapped vault file.
+        :param service_names: The services to read, None for all of them.
+        :return: The passwords by service name, without the services that are not stored.
+        """
+
+        offset = self._parse_header(data)
+
+        length, = RECORD_LENGTH.unpack_from(data, offset)
+        offset += RECORD_LENGTH.size
+        index = self._decode(decode_index, self._unseal(key, self._read_mapped(data, offset, offset + length)))
+        start = offset + length
+
+        passwords = {}
+        for service_name in index if service_names is None else service_names:
+            if service_name in index:
+                offset, length = index[service_name]
+                entry = self._read_mapped(data, start + offset, start + offset + length)
+                passwords[service_name] = self._unseal(key, entry, False).decode("utf-8")
+
+        return passwords
+
+    def load(self, key: bytes) -> dict:
+        with open(self.path, 'rb') as vault_file, mmap.mmap(vault_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            directory = self._read_directory(key, data)
+            if directory is None:
+                return self._read_index(key, data)
+
+            passwords = {}
+            for bucket in range(self.bucket_count):
+                passwords.update(self._read_bucket(key, data, directory, bucket))
+
+            return passwords
+
+    def get(self, key: bytes, service_name: str):
+        return self.get_many(key, [service_name]).get(service_name)
+
+    def get_many(self, key: bytes, service_names: list) -> dict:
+        with open(self.path, 'rb') as vault_file, mmap.mmap(vault_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            directory = self._read_directory(key, data)
+            if directory is None:
+                return self._read_index(key, data, service_names)
+
+            # Only decrypt the buckets of the services.
+            buckets = {}
+            for service_name in service_names:
+                buckets.setdefault(self.bucket_of(key, service_name), []).append(service_name)
+
+            passwords = {}
+            for bucket, names in buckets.items():
+                bucket_passwords = self._read_bucket(key, data, directory, bucket)
+                passwords.update({service_name: bucket_passwords[service_name] for service_name in names
+                                  if service_name in bucket_passwords})
+
+            return passwords
+
+    def save_changes(self, key: bytes, changes: dict):
+        """
+        A function which writes changes to the vault. Only the buckets of the changed services are decrypted.
+
+        :param key: The vault key.
+        :param changes: The changed services, mapped to the new password or None when deleted.
+        :return:
+        """
+
+        if not self.exists() or not self._update(key, changes):
+            super().save_changes(key, changes)
+
+    def save(self, key: bytes, passwords: dict, changes: dict = None):
+        """
+        A function which writes the vault.
+        With changes, only the buckets of the changed services are encrypted and appended, if the file allows it.
+
+        :param key: The vault key.
+        :param passwords: The complete passwords dictionary.
+        :param changes: The services changed since the last save, mapped to the new password or None when deleted.
+                        None if everything should be rewritten.
+        :return:
+        """
+
+        if changes is not None and self.exists() and self._update(key, changes):
+            return
+
+        self.write_all(key, passwords)
+
+    def _update(self, key: bytes, changes: dict) -> bool:
+        """
+        A function which writes changes by appending the changed buckets and a new directory to the vault file.
+
+        :param key: The vault key.
+        :param changes: The changed services, mapped to the new password or None when deleted.
+        :return: Whether they were written. If not, the vault is from before the buckets, has too many entries for its
+                 buckets, or is due to be compacted, and has to be written with write_all().
+        """
+
+        with open(self.path, 'rb') as vault_file, mmap.mmap(vault_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            directory = self._read_directory(key, data)
+            if directory is None:
+                return False
+
+            end = len(data)
+            buckets = {}
+            for service_name in changes:
+                bucket = self.bucket_of(key, service_name)
+                if bucket not in buckets:
+                    buckets[bucket] = self._read_bucket(key, data, directory, bucket)
+
+        entry_count = self.entry_count
+        for service_name, password in changes.items():
+            passwords = buckets[self.bucket_of(key, service_name)]
+            entry_count -= service_name in passwords
+            if password is None:
+                passwords.pop(service_name, None)
+            else:
+                passwords[service_name] = password
+                entry_count += 1
+
+        # Grow the buckets once they hold twice the entries they were made for.
+        if entry_count > 2 * ENTRIES_PER_BUCKET * self.bucket_count:
+            return False
+
+        header = self._new_header()
+        directory = bytearray(directory)
+        live_size = self.live_size
+        blocks = []
+        offset = end
+        for bucket, passwords in buckets.items():
+            position = DIRECTORY_START.size + bucket * DIRECTORY_ENTRY.size
+            live_size -= DIRECTORY_ENTRY.unpack_from(directory, position)[1]
+
+            block = self._seal_bucket(key, bucket, passwords) if passwords else b""
+            DIRECTORY_ENTRY.pack_into(directory, position, offset if block else 0, len(block))
+            blocks.append(block)
+            offset += len(block)
+            live_size += len(block)
+
+        # Compact once more than half of the file is dead.
+        if offset + self.directory_length - self.data_start > 2 * (live_size + self.directory_length):
+            return False
+
+        DIRECTORY_START.pack_into(directory, 0, entry_count, live_size)
+        directory_data = bytes(directory) + self._directory_mac(key, directory)
+
+        with open(self.path, 'r+b') as vault_file:
+            vault_file.seek(end)
+            for block in blocks:
+                self._write(vault_file, block)
+            self._write(vault_file, directory_data)
+
+            # Point the root at the new directory last, an interrupted update leaves the old one in place.
+            vault_file.seek(0)
+            self._write(vault_file, header.pack() + DIRECTORY_ROOT.pack(offset, len(directory_data)))
+
+        self.entry_count = entry_count
+        self.live_size = live_size
+
+        return True
+
+    def write_all(self, key: bytes, passwords: dict):
+        """
+        A function which writes the whole vault, with as many buckets as the entries need.
+
+        :param key: The vault key.
+        :param passwords: The complete passwords dictionary.
+        :return:
+        """
+
+        # Between ENTRIES_PER_BUCKET / 2 and ENTRIES_PER_BUCKET entries per bucket on average.
+        self.bucket_count = 1 << (len(passwords) // ENTRIES_PER_BUCKET).bit_length()
+
+        buckets = [{} for _ in range(self.bucket_count)]
+        for service_name, password in passwords.items():
+            buckets[self.bucket_of(key, service_name)][service_name] = password
+
+        header = self._new_header().pack()
+        directory = bytearray(DIRECTORY_START.size + self.bucket_count * DIRECTORY_ENTRY.size)
+        blocks = []
+        offset = len(header) + DIRECTORY_ROOT.size
+        for bucket, bucket_passwords in enumerate(buckets):
+            if bucket_passwords:
+                block = self._seal_bucket(key, bucket, bucket_passwords)
+                DIRECTORY_ENTRY.pack_into(directory, DIRECTORY_START.size + bucket * DIRECTORY_ENTRY.size, offset, len(block))
+                blocks.append(block)
+                offset += len(block)
+
+        live_size = offset - len(header) - DIRECTORY_ROOT.size
+        DIRECTORY_START.pack_into(directory, 0, len(passwords), live_size)
+        directory_data = bytes(directory) + self._directory_mac(key, directory)
+
+        with self._replace_file() as vault_file:
+            self._write(vault_file, header + DIRECTORY_ROOT.pack(offset, len(directory_data)))
+            for block in blocks:
+                self._write(vault_file, block)
+            self._write(vault_file, directory_data)
+
+        self.entry_count = len(passwords)
+        self.live_size = live_size
+        self.data_start = len(header) + DIRECTORY_ROOT.size
+        self.directory_length = len(directory_data)
+
+
+class OffsetIndex(IndexedStorage):
+    """
+    The offset index of a LogStorage: "<offset>:<length>" of the live record by service name.
+    It takes the generation of the log it was written for, instead of counting its own.
+    """
+
+    file_format = "log-offsets"
+
+    def __init__(self, path: str, cipher: Cipher, kdf: KdfParams = None, log_generation: int = 0):
+        # The values are too short to compress.
+        super().__init__(path, cipher, kdf, None)
+
+        self.log_generation = log_generation
+
+    def _new_header(self) -> VaultHeader:
+        header = super()._new_header()
+
+        header.generation = self.generation = self.log_generation
+
+        return header
+
+
+class ShardedStorage(Storage):
+    """
+    Spreads the entries over shard_count encrypted shard files, chosen by a keyed hash of the service name.
+    A save only rewrites the shards with changed entries, and a lookup only decrypts one shard.
+
+    The vault file itself holds the shard count and the secret hash key. Shard i is stored as a blob at "<path>.<i>".
+    """
+
+    file_format = "sharded"
+
+    def __init__(self, path: str, cipher: Cipher, kdf: KdfParams = None, compression: Compression = None, shard_count: int = 8):
+        super().__init__(path, cipher, kdf, compression)
+
+        if shard_count < 1:
+            raise ValueError("A vault needs at least one shard.")
+
+        # A new hash key is made when the shards are written from scratch.
+        self.shard_count = shard_count
+        self.hash_key = None
+
+        # The services stored in every shard, so a changed shard can be rebuilt without hashing the whole vault.
+        self.shard_services = None
+
+    def shard_path(self, shard: int) -> str:
+        """
+        A function which returns the file of a shard.
+
+        :param shard: The shard number.
+        :return: The path to the shard file.
+        """
+
+        return "{}.{}".format(self.path, shard)
+
+    def extra_files(self) -> list:
+        return [self.shard_path(shard) for shard in range(self.shard_count) if os.path.isfile(self.shard_path(shard))]
+
+    def shard_of(self, service_name: str) -> int:
+        """
+        A function which picks the shard of a service.
+
+        :param service_name: The name of the service.
+        :return: The shard number.
+        """
+
+        digest = hashlib.blake2b(service_name.lower().encode("utf-8"), key=self.hash_key, digest_size=8).digest()
+
+        return int.from_bytes(digest, "big") % self.shard_count
+
+    def _read_manifest(self, key: bytes):
+        """
+        A function which reads the shard count and hash key from the vault file.
+
+        :param key: The vault key.
+        :return:
+        """
+
+        data = self._read_file()
+        offset = self._parse_header(data)
+        manifest = self._decode(decode_map, self._unseal(key, data[offset:]))
+
+        self.shard_count = int(manifest["shard_count"])
+        self.hash_key = bytes.fromhex(manifest["hash_key"])
+
+    def _shard_storage(self, shard: int) -> BlobStorage:
+        """
+        A function which returns the storage of a single shard.
+
+        :param shard: The shard number.
+        :return: The blob storage of the shard file.
+        """
+
+        shard_storage = BlobStorage(self.shard_path(shard), self.cipher, self.kdf, self.compression)
+        shard_storage.stats = self.stats
+
+        return shard_storage
+
+    def _load_shard(self, key: bytes, shard: int) -> dict:
+        """
+        A function which decrypts a single shard.
+
+        :param key: The vault key.
+        :param shard: The shard number.
+        :return: The passwords in the shard.
+        """
+
+        shard_storage = self._shard_storage(shard)
+        if not shard_storage.exists():
+            return {}
+
+        return shard_storage.load(key)
+
+    def _load_shards(self, key: bytes) -> list:
+        """
+        A function which decrypts all shards in parallel.
+
+        :param key: The vault key.
+        :return: The passwords of every shard.
+        """
+
+        with ThreadPoolExecutor(max_workers=min(self.shard_count, os.cpu_count() or 1)) as executor:
+            return list(executor.map(lambda shard: self._load_shard(key, shard), range(self.shard_count)))
+
+    def load(self, key: bytes) -> dict:
+        self._read_manifest(key)
+        shards = self._load_shards(key)
+
+        self.shard_services = [set(shard) for shard in shards]
+
+        passwords = {}
+        for shard in shards:
+            passwords.update(shard)
+
+        return passwords
+
+    def get(self, key: bytes, service_name: str):
+        self._read_manifest(key)
+
+        return self._load_shard(key, self.shard_of(service_name)).get(service_name)
+
+    def get_many(self, key: bytes, service_names: list) -> dict:
+        self._read_manifest(key)
+
+        # Only decrypt the shards of the services.
+        passwords = {}
+        for shard in {self.shard_of(service_name) for service_name in service_names}:
+            shard_passwords = self._load_shard(key, shard)
+            passwords.update({service_name: shard_passwords[service_name] for service_name in service_names
+                              if service_name in shard_passwords})
+
+        return passwords
+
+    def services(self, key: bytes) -> list:
+        self._read_manifest(key)
+
+        return [service_name for shard in self._load_shards(key) for service_name in shard]
+
+    def save(self, key: bytes, passwords: dict, changes: dict = None):
+        # Rewrite everything if this is a new vault, the shards were never loaded, or the manifest is from before the
+        # header was authenticated.
+        if changes is None or self.shard_services is None or not self.exists() or self.associated_data is None:
+            self.write_all(key, passwords)
+            return
+
+        changed_shards = set()
+        for service_name, password in changes.items():
+            shard = self.shard_of(service_name)
+            changed_shards.add(shard)
+
+            if password is None:
+                self.shard_services[shard].discard(service_name)
+            else:
+                self.shard_services[shard].add(service_name)
+
+        for shard in changed_shards:
+            shard_passwords = {service_name: passwords[service_name] for service_name in self.shard_services[shard]}
+            self._shard_storage(shard).save(key, shard_passwords)
+
+        self._rewrite_header()
+
+    def write_all(self, key: bytes, passwords: dict):
+        """
+        A function which writes every shard with a new hash key, which also reshards the vault.
+
+        :param key: The vault key.
+        :param passwords: The complete passwords dictionary.
+        :return:
+        """
+
+        self.hash_key = get_random_bytes(16)
+
+        shards = [{} for _ in range(self.shard_count)]
+        for service_name, password in passwords.items():
+            shards[self.shard_of(service_name)][service_name] = password
+
+        for shard, shard_passwords in enumerate(shards):
+            self._shard_storage(shard).save(key, shard_passwords)
+
+        manifest = {
+            "shard_count": str(self.shard_count),
+            "hash_key": self.hash_key.hex()
+        }
+
+        header = self._new_header()
+        payload = self._seal(key, self._encode(encode_map, manifest))
+
+        with self._replace_file() as vault_file:
+            self._write(vault_file, header.pack() + payload)
+
+        self.shard_services = [set(shard) for shard in shards]
+
+
+# The available vault file formats.
+STORAGE_FORMATS = {
+    BlobStorage.file_format: BlobStorage,
+    LogStorage.file_format: LogStorage,
+    IndexedStorage.file_format: IndexedStorage,
+    ShardedStorage.file_format: ShardedStorage
+}
+
+
+def open_storage(path: str, cipher: Cipher, file_format: str = "blob", legacy_cipher: Cipher = None, kdf: KdfParams = None,
+                 compression: Compression = None, **options):
+    """
+    A function which creates the storage for a vault file.
+    The format, cipher, kdf and compression of an existing file are read from its header, the arguments are used for new files.
+
+    :param path: The path to the vault file.
+    :param cipher: The cipher backend for a new vault file.
+    :param file_format: The format for a new vault file.
+    :param legacy_cipher: The cipher backend of vaults from before the cipher was stored in the header.
+    :param kdf: The key derivation parameters for a new vault file.
+    :param compression: The compression for a new vault file, None to not compress it.
+    :param options: Extra arguments for the format, i.e. shard_count for sharded vaults.
+    :return: The storage object.
+    """
+
+    if os.path.isfile(path):
+        header, _ = read_header(path)
+        if header is not None:
+            file_format = header.file_format
+        else:
+            # Headerless vaults are in the original blob format.
+            file_format = BlobStorage.file_format
+
+        if header is not None and header.cipher is not None:
+            cipher = get_cipher(header.cipher)
+        else:
+            cipher = legacy_cipher or cipher
+
+        # Vaults from before the kdf was stored use the padded password as key.
+        kdf = header.kdf if header is not None else None
+        compression = header.compression if header is not None else None
+
+    if file_format not in STORAGE_FORMATS:
+        raise ValueError("Unknown vault format: {}".format(file_format))
+
+    return STORAGE_FORMATS[file_format](path, cipher, kdf, compression, **options)
+
+
+def reopen_storage(storage: Storage, legacy_cipher: Cipher = None, **options) -> Storage:
+    """
+    A function which checks the header of a vault file again once its generation changed.
+    Another process may have migrated the file to another format, cipher, kdf or compression in the meantime.
+
+    :param storage: The storage of the vault file.
+    :param legacy_cipher: The cipher backend of vaults from before the cipher was stored in the header.
+    :param options: Extra arguments for the format, they are only passed on if the format did not change.
+    :return: The storage, or a new one for the file as it is now.
+    """
+
+    if not storage.exists():
+        return storage
+
+    header, _ = read_header(storage.path)
+    if header is None or header.generation == storage.generation:
+        return storage
+
+    # Compare the parameters the same way they are stored.
+    current = VaultHeader(storage.file_format, 0, storage.cipher.name, storage.kdf, storage.compression)
+    stored = VaultHeader(header.file_format, 0, header.cipher or storage.cipher.name, header.kdf, header.compression)
+    if current.pack() == stored.pack():
+        return storage
+
+    reopened = open_storage(storage.path, storage.cipher, storage.file_format, legacy_cipher, storage.kdf, storage.compression,
+                            **(options if header.file_format == storage.file_format else {}))
+    reopened.stats = storage.stats
+
+    return reopened
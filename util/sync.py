@@ -0,0 +1,415 @@
+import hashlib
+import time
+
+from Crypto.Random import get_random_bytes
+
+from .ciphers import Cipher
+from .codec import encode_map, decode_map
+from .storage import DeltaLog
+
+# The version of a deleted entry ends with this, so the delete wins over older copies of the entry.
+DELETED_SUFFIX = ":deleted"
+
+# The average amount of entries per leaf of the hash tree.
+ENTRIES_PER_LEAF = 4
+
+# The deepest hash tree, about a million leaves.
+MAX_DEPTH = 20
+
+# The version that older versions of this module gave to entries without one. It says nothing about the password.
+BARE_VERSION = "{:020d}:".format(0)
+
+
+def new_version(replica: str, previous: str = None, deleted: bool = False) -> str:
+    """
+    A function which makes the version of a write to an entry.
+
+    Versions are "<time in ns, 20 digits>:<replica>", so newer versions sort after older ones as strings.
+    The replica breaks ties between writes in the same nanosecond. A version is always newer than the one it replaces,
+    even if the clock of this machine is behind.
+
+    :param replica: The random id of the Vault that writes.
+    :param previous: The version of the entry before this write, None for a new entry.
+    :param deleted: Whether the write deletes the entry.
+    :return: The version.
+    """
+
+    timestamp = time.time_ns()
+    if previous is not None:
+        timestamp = max(timestamp, version_time(previous) + 1)
+
+    return "{:020d}:{}{}".format(timestamp, replica, DELETED_SUFFIX if deleted else "")
+
+
+def unversioned(password: str) -> str:
+    """
+    A function which makes the version of an entry that was written without one, i.e. by an older version.
+
+    The time is 0, so any versioned write wins over it. In place of the replica it holds a hash of the password, so
+    copies with the same password match, and copies with different passwords differ and are synced.
+
+    :param password: The password of the entry.
+    :return: The version.
+    """
+
+    return "{:020d}:{}".format(0, hashlib.blake2b(password.encode("utf-8"), digest_size=8).hexdigest())
+
+
+def version_time(version: str) -> int:
+    """
+    A function which returns the time of a version.
+
+    :param version: The version.
+    :return: The time in ns.
+    """
+
+    return int(version[:20])
+
+
+def is_deleted(version: str) -> bool:
+    """
+    A function which checks if a version marks a deleted entry.
+
+    :param version: The version.
+    :return:
+    """
+
+    return version.endswith(DELETED_SUFFIX)
+
+
+def newer(version: str, other: str) -> bool:
+    """
+    A function which checks if a version wins over another one, the last writer wins.
+
+    :param version: The version.
+    :param other: The other version, None if the entry is missing.
+    :return:
+    """
+
+    if other is None:
+        return True
+
+    # Cut off the deleted suffix, so only the time and the replica decide.
+    return version.split(":")[:2] > other.split(":")[:2]
+
+
+class VersionTable:
+    def __init__(self, versions: dict = None, generation: int = 0):
+        """
+        The versions of the entries of a vault, including the deleted ones, for syncing copies of a vault.
+        It is kept next to the vault file, encrypted, like the service index.
+
+        The generation is the one of the vault file the versions belong to.
+        """
+
+        self.versions = versions if versions is not None else {}
+        self.generation = generation
+
+        # Whether reconcile() changed the table since it was read.
+        self.repaired = False
+
+    def has_bare_versions(self) -> bool:
+        """
+        A function which checks if the table holds versions that say nothing about the password, see BARE_VERSION.
+        They have to be reconciled with the passwords before a sync.
+
+        :return:
+        """
+
+        return BARE_VERSION in self.versions.values()
+
+    def reconcile(self, passwords: dict, replica: str):
+        """
+        A function which repairs the table after the vault was written without it, i.e. by an older version.
+        Unknown entries, and the ones with a bare version, get a version from their password, see unversioned().
+        Entries that were stored again after a delete, or that disappeared, get a new version.
+
+        :param passwords: The passwords of the vault.
+        :param replica: The random id of the Vault that repairs the table.
+        :return:
+        """
+
+        self.repaired = True
+
+        for service_name, password in passwords.items():
+            if self.versions.get(service_name, BARE_VERSION) == BARE_VERSION:
+                self.versions[service_name] = unversioned(password)
+            elif is_deleted(self.versions[service_name]):
+                self.versions[service_name] = new_version(replica, self.versions[service_name])
+
+        for service_name, version in self.versions.items():
+            if service_name not in passwords and not is_deleted(version):
+                self.versions[service_name] = new_version(replica, version, True)
+
+    def apply(self, changes: dict, synced: dict, replica: str):
+        """
+        A function which records the versions of the changes that are written.
+
+        :param changes: The changed services, mapped to the new password or None when deleted.
+        :param synced: The versions of changes that came from another copy of the vault, which they keep.
+        :param replica: The random id of the Vault that writes.
+        :return:
+        """
+
+        for service_name, password in changes.items():
+            if service_name in synced:
+                self.versions[service_name] = synced[service_name]
+            else:
+                self.versions[service_name] = new_version(replica, self.versions.get(service_name), password is None)
+
+    def save(self, path: str, cipher: Cipher, key: bytes, changed=None, previous_generation: int = 0):
+        """
+        A function which encrypts and writes the table.
+        With changed, only the versions of those services are appended to the file, if it holds the table of
+        previous_generation, see util.storage.DeltaLog. Otherwise the whole table is written.
+
+        :param path: The path to the versions file.
+        :param cipher: The cipher backend of the vault.
+        :param key: The vault key.
+        :param changed: The services whose versions changed since previous_generation, None to write the whole table.
+        :param previous_generation: The generation of the vault file before the write.
+        :return:
+        """
+
+        delta_log = DeltaLog(path, "versions", cipher)
+
+        # A repaired table holds changes that were never written.
+        if changed is not None and not self.repaired:
+            changes = encode_map({service_name: self.versions[service_name] for service_name in changed})
+            if delta_log.append(key, previous_generation, self.generation, changes):
+                return
+
+        delta_log.write(key, self.generation, encode_map(self.versions))
+        self.repaired = False
+
+    @classmethod
+    def load(cls, path: str, cipher: Cipher, key: bytes, generation: int):
+        """
+        A function which reads the table of a vault.
+
+        :param path: The path to the versions file.
+        :param cipher: The cipher backend of the vault.
+        :param key: The vault key.
+        :param generation: The generation of the vault file.
+        :return: The table, or None if it is missing or belongs to another generation of the vault.
+        """
+
+        payloads = DeltaLog(path, "versions", cipher).read(key, generation)
+        if payloads is None:
+            return None
+
+        versions = decode_map(payloads[0])
+        for changes in payloads[1:]:
+            versions.update(decode_map(changes))
+
+        return cls(versions, generation)
+
+
+class MerkleTree:
+    def __init__(self, versions: dict, depth: int, hash_key: bytes):
+        """
+        A binary hash tree over the versions of the entries.
+
+        Entries are spread over 2 ** depth leaves by a keyed hash of their name. A leaf hashes the names and versions
+        of its entries, every other node hashes its two children. Two vaults with the same root hash have the same
+        entries, and a differing entry is found by following the differing hashes down, one level at a time.
+        The hash key is random for every sync, so the hashes say nothing about the entries afterwards.
+        """
+
+        self.depth = depth
+        self.hash_key = hash_key
+
+        # The entries of every leaf.
+        self.buckets = {}
+        for service_name, version in versions.items():
+            self.buckets.setdefault(self.bucket_of(service_name), {})[service_name] = version
+
+        # levels[0] is the root, levels[depth] are the leaves. Empty subtrees hash to an empty string.
+        leaves = [b""] * (1 << depth)
+        for bucket, entries in self.buckets.items():
+            leaves[bucket] = self._hash(b"".join("{}\0{}\0".format(name, entries[name]).encode("utf-8") for name in sorted(entries)))
+
+        self.levels = [leaves]
+        while len(self.levels[0]) > 1:
+            children = self.levels[0]
+            self.levels.insert(0, [
+                self._hash(left + right) if left or right else b""
+                for left, right in zip(children[0::2], children[1::2])
+            ])
+
+    def _hash(self, data: bytes) -> bytes:
+        """
+        A function which hashes a node.
+
+        :param data: The contents of the node.
+        :return: The hash.
+        """
+
+        return hashlib.blake2b(data, key=self.hash_key, digest_size=16).digest()
+
+    def bucket_of(self, service_name: str) -> int:
+        """
+        A function which picks the leaf of an entry.
+
+        :param service_name: The name of the service.
+        :return: The number of the leaf.
+        """
+
+        digest = hashlib.blake2b(service_name.encode("utf-8"), key=self.hash_key, digest_size=8).digest()
+
+        return int.from_bytes(digest, "big") >> (64 - self.depth)
+
+    def hashes(self, level: int, nodes: list) -> list:
+        """
+        A function which returns the hashes of some nodes of a level.
+
+        :param level: The level, 0 is the root.
+        :param nodes: The numbers of the nodes in that level.
+        :return: The hashes.
+        """
+
+        return [self.levels[level][node] for node in nodes]
+
+    def entries(self, buckets: list) -> dict:
+        """
+        A function which returns the versions of the entries in some leaves.
+
+        :param buckets: The numbers of the leaves.
+        :return: The versions by service name.
+        """
+
+        entries = {}
+        for bucket in buckets:
+            entries.update(self.buckets.get(bucket, {}))
+
+        return entries
+
+
+def tree_depth(entry_count: int) -> int:
+    """
+    A function which picks the depth of the hash tree, so a leaf holds a few entries.
+
+    :param entry_count: The amount of entries, including deleted ones.
+    :return: The depth.
+    """
+
+    return min(MAX_DEPTH, max(1, (entry_count // ENTRIES_PER_LEAF).bit_length()))
+
+
+class LocalPeer:
+    def __init__(self, vault):
+        """
+        One side of a sync: a vault in this process, i.e. a copy in another directory.
+        The vault is not unlocked. The versions come from its versions file, and only the entries that differ are
+        decrypted and written, see Vault.read_synced_entries() and Vault.apply_synced_entries().
+        A peer over a socket only needs the same methods.
+        """
+
+        self.vault = vault
+        self.tree = None
+
+    def entry_count(self) -> int:
+        """
+        A function which returns the amount of entries, including deleted ones.
+
+        :return:
+        """
+
+        return len(self.vault.entry_versions())
+
+    def build_tree(self, depth: int, hash_key: bytes):
+        """
+        A function which builds the hash tree for a sync.
+
+        :param depth: The depth both sides use.
+        :param hash_key: The hash key of this sync.
+        :return:
+        """
+
+        self.tree = MerkleTree(self.vault.entry_versions(), depth, hash_key)
+
+    def hashes(self, level: int, nodes: list) -> list:
+        """
+        A function which returns the hashes of some nodes of the tree.
+
+        :param level: The level, 0 is the root.
+        :param nodes: The numbers of the nodes in that level.
+        :return: The hashes.
+        """
+
+        return self.tree.hashes(level, nodes)
+
+    def entries(self, buckets: list) -> dict:
+        """
+        A function which returns the versions of the entries in some leaves of the tree.
+
+        :param buckets: The numbers of the leaves.
+        :return: The versions by service name.
+        """
+
+        return self.tree.entries(buckets)
+
+    def fetch(self, service_names: list) -> dict:
+        """
+        A function which reads entries to send to the other side.
+
+        :param service_names: The names of the services.
+        :return: (version, password) by service name, the password is None for deleted entries.
+        """
+
+        return self.vault.read_synced_entries(service_names)
+
+    def apply(self, entries: dict):
+        """
+        A function which stores entries from the other side, with their versions.
+
+        :param entries: (version, password) by service name, the password is None for deleted entries.
+        :return:
+        """
+
+        self.vault.apply_synced_entries(entries)
+
+
+def sync_peers(local, remote) -> dict:
+    """
+    A function which makes two copies of a vault equal. Per entry, the newest version wins on both sides.
+
+    Both sides build a hash tree with the same depth and a random hash key. Walking down from the root, only the
+    children of differing nodes are compared, so k differing entries cost O(k log n) hashes instead of n.
+    Only the entries of the differing leaves are sent, and stored again with the key of the receiving vault.
+
+    :param local: The peer that runs the sync.
+    :param remote: The other peer.
+    :return: The amount of compared hashes, pulled entries and pushed entries.
+    """
+
+    depth = tree_depth(max(local.entry_count(), remote.entry_count()))
+    hash_key = get_random_bytes(32)
+    local.build_tree(depth, hash_key)
+    remote.build_tree(depth, hash_key)
+
+    # Follow the differing nodes down to the leaves.
+    compared = 1
+    differing = [0] if local.hashes(0, [0]) != remote.hashes(0, [0]) else []
+    for level in range(1, depth + 1):
+        if not differing:
+            break
+
+        children = [child for node in differing for child in (node * 2, node * 2 + 1)]
+        compared += len(children)
+        differing = [child for child, mine, theirs in zip(children, local.hashes(level, children), remote.hashes(level, children))
+                     if mine != theirs]
+
+    # Compare the versions of the entries in the differing leaves.
+    local_entries = local.entries(differing)
+    remote_entries = remote.entries(differing)
+
+    pull = [name for name, version in remote_entries.items() if newer(version, local_entries.get(name))]
+    push = [name for name, version in local_entries.items() if newer(version, remote_entries.get(name))]
+
+    if pull:
+        local.apply(remote.fetch(pull))
+    if push:
+        remote.apply(local.fetch(push))
+
+    return {"depth": depth, "hashes": compared, "pulled": len(pull), "pushed": len(push)}
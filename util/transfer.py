@@ -0,0 +1,121 @@
+import csv
+import json
+
+# Column names used by common password managers, in order of preference.
+SERVICE_COLUMNS = ("service", "name", "title", "account", "url", "login_uri", "web site")
+PASSWORD_COLUMNS = ("password", "login_password")
+
+# The supported file formats.
+TRANSFER_FORMATS = ("csv", "jsonl")
+
+
+def guess_format(path: str) -> str:
+    """
+    A function which guesses the transfer format from a file name.
+
+    :param path: The path to the file.
+    :return: The format, csv if it can't be guessed.
+    """
+
+    if path.lower().endswith((".jsonl", ".json")):
+        return "jsonl"
+
+    return "csv"
+
+
+def _find_column(columns: dict, names: tuple) -> str:
+    """
+    A function which finds the first known column in a CSV header.
+
+    :param columns: The lowercased column names mapped to the real column names.
+    :param names: The known column names, in order of preference.
+    :return: The real column name.
+    """
+
+    for name in names:
+        if name in columns:
+            return columns[name]
+
+    raise ValueError("The file needs one of these columns: {}".format(", ".join(names)))
+
+
+def read_entries(stream, file_format: str = "csv", on_skip=None):
+    """
+    A generator which reads (service, password) entries from an export file, one at a time.
+
+    CSV files need a header with a service column and a password column. The exports of most password managers
+    work as they are, i.e. "name,url,username,password".
+    JSON lines files have an object per line with "service" (or "name") and "password".
+    Entries without a service or a password are skipped.
+
+    :param stream: The text stream to read from.
+    :param file_format: "csv" or "jsonl".
+    :param on_skip: Called as on_skip(line_number, reason) for every skipped entry, i.e. to warn about it.
+    :return:
+    """
+
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        columns = {column.strip().lower(): column for column in reader.fieldnames or []}
+        service_column = _find_column(columns, SERVICE_COLUMNS)
+        password_column = _find_column(columns, PASSWORD_COLUMNS)
+
+        for row in reader:
+            if row[service_column] and row[password_column]:
+                yield row[service_column], row[password_column]
+            elif on_skip is not None:
+                on_skip(reader.line_num, "no service or no password")
+
+    elif file_format == "jsonl":
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ValueError("Line {} is not valid JSON: {}".format(line_number, e))
+
+            if not isinstance(entry, dict):
+                reason = "not a JSON object"
+            elif not isinstance(entry.get("service", entry.get("name")), str):
+                reason = "no \"service\" or \"name\""
+            elif not isinstance(entry.get("password"), str):
+                reason = "no \"password\""
+            else:
+                yield entry.get("service", entry.get("name")), entry["password"]
+                continue
+
+            if on_skip is not None:
+                on_skip(line_number, reason)
+
+    else:
+        raise ValueError("Unknown transfer format: {}".format(file_format))
+
+
+def write_entries(entries, stream, file_format: str = "csv") -> int:
+    """
+    A function which writes (service, password) entries to a stream as they come in.
+
+    :param entries: An iterable of (service, password) tuples.
+    :param stream: The text stream to write to.
+    :param file_format: "csv" or "jsonl".
+    :return: The amount of entries written.
+    """
+
+    count = 0
+
+    if file_format == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(["service", "password"])
+        for count, entry in enumerate(entries, 1):
+            writer.writerow(entry)
+
+    elif file_format == "jsonl":
+        for count, (service_name, password) in enumerate(entries, 1):
+            stream.write(json.dumps({"service": service_name, "password": password}) + "\n")
+
+    else:
+        raise ValueError("Unknown transfer format: {}".format(file_format))
+
+    return count